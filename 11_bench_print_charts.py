@@ -0,0 +1,73 @@
+import base64
+import time
+
+import numpy as np
+
+import render_env
+
+# ===================
+# 設定
+# ===================
+N_CHARTS = 50          # 描画するP2値分布の数（ロット数）
+P2_VALUES = [f"{p2}mm" for p2 in range(4, 21)]
+
+rng = np.random.default_rng(0)
+histograms = [rng.poisson(rng.uniform(0.5, 6.0), size=len(P2_VALUES)).tolist() for _ in range(N_CHARTS)]
+
+# 描画環境の初期化（フォント検索など）は計測から除く
+render_env.font_family()
+
+
+# ===================
+# 計測
+# ===================
+def bench(name, render):
+    """キャッシュを通さずに描画し、1枚あたりの時間とHTMLに埋め込むサイズを計測"""
+    start = time.perf_counter()
+    sizes = [len(render(counts)) for counts in histograms]
+    elapsed = time.perf_counter() - start
+    return {
+        '形式': name,
+        '1枚あたり(ms)': elapsed / N_CHARTS * 1000,
+        '平均サイズ(KB)': sum(sizes) / N_CHARTS / 1024,
+    }
+
+
+def png_html(counts):
+    png = render_env._render_bar_chart_png(P2_VALUES, counts, 'P2 Distribution (Sow)', '#1f77b4',
+                                           'P2 (mm)', 'Count', 150)
+    return base64.b64encode(png).decode('utf-8')
+
+
+def svg_html(counts):
+    svg = render_env._render_bar_chart_svg(P2_VALUES, counts, 'P2 Distribution (Sow)', '#1f77b4',
+                                           'P2 (mm)', 'Count', 640, 320)
+    return svg.decode('utf-8')
+
+
+results = [
+    bench('PNG (dpi=150, base64)', png_html),
+    bench('SVG (インライン)', svg_html),
+]
+
+# キャッシュ済みの場合（同じ分布を再度描画）
+for counts in histograms:
+    render_env.bar_chart_svg(P2_VALUES, counts, 'P2 Distribution (Sow)', '#1f77b4')
+results.append(bench('SVG (キャッシュ済み)', lambda counts: render_env.bar_chart_svg(
+    P2_VALUES, counts, 'P2 Distribution (Sow)', '#1f77b4')))
+
+
+# ===================
+# 結果出力
+# ===================
+print("=" * 60)
+print(f"印刷用レポートのグラフ形式比較（{N_CHARTS}枚）")
+print("=" * 60)
+print(f"{'形式':<24}{'1枚あたり(ms)':>14}{'平均サイズ(KB)':>16}")
+for r in results:
+    print(f"{r['形式']:<24}{r['1枚あたり(ms)']:>14.2f}{r['平均サイズ(KB)']:>16.1f}")
+
+png, svg = results[0], results[1]
+print("-" * 60)
+print(f"SVGはPNGに比べて サイズ {svg['平均サイズ(KB)'] / png['平均サイズ(KB)'] * 100:.1f}% / "
+      f"描画時間 {svg['1枚あたり(ms)'] / png['1枚あたり(ms)'] * 100:.1f}%")
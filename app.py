@@ -3,9 +3,27 @@ import pandas as pd
 from datetime import datetime, timedelta
 import json
 import os
+import hashlib
 import gspread
 from google.oauth2.service_account import Credentials
 from io import BytesIO
+from fertility_store import RecordStore, SowIndex, WeekAnnotations, ReportSnapshots
+import render_env
+from report_html import render_table, generate_print_html
+from report_model import build_report_model, add_interval_columns, fetch_report_sources
+from report_export import P2Index, export_reports, index_sources, reports_zip
+from breeding_simulator import breeding_cells, historical_losses, simulate_breeding_target
+from fertility_analytics import (
+    prepare_semen_collections, semen_collection_outcomes,
+    combine_semen_outcomes, filter_semen_outcomes,
+    detect_repeat_services, repeat_breeding_counts, repeat_breeders,
+    fertility_cube, slice_by_period, wsi_distribution, compute_npd, npd_summary,
+    hormone_breakdowns, format_interval, wilson_interval,
+    FertilityMonitor, farm_period_matrix, rolling_fertility, to_halfwidth,
+    pregnancy_rollup, farrowing_forecast, failure_breakdown, FAILURE_MODES,
+    week_details_table, details_editor_frame, apply_detail_edits, duplicate_sow_ids,
+    format_detail_number, annotated_failures, detail_breakdown, parse_date_flexible
+)
 
 # ページの設定
 st.set_page_config(
@@ -13,11 +31,16 @@ st.set_page_config(
     layout="wide"
 )
 
+# 印刷用グラフの描画環境（フォント検索など）をバックグラウンドで準備
+render_env.warm_up()
+
 # ===================
 # Googleスプレッドシート設定
 # ===================
 SPREADSHEET_ID = "1xJCrmUNqdAX0CNR_Mm7zenvgR-StP5d9VVRSe0CBnXM"
 CREDENTIALS_FILE = "credentials.json"
+# 週レポートのスナップショットの保存先
+SNAPSHOT_DIR = os.environ.get("REPORT_SNAPSHOT_DIR", "report_snapshots")
 
 @st.cache_resource
 def get_google_sheet():
@@ -54,169 +77,18 @@ def get_or_create_worksheet(spreadsheet, sheet_name):
 
 @st.cache_data(ttl=300)
 def load_data_from_sheet(_spreadsheet):
-    """スプレッドシートからデータを読み込み"""
-    data = {"pig_details": {}, "repeat_breeding": {}, "week_comments": {}}
+    """スプレッドシートから手入力データ（母豚詳細・再発付け・週コメント）のレコードを読み込み"""
+    data = {"pig_details": [], "repeat_breeding": [], "week_comments": []}
     
     try:
-        ws_pig = get_or_create_worksheet(spreadsheet, "母豚詳細")
-        records = ws_pig.get_all_records()
-        for record in records:
-            if record.get("key"):
-                data["pig_details"][record["key"]] = {
-                    "分娩舎": str(record.get("分娩舎", "")),
-                    "ロット": str(record.get("ロット", "")),
-                    "哺乳日数": str(record.get("哺乳日数", "")),
-                    "P2値": str(record.get("P2値", "")),
-                    "コメント": str(record.get("コメント", ""))
-                }
-        
-        ws_repeat = get_or_create_worksheet(spreadsheet, "再発付け")
-        records = ws_repeat.get_all_records()
-        for record in records:
-            farm = record.get("farm_name", "")
-            week = record.get("week_id", "")
-            if farm and week:
-                key = f"{farm}_{week}"
-                data["repeat_breeding"][key] = {
-                    "種付": str(record.get("種付", "")),
-                    "受胎": str(record.get("受胎", ""))
-                }
-        
-        ws_comment = get_or_create_worksheet(spreadsheet, "週コメント")
-        records = ws_comment.get_all_records()
-        for record in records:
-            farm = record.get("farm_name", "")
-            week = record.get("week_id", "")
-            if farm and week:
-                key = f"{farm}_{week}"
-                data["week_comments"][key] = str(record.get("コメント", ""))
-    
+        data["pig_details"] = get_or_create_worksheet(_spreadsheet, "母豚詳細").get_all_records()
+        data["repeat_breeding"] = get_or_create_worksheet(_spreadsheet, "再発付け").get_all_records()
+        data["week_comments"] = get_or_create_worksheet(_spreadsheet, "週コメント").get_all_records()
     except Exception as e:
         st.warning(f"データ読み込み中にエラーが発生しました: {e}")
     
     return data
 
-def parse_date_flexible(date_value, year=2025):
-    """柔軟な日付パース（7月4日 や 2025-07-04 など）"""
-    if pd.isna(date_value) or date_value == '':
-        return None
-    
-    date_str = str(date_value)
-    
-    # すでにdatetime型の場合
-    if isinstance(date_value, (pd.Timestamp, datetime)):
-        return date_value.strftime('%Y-%m-%d')
-    
-    # 2025-07-04 形式
-    if '-' in date_str and len(date_str) >= 10:
-        return date_str[:10]
-    
-    # 7月4日 形式
-    import re
-    match = re.match(r'(\d+)月(\d+)日', date_str)
-    if match:
-        month = int(match.group(1))
-        day = int(match.group(2))
-        return f"{year}-{month:02d}-{day:02d}"
-    
-    # 7/4 形式
-    match = re.match(r'(\d+)/(\d+)', date_str)
-    if match:
-        month = int(match.group(1))
-        day = int(match.group(2))
-        return f"{year}-{month:02d}-{day:02d}"
-    
-    return date_str
-
-
-@st.cache_data(ttl=60)
-def load_p2_data_from_sheet(_spreadsheet, farm_name, weaning_date):
-    """スプレッドシートからP2値（経産）を読み込み"""
-    try:
-        ws = _spreadsheet.worksheet("P2値_経産")
-        data = ws.get_all_records()
-        
-        # 検索対象の日付を正規化
-        target_date = parse_date_flexible(weaning_date)
-        if target_date is None:
-            return None
-        
-        for record in data:
-            if record.get("農場") == farm_name:
-                record_date = parse_date_flexible(record.get("離乳日", ""))
-                if record_date == target_date:
-                    return record
-        return None
-    except Exception as e:
-        return None
-
-
-@st.cache_data(ttl=60)
-def load_gilt_p2_data_from_sheet(_spreadsheet, farm_name, week_id):
-    """スプレッドシートからP2値（初産）を読み込み"""
-    try:
-        ws = _spreadsheet.worksheet("P2値_初産")
-        data = ws.get_all_records()
-        
-        # 検索対象の日付を正規化
-        target_date = parse_date_flexible(week_id)
-        if target_date is None:
-            return None
-        
-        for record in data:
-            if record.get("農場") == farm_name:
-                record_date = parse_date_flexible(record.get("種付開始週", ""))
-                if record_date == target_date:
-                    return record
-        return None
-    except Exception as e:
-        return None
-
-
-@st.cache_data(ttl=60)
-def load_semen_report_from_sheet(_spreadsheet, start_date):
-    """スプレッドシートから採精レポートを読み込み"""
-    try:
-        ws = _spreadsheet.worksheet("採精レポート")
-        data = ws.get_all_records()
-        
-        if not data:
-            return None
-        
-        # 日付でフィルタリング（種付開始週の前日曜〜土曜）
-        if isinstance(start_date, str):
-            start_date = pd.to_datetime(start_date)
-        
-        days_since_monday = start_date.weekday()
-        if days_since_monday == 0:
-            previous_sunday = start_date - timedelta(days=1)
-        else:
-            previous_sunday = start_date - timedelta(days=days_since_monday + 1)
-        
-        days_until_saturday = 5 - start_date.weekday()
-        if days_until_saturday < 0:
-            days_until_saturday += 7
-        saturday_of_week = start_date + timedelta(days=days_until_saturday)
-        
-        filtered_data = []
-        for record in data:
-            try:
-                # 日付を正規化
-                record_date_str = parse_date_flexible(record.get("採精日"))
-                if record_date_str:
-                    record_date = pd.to_datetime(record_date_str)
-                    if previous_sunday <= record_date <= saturday_of_week:
-                        record['採精日'] = record_date_str
-                        filtered_data.append(record)
-            except:
-                pass
-        
-        if filtered_data:
-            df = pd.DataFrame(filtered_data)
-            return df
-        return None
-    except Exception as e:
-        return None
 
 @st.cache_data(ttl=60)
 def load_all_breeding_records(_spreadsheet):
@@ -248,6 +120,232 @@ def load_all_breeding_records(_spreadsheet):
         return None
 
 
+@st.cache_resource
+def load_all_semen_reports(_spreadsheet):
+    """採精レポートを全期間分読み込み（採精日を正規化。プロセスごとに一度だけ読み込み、更新されたら読み直す）"""
+    try:
+        ws = _spreadsheet.worksheet("採精レポート")
+        data = ws.get_all_records()
+        if not data:
+            return None
+        
+        df = pd.DataFrame(data)
+        df['採精日'] = [parse_date_flexible(v) or '' for v in df['採精日']]
+        return df
+    except Exception as e:
+        return None
+
+
+@st.cache_resource
+def get_p2_index(_spreadsheet):
+    """P2値（経産・初産）を（農場, 日付）で引ける索引（プロセスごとに一度だけ読み込み、更新されたら読み直す）"""
+    records = {}
+    for sheet_name in ["P2値_経産", "P2値_初産"]:
+        try:
+            records[sheet_name] = _spreadsheet.worksheet(sheet_name).get_all_records()
+        except Exception as e:
+            records[sheet_name] = []
+    return P2Index(records["P2値_経産"], records["P2値_初産"])
+
+
+@st.cache_resource
+def get_record_store(_spreadsheet):
+    """種付記録ストアを構築（プロセスごとに一度だけ全件読み込み）"""
+    store = RecordStore()
+    store.register_rollup("採精成績", semen_collection_outcomes, tables=("採精レポート",))
+    store.register_rollup("受胎キューブ", fertility_cube)
+    store.register_rollup("妊娠豚", pregnancy_rollup)
+    
+    if _spreadsheet:
+        try:
+            ws = get_or_create_worksheet(_spreadsheet, "種付記録")
+            data = ws.get_all_values()
+            if len(data) > 1:
+                store.load_rows(data[0], data[1:])
+        except Exception as e:
+            st.error(f"種付記録の読み込みに失敗しました: {e}")
+    
+    return store
+
+
+@st.cache_resource
+def get_week_annotations(_spreadsheet):
+    """手入力データを 農場 -> 週 の階層で構築（以降は保存時に週単位で更新）"""
+    annotations = WeekAnnotations()
+    if _spreadsheet:
+        data = load_data_from_sheet(_spreadsheet)
+        annotations.load_records(data["pig_details"], data["repeat_breeding"], data["week_comments"])
+    return annotations
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_sheet_revision(_spreadsheet):
+    """スプレッドシートの最終更新日時（60秒ごとに確認。取得できなければ None）"""
+    try:
+        return _spreadsheet.get_lastUpdateTime()
+    except Exception as e:
+        return None
+
+
+@st.cache_resource
+def get_loaded_revision():
+    """読み込み済みの保存データがどの時点のスプレッドシートか（プロセス内で共有）"""
+    return {'revision': None}
+
+
+def reload_saved_data():
+    """種付記録ストア・手入力データ・索引を破棄し、次の実行でスプレッドシートから読み直す"""
+    get_record_store.clear()
+    get_week_annotations.clear()
+    get_sow_index.clear()
+    get_fertility_monitor.clear()
+    get_p2_index.clear()
+    load_all_semen_reports.clear()
+    st.cache_data.clear()
+
+
+def sync_saved_data(spreadsheet):
+    """スプレッドシートがほかの画面や直接の編集で更新されていれば保存データを読み直す"""
+    revision = get_sheet_revision(spreadsheet)
+    loaded = get_loaded_revision()
+    if revision is None:
+        return
+    if loaded['revision'] is not None and loaded['revision'] != revision:
+        reload_saved_data()
+    loaded['revision'] = revision
+
+
+def mark_saved_revision(spreadsheet):
+    """この画面からの保存はストアに反映済みなので、保存後の更新日時を読み込み済みとして記録"""
+    try:
+        get_loaded_revision()['revision'] = spreadsheet.get_lastUpdateTime()
+    except Exception as e:
+        pass
+
+
+@st.cache_resource
+def get_report_snapshots():
+    """週レポートのスナップショット（プロセス内で共有し、ディスクにも保存）"""
+    return ReportSnapshots(directory=SNAPSHOT_DIR)
+
+
+def week_snapshot_version(record_store, annotations, spreadsheet, farm_name, week_id):
+    """保存済みの週のデータ版（その週の種付記録・手入力データ・参照する P2値と採精レポートが変わったときだけ変わる）
+
+    P2値・採精レポートは読み込み済みの索引から引くため、スプレッドシートは読まない。
+    """
+    records = record_store.week_frame(farm_name, week_id)
+    if records is None or len(records) == 0:
+        return None
+    _, sources = fetch_report_sources(records, sheet_sources(spreadsheet, farm_name, week_id))
+    return ReportSnapshots.data_version(records, annotations.week(farm_name, week_id), sources)
+
+
+@st.cache_resource
+def get_sow_index(_record_store):
+    """母豚別索引を構築（以降は保存時に週単位で更新）"""
+    index = SowIndex()
+    index.build(_record_store)
+    _record_store.add_listener(index.update_week)
+    return index
+
+
+@st.cache_resource
+def get_fertility_monitor(_record_store):
+    """受胎率の管理図を構築（以降は保存時に週単位で更新）"""
+    monitor = FertilityMonitor()
+    monitor.build(_record_store)
+    _record_store.add_listener(monitor.update_week)
+    return monitor
+
+
+def get_sow_history(sow_index, annotations, farm_name, pig_id):
+    """母豚の全週の種付記録と母豚詳細を結合した履歴表"""
+    df_history = sow_index.history(farm_name, pig_id)
+    if df_history is None:
+        return None
+    
+    history_cols = ['種付日', '産次', '雄豚・精液・あて雄', '妊娠鑑定結果', '再発日', '流産日', '母豚廃用日']
+    df_view = df_history[['week_id'] + [col for col in history_cols if col in df_history.columns]].copy()
+    
+    details = annotations.pig_details(farm_name)
+    sow_details = details[details.index.get_level_values('母豚番号') == str(pig_id).strip()]
+    sow_details = sow_details.reset_index().drop(columns=['farm_name', '母豚番号'])
+    df_view = df_view.merge(sow_details, on='week_id', how='left')
+    for col in ['分娩舎', 'ロット', 'コメント']:
+        df_view[col] = df_view[col].fillna('')
+    for col in ['哺乳日数', 'P2値']:
+        df_view[col] = format_detail_number(df_view[col])
+    
+    df_view = df_view.rename(columns={'week_id': '週', '雄豚・精液・あて雄': '精液', '妊娠鑑定結果': '結果'})
+    return df_view
+
+
+@st.cache_data(ttl=300)
+def get_repeat_services(_record_store, store_version, farm_name, week_id, df):
+    """農場の全履歴（表示中の週は画面のデータに差し替え）から再発付けを判定"""
+    df_history = _record_store.records(farm_name)
+    if 'week_id' in df_history.columns:
+        df_history = df_history[df_history['week_id'] != week_id]
+    df_week = df.drop(columns=['受胎']).assign(farm_name=farm_name, week_id=week_id)
+    return detect_repeat_services(pd.concat([df_history, df_week], ignore_index=True))
+
+
+@st.cache_data(ttl=600)
+def get_hormone_breakdowns(_record_store, store_version, farm_name, start_date, end_date):
+    """農場・期間ごとの投与ホルモン別受胎率（キューブから再集計してキャッシュ）"""
+    cube = slice_by_period(_record_store.rollup("受胎キューブ", farm_name), farm_name, start_date, end_date)
+    if cube is None or len(cube) == 0:
+        return None
+    return hormone_breakdowns(cube)
+
+
+@st.cache_data(ttl=600)
+def get_farm_comparison(_record_store, store_version, freq, start_date, end_date):
+    """全農場の受胎率マトリクス（キューブから1回の集計で作成）"""
+    cube = slice_by_period(_record_store.rollup("受胎キューブ"), None, start_date, end_date)
+    if cube is None or len(cube) == 0:
+        return None
+    return farm_period_matrix(cube, freq)
+
+
+@st.cache_data(ttl=600)
+def get_rolling_fertility(_record_store, store_version, farm_name):
+    """農場の移動受胎率・前年同週比較（全履歴の週次累積和から計算）"""
+    cube = _record_store.rollup("受胎キューブ", farm_name)
+    if cube is None or len(cube) == 0:
+        return None
+    return rolling_fertility(cube)
+
+
+@st.cache_data(ttl=600)
+def get_farrowing_forecast(_record_store, store_version, farm_name, as_of):
+    """農場の分娩予測・妊娠豚在庫予測（週単位ロールアップから計算）"""
+    pregnancies = _record_store.rollup("妊娠豚", farm_name)
+    if pregnancies is None or len(pregnancies) == 0:
+        return None, None
+    return farrowing_forecast(pregnancies, as_of=as_of)
+
+
+@st.cache_data(ttl=600)
+def get_failure_breakdowns(_record_store, store_version, farm_name, start_date, end_date):
+    """農場・期間ごとの不受胎要因（週・産次・精液別）をキューブから再集計"""
+    cube = slice_by_period(_record_store.rollup("受胎キューブ", farm_name), farm_name, start_date, end_date)
+    if cube is None or len(cube) == 0:
+        return None
+    return {
+        '週': failure_breakdown(cube, '週開始日'),
+        '産次': failure_breakdown(cube, '産次'),
+        '精液': failure_breakdown(cube, '精液'),
+    }
+
+
+@st.cache_data(ttl=600)
+def get_annotated_failures(_record_store, store_version, _annotations, annotations_version, farm_name):
+    """農場の全週の不受胎に母豚詳細を結合した索引"""
+    return annotated_failures(_record_store.records(farm_name), _annotations.pig_details(farm_name))
+
+
 def get_period_data(df, farm_name, period_type, year=None, month=None, start_date=None, end_date=None):
     """指定期間のデータをフィルタリング"""
     # 農場でフィルタ
@@ -319,78 +417,18 @@ def save_breeding_records(spreadsheet, df, week_id, farm_name):
     except Exception as e:
         st.error(f"種付記録の保存に失敗しました: {e}")
         return False
-@st.cache_data(ttl=60)
-def load_breeding_records(_spreadsheet, week_id, farm_name):
-    """種付記録をスプレッドシートから読み込み"""
-    try:
-        ws = get_or_create_worksheet(_spreadsheet, "種付記録")
-        data = ws.get_all_values()
-        
-        if len(data) <= 1:
-            return None
-        
-        headers = data[0]
-        # farm_nameとweek_idの両方が一致する行を取得
-        rows = [row for row in data[1:] if row and len(row) >= 2 and row[0] == farm_name and row[1] == week_id]
-        
-        if not rows:
-            return None
-        
-        # DataFrameを作成
-        df = pd.DataFrame(rows, columns=headers)
-        
-        # farm_name列とweek_id列を除外
-        if 'farm_name' in df.columns:
-            df = df.drop(columns=['farm_name'])
-        if 'week_id' in df.columns:
-            df = df.drop(columns=['week_id'])
-        
-        return df
-    except Exception as e:
-        st.error(f"種付記録の読み込みに失敗しました: {e}")
-        return None
-    
-@st.cache_data(ttl=60)
-def get_saved_farms_and_weeks(_spreadsheet):
-    """保存済みの農場と週一覧を取得"""
-    try:
-        ws = get_or_create_worksheet(_spreadsheet, "種付記録")
-        data = ws.get_all_values()
-        
-        if len(data) <= 1:
-            return {}, []
-        
-        # 農場ごとの週を取得
-        farm_weeks = {}
-        all_farms = set()
-        
-        for row in data[1:]:
-            if row and len(row) >= 2 and row[0] and row[1]:
-                farm_name = row[0]
-                week_id = row[1]
-                all_farms.add(farm_name)
-                
-                if farm_name not in farm_weeks:
-                    farm_weeks[farm_name] = set()
-                farm_weeks[farm_name].add(week_id)
-        
-        # セットをソートしたリストに変換
-        for farm in farm_weeks:
-            farm_weeks[farm] = sorted(list(farm_weeks[farm]), reverse=True)
-        
-        all_farms = sorted(list(all_farms))
-        
-        return farm_weeks, all_farms
-    except Exception as e:
-        st.error(f"データ一覧の取得に失敗しました: {e}")
-        return {}, []
+def get_saved_farms_and_weeks(record_store):
+    """保存済みの農場と週一覧を取得（種付記録ストアから作るのでシートは読まない）"""
+    farm_weeks = {}
+    for farm_name, week_id in record_store.week_keys():
+        farm_weeks.setdefault(farm_name, []).append(week_id)
+    for farm in farm_weeks:
+        farm_weeks[farm] = sorted(farm_weeks[farm], reverse=True)
+    return farm_weeks, sorted(farm_weeks)
 
-def save_data_to_sheet(spreadsheet, data, week_id, farm_name):
-    """手入力データをスプレッドシートに保存（一括処理）"""
+def save_data_to_sheet(spreadsheet, week_data, week_id, farm_name):
+    """1週分の手入力データをスプレッドシートに保存（一括処理）"""
     try:
-        # キーのプレフィックス（農場名_週ID）
-        key_prefix = f"{farm_name}_{week_id}"
-        
         # === 母豚詳細を保存 ===
         ws_pig = get_or_create_worksheet(spreadsheet, "母豚詳細")
         existing_data = ws_pig.get_all_values()
@@ -407,12 +445,13 @@ def save_data_to_sheet(spreadsheet, data, week_id, farm_name):
                     if not (row[1] == farm_name and row[2] == week_id):
                         new_data.append(row)
         
-        # 新しいデータを追加
-        for key, details in data["pig_details"].items():
-            if key.startswith(key_prefix):
-                row_data = [key, farm_name, week_id, details.get("分娩舎", ""), details.get("ロット", ""), 
-                           details.get("哺乳日数", ""), details.get("P2値", ""), details.get("コメント", "")]
-                new_data.append(row_data)
+        # 新しいデータを追加（哺乳日数・P2値は数値のまま書き込む）
+        for pig_id, details in week_data["pig_details"].iterrows():
+            numbers = ["" if pd.isna(details[col]) else (int(details[col]) if float(details[col]).is_integer() else float(details[col]))
+                       for col in ["哺乳日数", "P2値"]]
+            row_data = [f"{farm_name}_{week_id}_{pig_id}", farm_name, week_id, details["分娩舎"], details["ロット"],
+                        numbers[0], numbers[1], details["コメント"]]
+            new_data.append(row_data)
         
         ws_pig.clear()
         if new_data:
@@ -433,9 +472,8 @@ def save_data_to_sheet(spreadsheet, data, week_id, farm_name):
                     if not (row[0] == farm_name and row[1] == week_id):
                         new_data.append(row)
         
-        repeat_key = f"{farm_name}_{week_id}"
-        if repeat_key in data["repeat_breeding"]:
-            repeat_data = data["repeat_breeding"][repeat_key]
+        repeat_data = week_data["repeat_breeding"]
+        if repeat_data is not None:
             row_data = [farm_name, week_id, repeat_data.get("種付", ""), repeat_data.get("受胎", "")]
             new_data.append(row_data)
         
@@ -458,10 +496,8 @@ def save_data_to_sheet(spreadsheet, data, week_id, farm_name):
                     if not (row[0] == farm_name and row[1] == week_id):
                         new_data.append(row)
         
-        comment_key = f"{farm_name}_{week_id}"
-        if comment_key in data["week_comments"]:
-            row_data = [farm_name, week_id, data["week_comments"][comment_key]]
-            new_data.append(row_data)
+        row_data = [farm_name, week_id, week_data["week_comment"]]
+        new_data.append(row_data)
         
         ws_comment.clear()
         if new_data:
@@ -482,6 +518,11 @@ st.markdown("""
     th { text-align: center !important; }
     td { text-align: center !important; }
     
+    /* display_centered_table の表 */
+    table.centered-table { width: 100%; border-collapse: collapse; background-color: #ffffff; }
+    table.centered-table th { background-color: #f0f2f6; color: #333333; padding: 10px; border: 1px solid #dddddd; font-weight: bold; }
+    table.centered-table td { background-color: #ffffff; color: #333333; padding: 10px; border: 1px solid #dddddd; }
+    
     /* セレクトボックスのカーソルを指に変更 */
     [data-testid="stSelectbox"] > div > div {
         cursor: pointer !important;
@@ -516,427 +557,117 @@ st.markdown("""
 # ===================
 # ユーティリティ関数
 # ===================
-def to_halfwidth(text):
-    """全角英数字を半角に変換"""
-    if not text:
-        return text
-    halfwidth = str.maketrans(
-        'ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚ０１２３４５６７８９',
-        'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
-    )
-    return text.translate(halfwidth)
-
 def display_centered_table(df, height=None):
-    """DataFrameをHTML形式で中央揃え表示"""
-    html = df.to_html(index=False, escape=False)
-    html = html.replace('<table', '<table style="width:100%; border-collapse:collapse; background-color:#ffffff;"')
-    html = html.replace('<th>', '<th style="text-align:center; background-color:#f0f2f6; color:#333333; padding:10px; border:1px solid #dddddd; font-weight:bold;">')
-    html = html.replace('<td>', '<td style="text-align:center; background-color:#ffffff; color:#333333; padding:10px; border:1px solid #dddddd;">')
+    """DataFrameをHTML形式で中央揃え表示（スタイルはカスタムCSSの centered-table）"""
+    html = render_table(df, css_class="centered-table", escape=False)
     
     if height:
         st.markdown(f'<div style="height:{height}px; overflow-y:auto;">{html}</div>', unsafe_allow_html=True)
     else:
         st.markdown(html, unsafe_allow_html=True)
 
+PIG_DETAILS_COLUMN_CONFIG = {
+    "母豚番号": st.column_config.TextColumn("母豚番号", disabled=True),
+    "産次": st.column_config.TextColumn("産次", disabled=True),
+    "精液": st.column_config.TextColumn("精液", disabled=True),
+    "分娩舎": st.column_config.TextColumn("分娩舎", help="例: 1号"),
+    "ロット": st.column_config.TextColumn("ロット", help="例: 2-3"),
+    "哺乳日数": st.column_config.NumberColumn("哺乳日数", help="例: 21", min_value=0, format="%g"),
+    "P2値": st.column_config.NumberColumn("P2値", help="例: 12", min_value=0, format="%g"),
+    "コメント": st.column_config.TextColumn("コメント", help="廃用理由、治療歴、助産歴など", width="large"),
+}
+
 @st.fragment
-def pig_details_input_form(df_not_pregnant, farm_name, week_id, comments_data):
-    """不受胎母豚の詳細入力フォーム（フラグメント化で再実行を防止）"""
+def pig_details_input_form(df_not_pregnant, farm_name, week_id, week_notes):
+    """不受胎母豚の詳細入力（1つの表で全頭を編集。Excelから列ごとの貼り付けも可）"""
     
     if 'temp_pig_details' not in st.session_state:
         st.session_state.temp_pig_details = {}
     
     st.write("**不受胎母豚の詳細情報を入力**")
     
-    for idx, row in df_not_pregnant.iterrows():
-        pig_id = str(row['母豚番号'])
-        detail_key = f"{farm_name}_{week_id}_{pig_id}"
-        saved_details = comments_data["pig_details"].get(detail_key, {})
-        
-        # セッションステートから既存の入力値を取得（あれば）
-        if detail_key in st.session_state.temp_pig_details:
-            saved_details = st.session_state.temp_pig_details[detail_key]
+    # 表の元データは表示し始めた時点の値で固定（入力中の値があればそれを使う）
+    editor_key = f"pig_details_editor_{farm_name}_{week_id}"
+    base_key = f"{editor_key}_base"
+    sow_ids = df_not_pregnant['母豚番号'].astype(str).str.strip().tolist()
+    base = st.session_state.get(base_key)
+    if editor_key not in st.session_state or base is None or base['母豚番号'].tolist() != sow_ids:
+        st.session_state.pop(editor_key, None)
+        pending = st.session_state.temp_pig_details.get((farm_name, week_id))
+        st.session_state[base_key] = details_editor_frame(
+            df_not_pregnant, pending if pending is not None else week_notes["pig_details"]
+        )
+    base = st.session_state[base_key]
     
-        with st.expander(f"{pig_id}（{row['産次']}産 / {row['雄豚・精液・あて雄']}）", expanded=False):
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                bunben = st.text_input("分娩舎", value=saved_details.get("分娩舎", ""), key=f"bunben_{detail_key}", placeholder="例: 1号")
-            with col2:
-                lot = st.text_input("ロット", value=saved_details.get("ロット", ""), key=f"lot_{detail_key}", placeholder="例: 2-3")
-            with col3:
-                honyugs = st.text_input("哺乳日数", value=saved_details.get("哺乳日数", ""), key=f"honyu_{detail_key}", placeholder="例: 21")
-            with col4:
-                p2_value = st.text_input("P2値", value=saved_details.get("P2値", ""), key=f"p2_{detail_key}", placeholder="例: 12")
-            
-            comment = st.text_input("コメント", value=saved_details.get("コメント", ""), key=f"comment_{detail_key}", placeholder="廃用理由、治療歴、助産歴など")
-            
-            st.session_state.temp_pig_details[detail_key] = {
-                "分娩舎": to_halfwidth(bunben),
-                "ロット": to_halfwidth(lot),
-                "哺乳日数": to_halfwidth(honyugs),
-                "P2値": to_halfwidth(p2_value),
-                "コメント": comment
-            }
+    duplicates = duplicate_sow_ids(base)
+    if duplicates:
+        st.warning(
+            "⚠️ 同じ週に複数回種付された母豚があります: " + "、".join(duplicates)
+            + "。詳細は母豚ごとに1件で保存されます（編集した行の値を使用）"
+        )
+    
+    st.data_editor(
+        base,
+        key=editor_key,
+        column_config=PIG_DETAILS_COLUMN_CONFIG,
+        num_rows="fixed",
+        hide_index=True,
+        use_container_width=True
+    )
+    
+    # 元データに変更分（編集されたセルだけ）を反映して保存待ちの値にする
+    edited_rows = st.session_state[editor_key]["edited_rows"]
+    st.session_state.temp_pig_details[(farm_name, week_id)] = apply_detail_edits(base, edited_rows)
 
-def generate_print_html(df, week_id, farm_name, start_date, end_date, comments_data, 
-                        df_parity, semen_stats, df_not_pregnant, week_comment,
-                        p2_data=None, gilt_p2_data=None, semen_report=None):
-    """印刷用HTMLを生成"""
-    import matplotlib.pyplot as plt
-    import matplotlib
-    matplotlib.use('Agg')
-    import base64
-    from io import BytesIO
-    
-   # 日本語フォント設定
-    import matplotlib
-    matplotlib.use('Agg')
-    
-    # 利用可能な日本語フォントを探す
-    from matplotlib import font_manager
-    
-    # フォント候補リスト
-    font_candidates = [
-        'Hiragino Sans',
-        'Hiragino Kaku Gothic ProN', 
-        'Yu Gothic',
-        'Meiryo',
-        'MS Gothic',
-        'Noto Sans CJK JP',
-        'IPAGothic',
-        'IPAPGothic',
-        'VL Gothic',
-        'Takao Gothic',
-        'DejaVu Sans'
-    ]
-    
-    # 利用可能なフォントを探す
-    available_fonts = [f.name for f in font_manager.fontManager.ttflist]
-    selected_font = None
-    for font in font_candidates:
-        if font in available_fonts:
-            selected_font = font
-            break
-    
-    if selected_font:
-        plt.rcParams['font.family'] = selected_font
-    else:
-        # フォントが見つからない場合は英語で表示
-        plt.rcParams['font.family'] = 'DejaVu Sans'
-    
-    # 受胎率計算
-    total = len(df)
-    pregnant = df['受胎'].sum()
-    fertility_rate = pregnant / total * 100
-    
-    df_sow = df[df['産次'].astype(int) >= 2]
-    sow_rate = df_sow['受胎'].sum() / len(df_sow) * 100 if len(df_sow) > 0 else 0
-    
-    df_gilt = df[df['産次'].astype(int) == 1]
-    gilt_rate = df_gilt['受胎'].sum() / len(df_gilt) * 100 if len(df_gilt) > 0 else 0
-    
-    # 不受胎リストデータ準備
-    not_pregnant_html = ""
-    if len(df_not_pregnant) > 0:
-        display_data = []
-        for idx, row in df_not_pregnant.iterrows():
-            pig_id = str(row['母豚番号'])
-            detail_key = f"{farm_name}_{week_id}_{pig_id}"
-            details = comments_data["pig_details"].get(detail_key, {})
-            
-            display_data.append({
-                '種付日': row['種付日'],
-                '母豚番号': pig_id,
-                '精液': row['雄豚・精液・あて雄'],
-                '産次': row['産次'],
-                '分娩舎': details.get('分娩舎', ''),
-                'ロット': details.get('ロット', ''),
-                '哺乳日数': details.get('哺乳日数', ''),
-                'P2値': details.get('P2値', ''),
-                'コメント': details.get('コメント', '')
-            })
-        df_display = pd.DataFrame(display_data)
-        not_pregnant_html = df_display.to_html(index=False)
-    else:
-        not_pregnant_html = "<p>不受胎なし</p>"
+def show_p2_distribution(p2, empty_message, color=None):
+    """P2値分布のグラフと表（レポートモデルの p2 / gilt_p2）"""
+    if p2['total'] == 0:
+        st.info(empty_message)
+        return
     
-    # グラフ生成関数
-    def create_bar_chart_base64(data_df, title, color, x_col='P2値(mm)', y_col='頭数'):
-        """棒グラフを生成してBase64エンコードした画像を返す"""
-        fig, ax = plt.subplots(figsize=(8, 4))
-        
-        x_values = data_df[x_col].astype(str).tolist()
-        y_values = data_df[y_col].tolist()
-        
-        bars = ax.bar(x_values, y_values, color=color, edgecolor='white')
-        
-        # 英語ラベルを使用（文字化け防止）
-        ax.set_xlabel('P2 (mm)')
-        ax.set_ylabel('Count')
-        
-        # タイトルを英語に変換
-        if '経産' in title:
-            ax.set_title('P2 Distribution (Sow)')
-        elif '初産' in title:
-            ax.set_title('P2 Distribution (Gilt)')
-        else:
-            ax.set_title('P2 Distribution')
-        
-        # 値をバーの上に表示
-        for bar, val in zip(bars, y_values):
-            if val > 0:
-                ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, 
-                       str(int(val)), ha='center', va='bottom', fontsize=8)
-        
-        plt.tight_layout()
-        
-        # Base64エンコード
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
-        buffer.seek(0)
-        img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        plt.close(fig)
-        
-        return img_base64
+    col_chart, col_table = st.columns(2)
     
-    # P2値（経産）HTML
-    p2_html = ""
-    if p2_data:
-        try:
-            chart_base64 = create_bar_chart_base64(
-                p2_data['table'], 
-                '離乳時P2値分布（経産）', 
-                '#1f77b4'
-            )
-            p2_html = f"""
-            <h2>【離乳時P2値分布（経産）】</h2>
-            <p>離乳日: {p2_data['weaning_date']} / ロット: {p2_data['lot']} / 平均P2値: {p2_data['average']:.1f}mm</p>
-            <div class="chart-container">
-                <img src="data:image/png;base64,{chart_base64}" alt="P2値分布（経産）" style="max-width: 500px; width: 65%;">
-                <div class="table-side">
-                    {p2_data['table'].to_html(index=False)}
-                </div>
-            </div>
-            """
-        except Exception as e:
-            p2_html = f"""
-            <h2>【離乳時P2値分布（経産）】</h2>
-            <p>離乳日: {p2_data['weaning_date']} / ロット: {p2_data['lot']} / 平均P2値: {p2_data['average']:.1f}mm</p>
-            {p2_data['table'].to_html(index=False)}
-            """
-    
-    # P2値（初産）HTML
-    gilt_p2_html = ""
-    if gilt_p2_data:
-        try:
-            chart_base64 = create_bar_chart_base64(
-                gilt_p2_data['table'], 
-                '種付時P2値分布（初産）', 
-                '#ff7f0e'
-            )
-            gilt_p2_html = f"""
-            <h2>【種付時P2値分布（初産）】</h2>
-            <p>種付開始週: {week_id} / 平均P2値: {gilt_p2_data['average']:.1f}mm</p>
-            <div class="chart-container">
-                <img src="data:image/png;base64,{chart_base64}" alt="P2値分布（初産）" style="max-width: 500px; width: 65%;">
-                    {gilt_p2_data['table'].to_html(index=False)}
-                </div>
-            </div>
-            """
-        except Exception as e:
-            gilt_p2_html = f"""
-            <h2>【種付時P2値分布（初産）】</h2>
-            <p>種付開始週: {week_id} / 平均P2値: {gilt_p2_data['average']:.1f}mm</p>
-            {gilt_p2_data['table'].to_html(index=False)}
-            """
-    
-    # 採精レポートHTML
-    semen_html = ""
-    if semen_report is not None and len(semen_report) > 0:
-        semen_html = f"""
-        <h2>【採精レポート】</h2>
-        {semen_report.to_html(index=False)}
-        """
-    
-    # 週コメントHTML
-    comment_html = ""
-    if week_comment:
-        comment_html = f"""
-        <h2>【週のコメント】</h2>
-        <div class="comment-box">{week_comment.replace(chr(10), '<br>')}</div>
-        """
-    
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <title>鑑定落ちリスト_{farm_name}_{week_id}</title>
-        <style>
-            @media print {{
-                body {{ -webkit-print-color-adjust: exact; print-color-adjust: exact; }}
-            }}
-            body {{
-                font-family: "Hiragino Sans", "Hiragino Kaku Gothic ProN", "Noto Sans JP", "メイリオ", sans-serif;
-                font-size: 11px;
-                line-height: 1.4;
-                color: #333;
-                max-width: 1000px;
-                margin: 0 auto;
-                padding: 20px;
-            }}
-            h1 {{
-                font-size: 20px;
-                text-align: center;
-                margin-bottom: 5px;
-                color: #1f77b4;
-            }}
-            h2 {{
-                font-size: 14px;
-                margin-top: 20px;
-                margin-bottom: 10px;
-                padding-bottom: 3px;
-                border-bottom: 2px solid #1f77b4;
-            }}
-            .header-info {{
-                text-align: center;
-                margin-bottom: 20px;
-            }}
-            .summary-container {{
-                display: flex;
-                justify-content: center;
-                gap: 30px;
-                margin: 20px 0;
-            }}
-            .summary-item {{
-                text-align: center;
-                padding: 15px 25px;
-                background-color: #f0f2f6;
-                border-radius: 10px;
-            }}
-            .summary-item .label {{ font-size: 12px; color: #666; }}
-            .summary-item .rate {{ font-size: 28px; font-weight: bold; }}
-            .summary-item .count {{ font-size: 14px; color: #333; }}
-            .rate-total {{ color: #1f77b4; }}
-            .rate-sow {{ color: #2ca02c; }}
-            .rate-gilt {{ color: #ff7f0e; }}
-            .two-column {{
-                display: flex;
-                gap: 30px;
-            }}
-            .two-column > div {{ flex: 1; }}
-            .chart-container {{
-                display: flex;
-                gap: 15px;
-                align-items: flex-start;
-                margin: 10px 0;
-            }}
-            .chart-container img {{
-                flex-shrink: 0;
-                max-width: 500px;
-                width: 65%;
-            }}
-            .table-side {{
-                flex: 1;
-                font-size: 9px;
-            }}
-            .table-side table {{
-                font-size: 9px;
-            }}
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin: 10px 0;
-                font-size: 10px;
-            }}
-            th, td {{
-                border: 1px solid #ddd;
-                padding: 6px;
-                text-align: center;
-            }}
-            th {{
-                background-color: #f0f2f6;
-                font-weight: bold;
-            }}
-            .comment-box {{
-                background-color: #f9f9f9;
-                border: 1px solid #ddd;
-                border-radius: 5px;
-                padding: 15px;
-                margin-top: 10px;
-                white-space: pre-wrap;
-            }}
-            .print-button {{
-                position: fixed;
-                top: 10px;
-                right: 10px;
-                padding: 10px 20px;
-                background-color: #1f77b4;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                cursor: pointer;
-                font-size: 14px;
-            }}
-            .print-button:hover {{ background-color: #1565a0; }}
-            @media print {{
-                .print-button {{ display: none; }}
-            }}
-        </style>
-    </head>
-    <body>
-        <button class="print-button" onclick="window.print()">🖨️ 印刷 / PDF保存</button>
-        
-        <h1>鑑定落ちリスト</h1>
-        
-        <div class="header-info">
-            <p><strong>種付期間:</strong> {start_date.strftime('%Y-%m-%d')} ～ {end_date.strftime('%Y-%m-%d')}</p>
-            <p><strong>農場:</strong> {farm_name}</p>
-            <p><strong>作成日:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M')}</p>
-        </div>
-        
-        <h2>【受胎率サマリー】</h2>
-        <div class="summary-container">
-            <div class="summary-item">
-                <div class="label">合計</div>
-                <div class="rate rate-total">{fertility_rate:.1f}%</div>
-                <div class="count">{int(pregnant)} / {total} 頭</div>
-            </div>
-            <div class="summary-item">
-                <div class="label">経産</div>
-                <div class="rate rate-sow">{sow_rate:.1f}%</div>
-                <div class="count">{int(df_sow['受胎'].sum())} / {len(df_sow)} 頭</div>
-            </div>
-            <div class="summary-item">
-                <div class="label">初産(Gilt)</div>
-                <div class="rate rate-gilt">{gilt_rate:.1f}%</div>
-                <div class="count">{int(df_gilt['受胎'].sum())} / {len(df_gilt)} 頭</div>
-            </div>
-        </div>
-        
-        <div class="two-column">
-            <div>
-                <h2>【産次別受胎率】</h2>
-                {df_parity.to_html(index=False)}
-            </div>
-            <div>
-                <h2>【精液別受胎率】</h2>
-                {semen_stats.to_html(index=False)}
-            </div>
-        </div>
-        
-        <h2>【不受胎リスト】</h2>
-        {not_pregnant_html}
-        
-        {p2_html}
-        {gilt_p2_html}
-        {semen_html}
-        {comment_html}
-        
-    </body>
-    </html>
-    """
-    return html
+    with col_chart:
+        import altair as alt
+        chart = alt.Chart(p2['chart'].rename(columns={'P2値(mm)': 'P2値'})).mark_bar(
+            **({'color': color} if color else {})
+        ).encode(
+            x=alt.X('P2値:N', sort=p2['chart']['P2値(mm)'].tolist(), title='P2値'),
+            y=alt.Y('頭数:Q', title='頭数'),
+            tooltip=['P2値', '頭数']
+        ).properties(height=300)
+        st.altair_chart(chart, use_container_width=True)
+    
+    with col_table:
+        display_centered_table(p2['table'], height=300)
+    
+    st.write(f"**合計:** {p2['total']}頭 / **平均P2値:** {p2['average']:.1f}mm")
+
+PRINT_REPORT_CACHE_SIZE = 8
+
+def print_report_key(*parts):
+    """印刷用ページのデータ版キー（表示中のデータが同じなら同じキー）"""
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            digest.update(pd.util.hash_pandas_object(part.astype(str), index=False).to_numpy().tobytes())
+            digest.update('|'.join(map(str, part.columns)).encode('utf-8'))
+        else:
+            digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def sheet_sources(spreadsheet, farm_name, week_id):
+    """P2値・採精レポートを読み込み済みの索引から引く関数（build_report_model に渡す）"""
+    if spreadsheet:
+        return index_sources(get_p2_index(spreadsheet), load_all_semen_reports(spreadsheet), farm_name, week_id)
+    return lambda weaning_date, start_date: {'p2_record': None, 'gilt_p2_record': None, 'semen_week': None}
+
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def get_report_model(data_key, _df, farm_name, week_id, _week_notes, _fetch_sources, _repeat, intervals):
+    """レポートモデルを作成（同じデータ版・農場・週なら作成済みのものを再利用）"""
+    return build_report_model(_df, farm_name, week_id, _week_notes, _fetch_sources, _repeat, intervals)
+
 
 # ===================
 # スプレッドシート接続
@@ -945,14 +676,35 @@ spreadsheet = get_google_sheet()
 
 if spreadsheet:
     st.sidebar.success("✅ Googleスプレッドシート接続済み")
+    if st.sidebar.button("🔄 再読み込み", help="スプレッドシートを直接編集した内容を反映します"):
+        reload_saved_data()
     with st.spinner("保存データを読み込み中..."):
-        comments_data = load_data_from_sheet(spreadsheet)
-        farm_weeks, all_farms = get_saved_farms_and_weeks(spreadsheet)
+        sync_saved_data(spreadsheet)
+        annotations = get_week_annotations(spreadsheet)
+        record_store = get_record_store(spreadsheet)
+        farm_weeks, all_farms = get_saved_farms_and_weeks(record_store)
+        sow_index = get_sow_index(record_store)
+        fertility_monitor = get_fertility_monitor(record_store)
+        report_snapshots = get_report_snapshots()
 else:
     st.sidebar.warning("⚠️ オフラインモード")
-    comments_data = {"pig_details": {}, "repeat_breeding": {}, "week_comments": {}}
+    annotations = get_week_annotations(None)
     farm_weeks = {}
     all_farms = []
+    record_store = get_record_store(None)
+    sow_index = get_sow_index(record_store)
+    fertility_monitor = get_fertility_monitor(record_store)
+    report_snapshots = ReportSnapshots()
+
+# 受胎率低下アラーム（CUSUM / EWMA）
+fertility_alarms = fertility_monitor.alarms()
+if len(fertility_alarms) > 0:
+    with st.sidebar.expander(f"🚨 受胎率アラーム（{len(fertility_alarms)}件）", expanded=True):
+        for _, alarm in fertility_alarms.iterrows():
+            st.markdown(
+                f"**{alarm['農場']}** {alarm['週']}週 / {alarm['区分']}: {alarm['対象']}  \n"
+                f"受胎率 {alarm['受胎率']:.1f}%（基準 {alarm['基準受胎率']:.1f}%）{alarm['検知']}"
+            )
 
 # タイトル
 st.title("鑑定落ちリスト")
@@ -971,7 +723,7 @@ if 'temp_week_comment' not in st.session_state:
 st.sidebar.header("📁 データ選択")
 
 # データソースの選択肢を設定
-data_sources = ["CSVをアップロード", "過去データから選択", "期間別レポート"]
+data_sources = ["CSVをアップロード", "過去データから選択", "期間別レポート", "農場比較", "雄豚別採精成績", "種付計画シミュレーション"]
 
 data_source = st.sidebar.radio(
     "データの読み込み方法",
@@ -979,6 +731,12 @@ data_source = st.sidebar.radio(
     index=0
 )
 
+show_ci = st.sidebar.checkbox(
+    "受胎率の95%信頼区間を表示",
+    value=True,
+    help="頭数の少ないグループは区間が広くなります。推定受胎率は全体の受胎率で補正した値です"
+)
+
 # 編集モードの管理
 if 'edit_mode' not in st.session_state:
     st.session_state.edit_mode = False
@@ -997,6 +755,8 @@ if data_source != "過去データから選択":
 df = None
 week_id = None
 farm_name = None
+week_snapshot = None
+snapshot_version = None
 
 if data_source == "CSVをアップロード":
     uploaded_csv = st.sidebar.file_uploader(
@@ -1036,10 +796,17 @@ elif data_source == "過去データから選択":
                 if selected_week:
                     farm_name = selected_farm
                     week_id = selected_week
-                    with st.spinner("📂 データを読み込み中..."):
-                        df = load_breeding_records(spreadsheet, week_id, farm_name)
-                        if df is not None:
-                            df['受胎'] = df['妊娠鑑定結果'] == '受胎確定'
+                    # 閲覧モードでは保存時のスナップショットから表示（P2値・採精レポートの行が変わっていれば作り直す）
+                    if not st.session_state.edit_mode:
+                        snapshot_version = week_snapshot_version(record_store, annotations, spreadsheet, farm_name, week_id)
+                        week_snapshot = report_snapshots.get(farm_name, week_id, snapshot_version)
+                    if week_snapshot is not None:
+                        df = week_snapshot['records'].copy()
+                    else:
+                        df = record_store.week_frame(farm_name, week_id)
+                        df = df.copy() if df is not None else None
+                    if df is not None:
+                        df['受胎'] = df['妊娠鑑定結果'] == '受胎確定'
                         # 編集モード切り替えボタン
                     if not st.session_state.edit_mode:
                         if st.sidebar.button("編集する"):
@@ -1141,10 +908,14 @@ elif data_source == "期間別レポート":
                         st.session_state['period_type'] = period_type
                         if period_type == "月単位":
                             st.session_state['period_label'] = f"{selected_year}年{selected_month}月"
+                            period_start = pd.Timestamp(selected_year, selected_month, 1)
+                            st.session_state['period_range'] = (period_start, period_start + pd.offsets.MonthEnd(0))
                         elif period_type == "年単位":
                             st.session_state['period_label'] = f"{selected_year}年"
+                            st.session_state['period_range'] = (pd.Timestamp(selected_year, 1, 1), pd.Timestamp(selected_year, 12, 31))
                         else:
                             st.session_state['period_label'] = f"{custom_start} ～ {custom_end}"
+                            st.session_state['period_range'] = (pd.Timestamp(custom_start), pd.Timestamp(custom_end))
                         
                         st.rerun()
                     else:
@@ -1159,125 +930,343 @@ elif data_source == "期間別レポート":
         df = st.session_state['period_df']
         farm_name = st.session_state['period_farm_name']
 
+elif data_source == "農場比較":
+    st.session_state.edit_mode = False  # 閲覧のみ
+    
+    compare_freq = st.sidebar.radio("集計単位", ["週", "月"], horizontal=True, key="compare_freq")
+    current_year = datetime.now().year
+    col_start, col_end = st.sidebar.columns(2)
+    with col_start:
+        compare_start = st.date_input(
+            "開始日",
+            value=datetime(current_year, 1, 1),
+            key="compare_start"
+        )
+    with col_end:
+        compare_end = st.date_input(
+            "終了日",
+            value=datetime.now(),
+            key="compare_end"
+        )
+
+elif data_source == "雄豚別採精成績":
+    st.session_state.edit_mode = False  # 閲覧のみ
+    
+    # 採精レポートはこの画面を開いたときだけ読み込む（内容が変わったときだけ再集計）
+    if spreadsheet:
+        record_store.set_table("採精レポート", prepare_semen_collections(load_all_semen_reports(spreadsheet)))
+    semen_table = combine_semen_outcomes(record_store.rollup("採精成績"))
+    
+    if semen_table is not None and len(semen_table) > 0:
+        boar_options = sorted(semen_table['個体番号'].unique())
+        selected_boars = st.sidebar.multiselect("雄豚（個体番号）", boar_options)
+        
+        col_start, col_end = st.sidebar.columns(2)
+        with col_start:
+            semen_start = st.date_input(
+                "開始日",
+                value=semen_table['採精日'].min().date(),
+                key="semen_start"
+            )
+        with col_end:
+            semen_end = st.date_input(
+                "終了日",
+                value=semen_table['採精日'].max().date(),
+                key="semen_end"
+            )
+    else:
+        st.sidebar.info("採精レポートと紐付く種付記録がありません")
+
+elif data_source == "種付計画シミュレーション":
+    st.session_state.edit_mode = False  # 閲覧のみ
+    
+    if all_farms:
+        sim_farm = st.sidebar.selectbox("農場を選択", all_farms, key="sim_farm")
+        sim_weeks = st.sidebar.number_input("基準期間（直近の週数）", min_value=4, max_value=104, value=26, step=1)
+        sim_target = st.sidebar.number_input("目標分娩頭数（1週あたり）", min_value=1, max_value=500, value=30, step=1)
+        sim_confidence = st.sidebar.slider("達成確率", min_value=50, max_value=99, value=90, step=1, format="%d%%")
+        sim_gilt_share = st.sidebar.slider("初産の割合（0で過去実績どおり）", min_value=0, max_value=100, value=0, step=5, format="%d%%")
+        sim_trials = st.sidebar.selectbox("試行回数", [5000, 20000, 50000, 100000], index=1)
+    else:
+        st.sidebar.info("保存済みのデータがありません")
+
 # ===================
-# メインコンテンツ
+# 印刷用ページの一括出力
 # ===================
-if df is not None and (week_id is not None or data_source == "期間別レポート"):
-    # 期間別レポートの場合は別のヘッダー
-    if data_source == "期間別レポート":
-        period_label = st.session_state.get('period_label', '')
-        st.header(f"期間別受胎率レポート")
-        st.subheader(f"農場: {farm_name}")
-        st.subheader(f"期間: {period_label}")
-        st.caption(f"作成日: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-        
-    else:
-        start_date = pd.to_datetime(df['種付日'].min())
-        end_date = pd.to_datetime(df['種付日'].max())
-        
-    start_date = pd.to_datetime(df['種付日'].min())
-    end_date = pd.to_datetime(df['種付日'].max())
+if spreadsheet and all_farms:
+    with st.sidebar.expander("📦 印刷用ページの一括出力"):
+        export_farms = st.multiselect("農場", all_farms, default=all_farms, key="export_farms")
+        export_weeks = sorted({week for farm in export_farms for week in farm_weeks.get(farm, [])})
+        if export_weeks:
+            export_from, export_to = st.select_slider(
+                "種付開始週", options=export_weeks, value=(export_weeks[0], export_weeks[-1]), key="export_range"
+            )
+            export_pairs = [
+                (farm, week) for farm in export_farms for week in farm_weeks.get(farm, [])
+                if export_from <= week <= export_to
+            ]
+            export_svg = st.checkbox("グラフをSVGで埋め込む", value=True, key="export_chart_svg")
+            if st.button(f"{len(export_pairs)}件を作成", key="export_reports"):
+                with st.spinner("印刷用ページを作成中..."):
+                    reports = export_reports(
+                        record_store, annotations, get_p2_index(spreadsheet),
+                        load_all_semen_reports(spreadsheet), export_pairs,
+                        chart_format='svg' if export_svg else 'png', intervals=show_ci
+                    )
+                    st.session_state.export_zip = (export_from, export_to, reports_zip(reports), len(reports))
+            if st.session_state.get('export_zip'):
+                zip_from, zip_to, zip_data, zip_count = st.session_state.export_zip
+                st.download_button(
+                    label=f"📥 ZIPをダウンロード（{zip_count}件）",
+                    data=zip_data,
+                    file_name=f"鑑定落ちリスト_{zip_from}_{zip_to}.zip",
+                    mime="application/zip",
+                    key="export_download"
+                )
+
+# ===================
+# 種付計画シミュレーション
+# ===================
+if data_source == "種付計画シミュレーション":
+    st.header("種付計画シミュレーション")
     
-    # ヘッダー情報
-    st.header(f"種付期間: {start_date.strftime('%Y-%m-%d')} ～ {end_date.strftime('%Y-%m-%d')}")
-    st.subheader(f"農場: {farm_name}")
-    st.caption(f"作成日: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+    if not all_farms:
+        st.stop()
     
-    # ===================
-    # 受胎率サマリー
-    # ===================
-    st.subheader("【受胎率サマリー】")
+    sim_end = pd.Timestamp(datetime.now().date())
+    sim_start = sim_end - pd.Timedelta(weeks=int(sim_weeks))
+    sim_cube = slice_by_period(record_store.rollup("受胎キューブ", sim_farm), sim_farm, sim_start, sim_end)
     
-    total = len(df)
-    pregnant = df['受胎'].sum()
-    fertility_rate = pregnant / total * 100
+    if sim_cube is None or len(sim_cube) == 0:
+        st.info(f"直近{int(sim_weeks)}週の種付記録がありません")
+        st.stop()
     
-    df_sow = df[df['産次'].astype(int) >= 2]
-    sow_rate = df_sow['受胎'].sum() / len(df_sow) * 100 if len(df_sow) > 0 else 0
+    sim_cells = breeding_cells(sim_cube, gilt_share=sim_gilt_share / 100 if sim_gilt_share > 0 else None)
+    loss_heads, loss_events = historical_losses(record_store.rollup("妊娠豚", sim_farm))
     
-    df_gilt = df[df['産次'].astype(int) == 1]
-    gilt_rate = df_gilt['受胎'].sum() / len(df_gilt) * 100 if len(df_gilt) > 0 else 0
+    st.caption(f"農場: {sim_farm} / 基準期間: {sim_start.strftime('%Y-%m-%d')} ～ {sim_end.strftime('%Y-%m-%d')} / "
+               f"損耗率（流産・分娩前廃用）: {loss_events} / {loss_heads} 頭")
     
-    col1, col2, col3 = st.columns(3)
+    # 結果は実行時の条件と一緒に保持し、条件を変えたら表示しない
+    sim_inputs = (sim_farm, int(sim_weeks), int(sim_target), sim_confidence, sim_gilt_share, int(sim_trials))
+    if st.session_state.get('sim_result', (None, None))[0] != sim_inputs:
+        st.session_state.pop('sim_result', None)
     
-    with col1:
-        st.markdown(f"""
-        <div style="text-align: center; padding: 10px; background-color: #f0f2f6; border-radius: 10px;">
-            <p style="margin: 0; font-size: 16px; color: #666;">合計</p>
-            <p style="margin: 0; font-size: 36px; font-weight: bold; color: #1f77b4;">{fertility_rate:.1f}%</p>
-            <p style="margin: 0; font-size: 18px; color: #333;">{int(pregnant)} / {total} 頭</p>
-        </div>
-        """, unsafe_allow_html=True)
+    if st.button("▶ シミュレーション実行", type="primary"):
+        with st.spinner(f"{sim_trials:,}回の試行を実行中..."):
+            st.session_state['sim_result'] = (sim_inputs, simulate_breeding_target(
+                sim_cells, loss_heads, loss_events,
+                target=int(sim_target), confidence=sim_confidence / 100, n_trials=int(sim_trials)
+            ))
     
-    with col2:
-        st.markdown(f"""
-        <div style="text-align: center; padding: 10px; background-color: #f0f2f6; border-radius: 10px;">
-            <p style="margin: 0; font-size: 16px; color: #666;">経産</p>
-            <p style="margin: 0; font-size: 36px; font-weight: bold; color: #2ca02c;">{sow_rate:.1f}%</p>
-            <p style="margin: 0; font-size: 18px; color: #333;">{int(df_sow['受胎'].sum())} / {len(df_sow)} 頭</p>
-        </div>
-        """, unsafe_allow_html=True)
+    if 'sim_result' in st.session_state:
+        sim_required, sim_table, sim_distribution = st.session_state['sim_result'][1]
+        
+        if sim_required is None:
+            st.warning("試算範囲内で目標を達成できる種付頭数が見つかりませんでした")
+        else:
+            st.metric(f"必要種付頭数（達成確率 {sim_confidence}%）", f"{sim_required}頭/週")
+            
+            import altair as alt
+            col_sim1, col_sim2 = st.columns(2)
+            with col_sim1:
+                st.subheader("【種付頭数と達成確率】")
+                sim_curve = alt.Chart(sim_table).mark_line().encode(
+                    x=alt.X('種付頭数:Q', title='種付頭数'),
+                    y=alt.Y('達成確率:Q', title='目標達成確率 (%)', scale=alt.Scale(domain=[0, 100])),
+                    tooltip=['種付頭数', alt.Tooltip('達成確率:Q', format='.1f')]
+                ).properties(height=300)
+                st.altair_chart(sim_curve, use_container_width=True)
+            with col_sim2:
+                st.subheader(f"【{sim_required}頭種付時の分娩頭数】")
+                sim_hist = alt.Chart(sim_distribution).mark_bar(color='#2ca02c').encode(
+                    x=alt.X('分娩頭数:O', title='分娩頭数'),
+                    y=alt.Y('試行数:Q', title='試行数'),
+                    tooltip=['分娩頭数', '試行数']
+                ).properties(height=300)
+                st.altair_chart(sim_hist, use_container_width=True)
+        
+        st.subheader("【区分別の受胎実績（シミュレーションに使用）】")
+        cells_display = sim_cells.copy()
+        cells_display['受胎率'] = (cells_display['受胎'] / cells_display['種付'] * 100).round(1).astype(str) + '%'
+        cells_display['構成比'] = (cells_display['構成比'] * 100).round(1).astype(str) + '%'
+        display_centered_table(cells_display[['産次区分', '精液', '種付', '受胎', '受胎率', '構成比']])
+    st.stop()
+
+# ===================
+# 農場比較
+# ===================
+if data_source == "農場比較":
+    st.header("農場比較")
+    st.caption(f"期間: {compare_start} ～ {compare_end} / 集計単位: {compare_freq}")
     
-    with col3:
-        st.markdown(f"""
-        <div style="text-align: center; padding: 10px; background-color: #f0f2f6; border-radius: 10px;">
-            <p style="margin: 0; font-size: 16px; color: #666;">初産(Gilt)</p>
-            <p style="margin: 0; font-size: 36px; font-weight: bold; color: #ff7f0e;">{gilt_rate:.1f}%</p>
-            <p style="margin: 0; font-size: 18px; color: #333;">{int(df_gilt['受胎'].sum())} / {len(df_gilt)} 頭</p>
-        </div>
-        """, unsafe_allow_html=True)
+    df_compare = get_farm_comparison(record_store, record_store.version, compare_freq, compare_start, compare_end)
     
-    st.write("")
+    if df_compare is None or len(df_compare) == 0:
+        st.info("指定期間の種付記録がありません")
+        st.stop()
     
-    # ===================
-    # 産次別 & 精液別
-    # ===================
+    import altair as alt
+    
+    period_format = '%Y-%m' if compare_freq == "月" else '%Y-%m-%d'
+    df_compare['期間'] = df_compare['期間'].dt.strftime(period_format)
+    
+    # ヒートマップ
+    st.subheader("【受胎率ヒートマップ】")
+    heatmap = alt.Chart(df_compare).mark_rect().encode(
+        x=alt.X('期間:O', title=compare_freq),
+        y=alt.Y('farm_name:N', title='農場'),
+        color=alt.Color('受胎率:Q', title='受胎率 (%)', scale=alt.Scale(scheme='redyellowgreen', domain=[50, 100], clamp=True)),
+        tooltip=[alt.Tooltip('farm_name:N', title='農場'), '期間', '種付', '受胎', alt.Tooltip('受胎率:Q', format='.1f')]
+    ).properties(height=max(60 * df_compare['farm_name'].nunique(), 120))
+    st.altair_chart(heatmap, use_container_width=True)
+    
+    # 農場ごとのサマリー
+    farm_summary = df_compare.groupby('farm_name').agg(種付=('種付', 'sum'), 受胎=('受胎', 'sum')).reset_index()
+    farm_summary['受胎率'] = (farm_summary['受胎'] / farm_summary['種付'] * 100).round(1)
+    if show_ci:
+        farm_summary = add_interval_columns(farm_summary)
+    farm_summary['受胎率'] = farm_summary['受胎率'].astype(str) + '%'
+    farm_summary = farm_summary.rename(columns={'farm_name': '農場'})
+    
+    # 期間 × 農場の受胎率表
+    rate_pivot = df_compare.pivot(index='期間', columns='farm_name', values='受胎率')
+    count_pivot = df_compare.pivot(index='期間', columns='farm_name', values='種付')
+    rate_display = rate_pivot.map(lambda v: f"{v:.1f}%" if pd.notna(v) else '-')
+    rate_display = rate_display + count_pivot.map(lambda v: f"（{int(v)}頭）" if pd.notna(v) else '')
+    rate_display = rate_display.reset_index().rename_axis(columns=None)
+    
+    col_summary, col_pivot = st.columns([1, 2])
+    with col_summary:
+        st.subheader("【農場別サマリー】")
+        display_centered_table(farm_summary)
+    with col_pivot:
+        st.subheader(f"【{compare_freq}別受胎率】")
+        display_centered_table(rate_display, height=500)
+    
+    # 農場別の不受胎要因
+    st.subheader("【農場別 不受胎の要因】")
+    compare_cube = slice_by_period(record_store.rollup("受胎キューブ"), None, compare_start, compare_end)
+    farm_failures = failure_breakdown(compare_cube, 'farm_name')
+    farm_failures_melted = farm_failures.melt(
+        id_vars=['farm_name'], value_vars=FAILURE_MODES, var_name='要因', value_name='頭数'
+    )
+    farm_failure_chart = alt.Chart(farm_failures_melted).mark_bar().encode(
+        y=alt.Y('farm_name:N', title='農場'),
+        x=alt.X('頭数:Q', title='不受胎頭数', stack='zero'),
+        color=alt.Color('要因:N', title='要因',
+                       scale=alt.Scale(domain=FAILURE_MODES,
+                                       range=['#ff7f0e', '#d62728', '#7f7f7f', '#c7c7c7'])),
+        tooltip=[alt.Tooltip('farm_name:N', title='農場'), '要因', '頭数']
+    ).properties(height=max(40 * len(farm_failures), 120))
+    st.altair_chart(farm_failure_chart, use_container_width=True)
+    st.stop()
+
+# ===================
+# 雄豚別採精成績
+# ===================
+if data_source == "雄豚別採精成績":
+    st.header("雄豚別 採精成績と受胎成績")
+    
+    if semen_table is None or len(semen_table) == 0:
+        st.info("保存済みの種付記録と採精レポートを紐付けられるデータがありません")
+        st.stop()
+    
+    df_semen_view = filter_semen_outcomes(semen_table, selected_boars, semen_start, semen_end)
+    
+    if len(df_semen_view) == 0:
+        st.info("条件に一致する採精データがありません")
+        st.stop()
+    
+    # 雄豚ごとのまとめ
+    st.subheader("【雄豚別サマリー】")
+    boar_summary = df_semen_view.groupby('個体番号').agg(
+        採精回数=('採精日', 'count'),
+        平均採精量=('採精量', 'mean'),
+        平均精子数=('精子数', 'mean'),
+        種付=('種付', 'sum'),
+        受胎=('受胎', 'sum')
+    ).reset_index()
+    boar_summary['受胎率'] = (boar_summary['受胎'] / boar_summary['種付'] * 100).round(1).astype(str) + '%'
+    boar_summary['平均採精量'] = boar_summary['平均採精量'].round(1)
+    boar_summary['平均精子数'] = boar_summary['平均精子数'].round(1)
+    boar_summary.columns = ['個体番号', '採精回数', '平均採精量(ml)', '平均精子数(億)', '種付', '受胎', '受胎率']
+    display_centered_table(boar_summary.fillna(''))
+    
+    # 採精ごとの明細
+    st.subheader("【採精ごとの受胎成績】")
+    df_semen_detail = df_semen_view.copy()
+    df_semen_detail['採精日'] = df_semen_detail['採精日'].dt.strftime('%Y-%m-%d')
+    df_semen_detail['受胎率'] = df_semen_detail['受胎率'].astype(str) + '%'
+    df_semen_detail = df_semen_detail[['採精日', '個体番号', '採精量', '精子数', '容量', '1号', '2号', '種付', '受胎', '受胎率']]
+    df_semen_detail.columns = ['採精日', '個体番号', '採精量(ml)', '精子数(億)', '容量(ml)', '1号(本)', '2号(本)', '種付', '受胎', '受胎率']
+    display_centered_table(df_semen_detail.fillna(''), height=600)
+    
+    st.download_button(
+        label="CSVダウンロード",
+        data=df_semen_view.to_csv(index=False).encode('utf-8-sig'),
+        file_name="雄豚別採精成績.csv",
+        mime="text/csv"
+    )
+    st.stop()
+
+# ===================
+# 週レポートの各セクション（フラグメント）
+# ===================
+# 各セクションは受け取った引数だけで描画し、セクション内の入力操作ではそのセクションだけを再実行する
+def current_repeat_breeding(saved_repeat):
+    """表示に使う再発付けの頭数（編集モードでは入力中の値）"""
+    if st.session_state.edit_mode and 'repeat_total' in st.session_state:
+        return {
+            "種付": to_halfwidth(st.session_state.repeat_total),
+            "受胎": to_halfwidth(st.session_state.repeat_pregnant)
+        }
+    return saved_repeat
+
+def week_report_model(inputs, repeat):
+    """レポートモデルを取得（inputs は農場・週・種付記録など、repeat は再発付けの頭数）"""
+    key = print_report_key(
+        inputs['data_source'], inputs['farm_name'], inputs['week_id'], inputs['df'],
+        inputs['week_notes']["pig_details"], inputs['week_notes']["repeat_breeding"], repeat, inputs['show_ci']
+    )
+    report = get_report_model(key, inputs['df'], inputs['farm_name'], inputs['week_id'], inputs['week_notes'],
+                              inputs['fetch_sources'], repeat, inputs['show_ci'])
+    report['key'] = key
+    return report
+
+@st.fragment
+def summary_section(report):
+    """受胎率サマリー"""
+    st.subheader("【受胎率サマリー】")
+    
+    for col, item in zip(st.columns(3), report['summary']):
+        with col:
+            st.markdown(f"""
+            <div style="text-align: center; padding: 10px; background-color: #f0f2f6; border-radius: 10px;">
+                <p style="margin: 0; font-size: 16px; color: #666;">{item['label']}</p>
+                <p style="margin: 0; font-size: 36px; font-weight: bold; color: {item['color']};">{item['rate']:.1f}%</p>
+                <p style="margin: 0; font-size: 18px; color: #333;">{item['pregnant']} / {item['total']} 頭</p>
+            </div>
+            """, unsafe_allow_html=True)
+    
+    st.write("")
+
+@st.fragment
+def rates_section(report, inputs, saved_repeat, auto_repeat=None):
+    """産次別・精液別受胎率（再発付けの入力はこのセクションだけ再実行して反映）
+
+    auto_repeat は履歴から自動判定した再発付けの頭数（手入力が保存されていない週のみ）。
+    """
+    repeat = current_repeat_breeding(saved_repeat)
+    if repeat != report['repeat']:
+        report = week_report_model(inputs, repeat)
     col_left, col_right = st.columns(2)
     
     with col_left:
         st.subheader("【産次別受胎率】")
+        display_centered_table(report['df_parity'])
         
-        parity_data = []
-        for parity in sorted(df['産次'].astype(int).unique()):
-            df_p = df[df['産次'].astype(int) == parity]
-            p_total = len(df_p)
-            p_pregnant = df_p['受胎'].sum()
-            p_rate = p_pregnant / p_total * 100 if p_total > 0 else 0
-            parity_data.append({
-                '産次': f"{parity}産",
-                '受胎': int(p_pregnant),
-                '種付': p_total,
-                '受胎率': f"{p_rate:.1f}%"
-            })
-        
-        # 再発付けデータ
-        repeat_key = f"{farm_name}_{week_id}"
-        saved_repeat = comments_data["repeat_breeding"].get(repeat_key, {"種付": "", "受胎": ""})
-        
-        if 'temp_repeat_breeding' not in st.session_state:
-            st.session_state.temp_repeat_breeding = saved_repeat
-        
-        repeat_total = st.session_state.temp_repeat_breeding.get("種付", "")
-        repeat_pregnant = st.session_state.temp_repeat_breeding.get("受胎", "")
-        
-        if repeat_total and repeat_pregnant:
-            try:
-                rt = int(repeat_total)
-                rp = int(repeat_pregnant)
-                r_rate = rp / rt * 100 if rt > 0 else 0
-                parity_data.append({
-                    '産次': '再発付',
-                    '受胎': rp,
-                    '種付': rt,
-                    '受胎率': f"{r_rate:.1f}%"
-                })
-            except ValueError:
-                pass
-        
-        df_parity = pd.DataFrame(parity_data)
-        display_centered_table(df_parity)
-        
-       # 再発付け入力フォーム（編集モード時のみ）
+        # 再発付け入力フォーム（編集モード時のみ）
         if st.session_state.edit_mode:
             st.write("**再発付けの入力**")
             col_r1, col_r2 = st.columns(2)
@@ -1296,23 +1285,290 @@ if df is not None and (week_id is not None or data_source == "期間別レポー
                     placeholder="例: 4"
                 )
             
-            st.session_state.temp_repeat_breeding = {
+            repeat_input = {
                 "種付": to_halfwidth(repeat_total_input),
                 "受胎": to_halfwidth(repeat_pregnant_input)
             }
+            # 自動判定の値のままなら保存しない（記録を取り込み直したときに判定し直す）
+            st.session_state.temp_repeat_breeding = None if repeat_input == auto_repeat else repeat_input
     
     with col_right:
         st.subheader("【精液別受胎率】")
         
-        semen_stats = df.groupby('雄豚・精液・あて雄').agg(
-            種付=('受胎', 'count'),
-            受胎=('受胎', 'sum')
-        ).reset_index()
-        semen_stats['受胎率'] = (semen_stats['受胎'] / semen_stats['種付'] * 100).round(1).astype(str) + '%'
-        semen_stats.columns = ['精液', '種付', '受胎', '受胎率']
-        semen_stats = semen_stats.sort_values('種付', ascending=False)
+        display_centered_table(report['semen_stats'])
+
+@st.fragment
+def not_pregnant_section(report, farm_name, week_id, week_notes, df_repeat, stores):
+    """不受胎リスト（詳細入力・母豚履歴の操作はこのセクションだけ再実行）"""
+    st.subheader("【不受胎リスト】")
+    
+    df_not_pregnant = report['df_not_pregnant']
+    
+    if len(df_not_pregnant) == 0:
+        st.success("不受胎なし")
+        return
+    
+    # 連続不受胎（2回以上）の母豚を警告
+    if df_repeat is not None:
+        week_failures = repeat_breeders(df_repeat[df_repeat['week_id'] == week_id])
+        if len(week_failures) > 0:
+            flagged = [f"{row['母豚番号']}（{int(row['連続不受胎'])}回連続）" for _, row in week_failures.iterrows()]
+            st.warning("⚠️ 連続不受胎の母豚: " + "、".join(flagged))
+    
+    # 詳細入力フォーム（編集モード時のみ）
+    if st.session_state.edit_mode:
+        pig_details_input_form(df_not_pregnant, farm_name, week_id, week_notes)
+    
+    st.write("**不受胎一覧表**")
+    if st.session_state.edit_mode:
+        st.caption("💡 入力内容は「データを保存」後に反映されます")
+    
+    # 保存済みデータを表示（入力中のデータは保存後に反映される）
+    display_centered_table(report['not_pregnant_view'])
+    
+    # 母豚履歴（索引から全週の記録を取得）
+    with st.expander("🔍 母豚履歴"):
+        history_pig = st.selectbox(
+            "母豚番号",
+            df_not_pregnant['母豚番号'].astype(str).tolist(),
+            key="sow_history_pig"
+        )
+        if history_pig:
+            df_history = get_sow_history(stores['sow_index'], stores['annotations'], farm_name, history_pig)
+            if df_history is not None:
+                display_centered_table(df_history)
+            else:
+                st.info("保存済みの種付記録がありません")
+
+@st.fragment
+def p2_section(report):
+    """P2値分布（経産・初産）"""
+    st.subheader("【離乳時P2値分布（経産）】")
+    
+    if report['p2']:
+        st.write(f"**離乳日:** {report['weaning_date']} / **ロット:** {report['p2']['lot']}")
+        show_p2_distribution(report['p2'], "P2値データがありません")
+    elif report['weaning_date']:
+        st.info(f"離乳日 {report['weaning_date']} に対応するP2値データがスプレッドシートに登録されていません")
+    else:
+        st.info("経産豚の離乳データがありません")
+    
+    st.subheader("【種付時P2値分布（初産）】")
+    
+    if report['gilt_p2']:
+        st.write(f"**種付開始週:** {report['week_id']}")
+        show_p2_distribution(report['gilt_p2'], "初産P2値データがありません", color='#ff7f0e')
+    else:
+        st.info(f"種付開始週 {report['week_id']} に対応する初産P2値データがスプレッドシートに登録されていません")
+
+@st.fragment
+def semen_section(report):
+    """採精レポート（花泉1号・花泉2号のみ）"""
+    if report['semen_window'] is None:
+        return
+    st.subheader("【採精レポート】")
+    
+    if report['semen_report'] is not None:
+        previous_sunday, saturday_of_week = report['semen_window']
+        st.write(f"**対象期間:** {previous_sunday.strftime('%Y-%m-%d')} ～ {saturday_of_week.strftime('%Y-%m-%d')}")
+        display_centered_table(report['semen_report'])
+    else:
+        st.info("この週の採精レポートがスプレッドシートに登録されていません")
+
+@st.fragment
+def comment_section(saved_week_comment):
+    """週全体のコメント（入力中はこのセクションだけ再実行）"""
+    st.subheader("【週のコメント】")
+    
+    if st.session_state.edit_mode:
+        # 編集モード：入力欄を表示
+        week_comment = st.text_area(
+            "この週の鑑定落ちリストに対するコメント",
+            value=saved_week_comment,
+            height=150,
+            placeholder="必要妊豚在庫の確保状況、不受胎の原因分析、今後の対応など",
+            key="week_comment_input"
+        )
+        st.session_state.temp_week_comment = week_comment
+    elif saved_week_comment:
+        # 閲覧モード：保存済みコメントを表形式で表示（左詰め）
+        st.markdown(f"""
+        <div style="border: 1px solid #ddd; padding: 15px; background-color: white; color: #333; border-radius: 5px; margin: 10px 0; text-align: left; white-space: pre-wrap; font-size: 14px;">
+{saved_week_comment}
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.info("コメントはありません")
+
+@st.fragment
+def export_section(report, inputs, saved_repeat, is_saved, stores):
+    """保存・印刷用ページ（押したときに入力中の再発付け・コメントを読み込む）
+
+    保存に成功したら、保存済みの表示・サイドバーの週一覧を更新するためページ全体を再実行する。
+    """
+    spreadsheet = stores['spreadsheet']
+    record_store = stores['record_store']
+    annotations = stores['annotations']
+    farm_name = inputs['farm_name']
+    week_id = inputs['week_id']
+    df = inputs['df']
+    repeat = current_repeat_breeding(saved_repeat)
+    if repeat != report['repeat']:
+        report = week_report_model(inputs, repeat)
+    if st.session_state.edit_mode:
+        week_comment = st.session_state.get('temp_week_comment', '')
+    else:
+        week_comment = inputs['week_notes']["week_comment"]
+    
+    if st.session_state.edit_mode:
+        col_save, col_pdf, col_status = st.columns([1, 1, 2])
+    else:
+        col_pdf, col_status = st.columns([1, 3])
+    
+    if st.session_state.edit_mode:
+        with col_save:
+            if st.button("💾 データを保存", type="primary"):
+                with st.spinner("💾 データを保存中...しばらくお待ちください"):
+                    # 種付記録を保存
+                    records_saved = save_breeding_records(spreadsheet, df.drop(columns=['受胎']), week_id, farm_name)
+                    if records_saved:
+                        # ストアはこの週だけ差し替え（集計キャッシュも週単位で更新）
+                        record_store.put_week(farm_name, week_id, df.drop(columns=['受胎']))
+                    
+                    # 手入力データを保存（この週の分だけ）
+                    save_data = {
+                        "pig_details": week_details_table(st.session_state.temp_pig_details.get((farm_name, week_id), {})),
+                        "repeat_breeding": st.session_state.get('temp_repeat_breeding'),
+                        "week_comment": week_comment
+                    }
+                    
+                    success = save_data_to_sheet(spreadsheet, save_data, week_id, farm_name)
+                    
+                    if success:
+                        annotations.put_week(farm_name, week_id, save_data["pig_details"],
+                                             save_data["repeat_breeding"], save_data["week_comment"])
+                        # 保存した内容でレポートモデルを作り直し、週レポートのスナップショットにする（古い版は削除）
+                        if records_saved:
+                            saved_model = week_report_model(
+                                dict(inputs, week_notes=annotations.week(farm_name, week_id)), repeat
+                            )
+                            stores['report_snapshots'].put(
+                                farm_name, week_id,
+                                week_snapshot_version(record_store, annotations, spreadsheet, farm_name, week_id),
+                                {'records': df.drop(columns=['受胎']), 'sources': saved_model['sources'],
+                                 'model': saved_model}
+                            )
+                        # 自分の保存はストアに反映済みなので、更新日時の変化で読み直さない
+                        mark_saved_revision(spreadsheet)
+                        st.cache_data.clear()
+                        st.session_state.save_message = "✅ データを保存しました！"
+                        st.rerun(scope="app")
+                    else:
+                        st.error("データの保存に失敗しました")
+            save_message = st.session_state.pop('save_message', None)
+            if save_message:
+                st.success(save_message)
+
+    with col_pdf:
+        # グラフはSVG（軽量・印刷時も鮮明）かPNG画像で埋め込む
+        chart_format = 'svg' if st.checkbox("グラフをSVGで埋め込む", value=True, key="print_chart_svg") else 'png'
+        
+        # 印刷用ページは「作成」を押したときだけ生成し、同じデータなら作成済みのものを再利用
+        print_key = print_report_key(report['key'], week_comment, chart_format)
+        print_reports = st.session_state.setdefault('print_reports', {})
+        print_html = print_reports.get(print_key)
+        if print_html is None and st.button("🖨️ 印刷用ページを作成"):
+            with st.spinner("印刷用ページを作成中..."):
+                with render_env.timed('印刷用HTML生成'):
+                    print_html = generate_print_html(report, week_comment, chart_format)
+            print_reports[print_key] = print_html
+            # 直近の数週分だけ保持
+            while len(print_reports) > PRINT_REPORT_CACHE_SIZE:
+                del print_reports[next(iter(print_reports))]
+        
+        if print_html is not None:
+            # HTMLダウンロードボタン
+            st.download_button(
+                label="印刷用ページ",
+                data=print_html,
+                file_name=f"鑑定落ちリスト_{farm_name}_{week_id}.html",
+                mime="text/html",
+                help="ダウンロード後、ブラウザで開いて印刷（Cmd+P）でPDF保存できます"
+            )
+            # 描画環境の準備・印刷用ページの作成にかかった時間（直近の値）
+            st.caption(" / ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in render_env.timings().items()))
+    
+    with col_status:
+        if is_saved:
+            st.caption(f"✅ この週のデータは保存済みです")
+        else:
+            st.caption(f"⚠️ この週のデータはまだ保存されていません")
+
+# ===================
+# メインコンテンツ
+# ===================
+if df is not None and (week_id is not None or data_source == "期間別レポート"):
+    # 期間別レポートの場合は別のヘッダー
+    if data_source == "期間別レポート":
+        period_label = st.session_state.get('period_label', '')
+        st.header(f"期間別受胎率レポート")
+        st.subheader(f"農場: {farm_name}")
+        st.subheader(f"期間: {period_label}")
+        st.caption(f"作成日: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
         
-        display_centered_table(semen_stats)
+    
+    # ===================
+    # レポートモデル（画面と印刷用ページで共通。データ版・農場・週ごとに一度だけ作成）
+    # ===================
+    # 再発付けデータ
+    week_notes = annotations.week(farm_name, week_id)
+    saved_repeat = week_notes["repeat_breeding"] or {"種付": "", "受胎": ""}
+    
+    # 手入力がなければ履歴から自動判定した再発付けを使用（自動判定の値は保存しない）
+    df_repeat = None
+    auto_repeat = None
+    if week_id is not None:
+        df_repeat = get_repeat_services(record_store, record_store.version, farm_name, week_id, df)
+        if not saved_repeat.get("種付") and not saved_repeat.get("受胎"):
+            auto_total, auto_pregnant = repeat_breeding_counts(df_repeat, farm_name, week_id)
+            if auto_total > 0:
+                auto_repeat = {"種付": str(auto_total), "受胎": str(auto_pregnant)}
+                saved_repeat = auto_repeat
+    
+    # P2値・採精レポートはスナップショットがあればそこから（データ版の確認で読んだものと同じ内容）
+    if data_source == "期間別レポート":
+        fetch_sources = None
+    elif week_snapshot is not None:
+        fetch_sources = lambda weaning_date, start_date: week_snapshot['sources']
+    else:
+        fetch_sources = sheet_sources(spreadsheet, farm_name, week_id)
+    
+    report_inputs = {
+        'data_source': data_source, 'farm_name': farm_name, 'week_id': week_id, 'df': df,
+        'week_notes': week_notes, 'fetch_sources': fetch_sources, 'show_ci': show_ci,
+    }
+    current_repeat = current_repeat_breeding(saved_repeat)
+    report = week_snapshot.get('model') if week_snapshot is not None else None
+    if report is None or report['repeat'] != current_repeat or report['intervals'] != show_ci:
+        report = week_report_model(report_inputs, current_repeat)
+        # 閲覧モードで開いた保存済みの週は、次回からスナップショットで表示
+        if snapshot_version is not None:
+            report_snapshots.put(farm_name, week_id, snapshot_version, {
+                'records': df.drop(columns=['受胎']),
+                'sources': report['sources'],
+                'model': report,
+            })
+    
+    start_date = report['start_date']
+    end_date = report['end_date']
+    
+    # ヘッダー情報
+    st.header(f"種付期間: {start_date.strftime('%Y-%m-%d')} ～ {end_date.strftime('%Y-%m-%d')}")
+    st.subheader(f"農場: {farm_name}")
+    st.caption(f"作成日: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+    
+    summary_section(report)
+    rates_section(report, report_inputs, saved_repeat, auto_repeat)
     
    # 期間別レポートの場合はここで終了（不受胎リスト、P2値、採精レポートは表示しない）
     if data_source == "期間別レポート":
@@ -1382,6 +1638,9 @@ if df is not None and (week_id is not None or data_source == "期間別レポー
         
         # 受胎率に%を追加
         weekly_display['受胎率(%)'] = weekly_display['受胎率(%)'].astype(str) + '%'
+        if show_ci:
+            weekly_lower, weekly_upper = wilson_interval(weekly_display['受胎'], weekly_display['種付'])
+            weekly_display.insert(4, '95%信頼区間', format_interval(weekly_lower, weekly_upper))
         weekly_display['経産率(%)'] = weekly_display['経産率(%)'].astype(str) + '%'
         weekly_display['初産率(%)'] = weekly_display['初産率(%)'].astype(str) + '%'
         
@@ -1420,432 +1679,210 @@ if df is not None and (week_id is not None or data_source == "期間別レポー
             height=400
         )
         
-        st.altair_chart(line_chart, use_container_width=True)
+        if show_ci:
+            # 合計の受胎率に95%信頼区間を重ねる
+            ci_lower, ci_upper = wilson_interval(weekly_merged['受胎頭数'], weekly_merged['種付頭数'])
+            ci_data = pd.DataFrame({
+                '週開始日': weekly_merged['週開始日'],
+                '下限': ci_lower.round(1),
+                '上限': ci_upper.round(1)
+            })
+            ci_rule = alt.Chart(ci_data).mark_rule(color='#1f77b4', opacity=0.35, strokeWidth=6).encode(
+                x=alt.X('週開始日:N', sort=None),
+                y=alt.Y('下限:Q'),
+                y2='上限:Q',
+                tooltip=['週開始日', alt.Tooltip('下限:Q', format='.1f'), alt.Tooltip('上限:Q', format='.1f')]
+            )
+            line_chart = ci_rule + line_chart
         
-        st.divider()
-        st.success(f"集計対象: {len(df)}頭のデータを集計しました")
-        st.stop()
-    
-    # ===================
-    # 不受胎リスト
-    # ===================
-    st.subheader("【不受胎リスト】")
-    
-    df_not_pregnant = df[df['受胎'] == False].copy()
-    
-    if len(df_not_pregnant) > 0:
-        # 詳細入力フォーム（編集モード時のみ）
-        if st.session_state.edit_mode:
-            pig_details_input_form(df_not_pregnant, farm_name, week_id, comments_data)
+        st.altair_chart(line_chart, use_container_width=True)
         
-        st.write("**不受胎一覧表**")
-        if st.session_state.edit_mode:
-            st.caption("💡 入力内容は「データを保存」後に反映されます")
+        period_start, period_end = st.session_state.get('period_range', (None, None))
         
-        display_data = []
-        for idx, row in df_not_pregnant.iterrows():
-            pig_id = str(row['母豚番号'])
-            detail_key = f"{farm_name}_{week_id}_{pig_id}"
-            
-            # 保存済みデータを表示（入力中のデータは保存後に反映される）
-            details = comments_data["pig_details"].get(detail_key, {})
-            
-            hormone = row['投与ホルモン'] if pd.notna(row.get('投与ホルモン')) else ''
-            days_after_weaning = row['離乳後交配日数'] if pd.notna(row.get('離乳後交配日数')) else ''
-            if days_after_weaning != '':
-                try:
-                    days_after_weaning = int(float(days_after_weaning))
-                except:
-                    pass
+        # ===================
+        # 移動受胎率・前年同週比較
+        # ===================
+        st.subheader("【移動受胎率・前年同週比較】")
+        df_rolling = get_rolling_fertility(record_store, record_store.version, farm_name)
+        if df_rolling is not None:
+            df_rolling = slice_by_period(df_rolling, None, period_start, period_end, date_col='週開始日')
+        if df_rolling is not None and len(df_rolling) > 0:
+            rolling_chart_data = df_rolling[['週開始日', '4週移動', '13週移動', '前年4週移動']].copy()
+            rolling_chart_data['週開始日'] = rolling_chart_data['週開始日'].dt.strftime('%Y-%m-%d')
+            rolling_melted = rolling_chart_data.melt(
+                id_vars=['週開始日'], var_name='系列', value_name='受胎率'
+            ).dropna()
+            rolling_chart = alt.Chart(rolling_melted).mark_line(point=True).encode(
+                x=alt.X('週開始日:N', title='週開始日', sort=None),
+                y=alt.Y('受胎率:Q', title='受胎率 (%)', scale=alt.Scale(domain=[0, 100])),
+                color=alt.Color('系列:N', title='系列',
+                               scale=alt.Scale(domain=['4週移動', '13週移動', '前年4週移動'],
+                                               range=['#1f77b4', '#2ca02c', '#999999'])),
+                strokeDash=alt.condition(alt.datum.系列 == '前年4週移動', alt.value([4, 4]), alt.value([1, 0])),
+                tooltip=['週開始日', '系列', alt.Tooltip('受胎率:Q', format='.1f')]
+            ).properties(height=350)
+            st.altair_chart(rolling_chart, use_container_width=True)
             
-            display_data.append({
-                '種付日': row['種付日'],
-                '母豚番号': pig_id,
-                '精液': row['雄豚・精液・あて雄'],
-                '分娩予定日': row.get('分娩予定日', ''),
-                '産次': row['産次'],
-                '投与ホルモン': hormone,
-                '離乳後交配日数': days_after_weaning,
-                '分娩舎': details.get('分娩舎', ''),
-                'ロット': details.get('ロット', ''),
-                '哺乳日数': details.get('哺乳日数', ''),
-                'P2値': details.get('P2値', ''),
-                'コメント': details.get('コメント', '')
-            })
+            rolling_display = df_rolling.copy()
+            rolling_display['週開始日'] = rolling_display['週開始日'].dt.strftime('%Y-%m-%d')
+            rate_cols = ['受胎率', '4週移動', '8週移動', '13週移動', '前年同週', '前年4週移動']
+            for col in rate_cols:
+                rolling_display[col] = rolling_display[col].map(lambda v: f"{v:.1f}%" if pd.notna(v) else '-')
+            rolling_display['前年差'] = rolling_display['前年差'].map(lambda v: f"{v:+.1f}pt" if pd.notna(v) else '-')
+            display_centered_table(rolling_display, height=400)
+            st.caption("※ 移動受胎率は期間開始前の週も含めた直近N週の値です。前年差は4週移動の前年同週との差")
+        else:
+            st.info("移動受胎率を計算できるデータがありません")
         
-        df_display = pd.DataFrame(display_data)
-        display_centered_table(df_display)
-    else:
-        st.success("不受胎なし")
-    
-   # ===================
-    # P2値分布（経産）
-    # ===================
-    st.subheader("【離乳時P2値分布（経産）】")
-    
-    # スプレッドシートまたはアップロードファイルからデータを取得
-    p2_row = None
-    most_common_weaning = None
-    
-    df_sow_for_p2 = df[df['産次'].astype(int) >= 2]
-    if len(df_sow_for_p2) > 0 and df_sow_for_p2['前回離乳日'].notna().any():
-        most_common_weaning = df_sow_for_p2['前回離乳日'].value_counts().idxmax()
-        
-        # まずスプレッドシートから読み込み
-        if spreadsheet:
-            p2_record = load_p2_data_from_sheet(spreadsheet, farm_name, most_common_weaning)
-            if p2_record:
-                p2_row = p2_record
-    
-    if p2_row and most_common_weaning:
-        lot_value = p2_row.get('離乳ロット', '')
-        st.write(f"**離乳日:** {most_common_weaning} / **ロット:** {lot_value}")
-        
-        p2_columns = [str(i) for i in range(4, 21)]
-        p2_data = []
-        total_count = 0
-        weighted_sum = 0
-        
-        for p2 in p2_columns:
-            if p2 in p2_row:
-                try:
-                    count = int(p2_row[p2])
-                    total_count += count
-                    weighted_sum += int(p2) * count
-                    p2_data.append({'P2値(mm)': int(p2), '頭数': count})
-                except:
-                    pass
-        
-        if total_count > 0:
-            average_p2 = weighted_sum / total_count
-            
-            col_chart, col_table = st.columns(2)
-            
-            with col_chart:
-                import altair as alt
-                df_p2_chart = pd.DataFrame(p2_data)
-                df_p2_chart = df_p2_chart.sort_values('P2値(mm)')
-                df_p2_chart['P2値'] = df_p2_chart['P2値(mm)'].astype(str) + 'mm'
-                
-                chart = alt.Chart(df_p2_chart).mark_bar().encode(
-                    x=alt.X('P2値:N', sort=df_p2_chart['P2値'].tolist(), title='P2値'),
-                    y=alt.Y('頭数:Q', title='頭数'),
-                    tooltip=['P2値', '頭数']
-                ).properties(height=300)
-                st.altair_chart(chart, use_container_width=True)
-            
-            with col_table:
-                df_p2_table = pd.DataFrame(p2_data)
-                df_p2_table = df_p2_table[df_p2_table['頭数'] > 0]
-                df_p2_table = df_p2_table.sort_values('P2値(mm)')
-                df_p2_table['P2値(mm)'] = df_p2_table['P2値(mm)'].astype(str) + 'mm'
-                display_centered_table(df_p2_table, height=300)
+        # ===================
+        # 分娩予測・妊娠豚在庫
+        # ===================
+        st.subheader("【分娩予測・妊娠豚在庫予測】")
+        df_forecast, loss_rate = get_farrowing_forecast(
+            record_store, record_store.version, farm_name, datetime.now().strftime('%Y-%m-%d')
+        )
+        if df_forecast is not None and df_forecast['予定頭数'].sum() > 0:
+            forecast_chart_data = df_forecast.copy()
+            forecast_chart_data['週開始日'] = forecast_chart_data['週開始日'].dt.strftime('%Y-%m-%d')
+            base = alt.Chart(forecast_chart_data).encode(x=alt.X('週開始日:N', title='分娩予定週', sort=None))
+            bars = base.mark_bar(color='#2ca02c', opacity=0.7).encode(
+                y=alt.Y('予測分娩頭数:Q', title='予測分娩頭数'),
+                tooltip=['週開始日', '予定頭数', alt.Tooltip('予測分娩頭数:Q', format='.1f')]
+            )
+            inventory_line = base.mark_line(color='#1f77b4', point=True).encode(
+                y=alt.Y('予測妊娠豚在庫:Q', title='妊娠豚在庫（頭）'),
+                tooltip=['週開始日', alt.Tooltip('予測妊娠豚在庫:Q', format='.0f')]
+            )
+            st.altair_chart(
+                alt.layer(bars, inventory_line).resolve_scale(y='independent').properties(height=350),
+                use_container_width=True
+            )
             
-            st.write(f"**合計:** {total_count}頭 / **平均P2値:** {average_p2:.1f}mm")
+            forecast_display = df_forecast.copy()
+            forecast_display['週開始日'] = forecast_display['週開始日'].dt.strftime('%Y-%m-%d')
+            forecast_display['予定頭数'] = forecast_display['予定頭数'].astype(int)
+            forecast_display['予測分娩頭数'] = forecast_display['予測分娩頭数'].round(1)
+            forecast_display['予測妊娠豚在庫'] = forecast_display['予測妊娠豚在庫'].round(0).astype(int)
+            forecast_display.columns = ['分娩予定週', '分娩予定頭数', '予測分娩頭数', '妊娠豚在庫（週初）']
+            display_centered_table(forecast_display, height=400)
+            st.caption(f"※ 過去の受胎豚の損耗率（流産・分娩前廃用） {loss_rate * 100:.1f}% と損耗時期の分布を適用。"
+                       f"在庫は現在の受胎豚のみ（今後の種付は含まない）")
         else:
-            st.info("P2値データがありません")
-    else:
-        if most_common_weaning:
-            st.info(f"離乳日 {most_common_weaning} に対応するP2値データがスプレッドシートに登録されていません")
+            st.info("分娩予定の受胎豚データがありません")
+        
+        # ===================
+        # WSI・NPD（ストアの集計キャッシュから表示）
+        # ===================
+        
+        st.subheader("【離乳後交配日数（WSI）別受胎率】")
+        cube_period = slice_by_period(record_store.rollup("受胎キューブ", farm_name), farm_name, period_start, period_end)
+        if cube_period is not None and len(cube_period) > 0:
+            wsi_table = wsi_distribution(cube_period)
+            wsi_display = wsi_table.copy()
+            wsi_display['構成比'] = wsi_display['構成比'].astype(str) + '%'
+            wsi_display['受胎率'] = wsi_display['受胎率'].astype(str) + '%'
+            display_centered_table(wsi_display)
         else:
-            st.info("経産豚の離乳データがありません")
-    
-    # ===================
-    # P2値分布（初産）
-    # ===================
-    st.subheader("【種付時P2値分布（初産）】")
-    
-    # スプレッドシートまたはアップロードファイルからデータを取得
-    gilt_p2_row = None
-    
-    # まずスプレッドシートから読み込み
-    if spreadsheet:
-        gilt_p2_record = load_gilt_p2_data_from_sheet(spreadsheet, farm_name, week_id)
-        if gilt_p2_record:
-            gilt_p2_row = gilt_p2_record
-    
-    if gilt_p2_row:
-        st.write(f"**種付開始週:** {week_id}")
-        
-        p2_columns = [str(i) for i in range(4, 21)]
-        gilt_p2_data = []
-        gilt_total_count = 0
-        gilt_weighted_sum = 0
-        
-        for p2 in p2_columns:
-            if p2 in gilt_p2_row:
-                try:
-                    count = int(gilt_p2_row[p2])
-                    gilt_total_count += count
-                    gilt_weighted_sum += int(p2) * count
-                    gilt_p2_data.append({'P2値(mm)': int(p2), '頭数': count})
-                except:
-                    pass
-        
-        if gilt_total_count > 0:
-            gilt_average_p2 = gilt_weighted_sum / gilt_total_count
-            
-            col_chart_gilt, col_table_gilt = st.columns(2)
-            
-            with col_chart_gilt:
-                import altair as alt
-                df_gilt_p2_chart = pd.DataFrame(gilt_p2_data)
-                df_gilt_p2_chart = df_gilt_p2_chart.sort_values('P2値(mm)')
-                df_gilt_p2_chart['P2値'] = df_gilt_p2_chart['P2値(mm)'].astype(str) + 'mm'
-                
-                chart_gilt = alt.Chart(df_gilt_p2_chart).mark_bar(color='#ff7f0e').encode(
-                    x=alt.X('P2値:N', sort=df_gilt_p2_chart['P2値'].tolist(), title='P2値'),
-                    y=alt.Y('頭数:Q', title='頭数'),
-                    tooltip=['P2値', '頭数']
-                ).properties(height=300)
-                st.altair_chart(chart_gilt, use_container_width=True)
-            
-            with col_table_gilt:
-                df_gilt_p2_table = pd.DataFrame(gilt_p2_data)
-                df_gilt_p2_table = df_gilt_p2_table[df_gilt_p2_table['頭数'] > 0]
-                df_gilt_p2_table = df_gilt_p2_table.sort_values('P2値(mm)')
-                df_gilt_p2_table['P2値(mm)'] = df_gilt_p2_table['P2値(mm)'].astype(str) + 'mm'
-                display_centered_table(df_gilt_p2_table, height=300)
+            st.info("WSIデータがありません")
+        
+        st.subheader("【不受胎の要因】")
+        failure_tables = get_failure_breakdowns(record_store, record_store.version, farm_name, period_start, period_end)
+        if failure_tables is not None and failure_tables['週']['不受胎'].sum() > 0:
+            failure_weekly = failure_tables['週'].copy()
+            failure_weekly['週開始日'] = failure_weekly['週開始日'].dt.strftime('%Y-%m-%d')
+            failure_melted = failure_weekly.melt(
+                id_vars=['週開始日'], value_vars=FAILURE_MODES, var_name='要因', value_name='頭数'
+            )
+            failure_chart = alt.Chart(failure_melted).mark_bar().encode(
+                x=alt.X('週開始日:N', title='週開始日', sort=None),
+                y=alt.Y('頭数:Q', title='不受胎頭数', stack='zero'),
+                color=alt.Color('要因:N', title='要因',
+                               scale=alt.Scale(domain=FAILURE_MODES,
+                                               range=['#ff7f0e', '#d62728', '#7f7f7f', '#c7c7c7'])),
+                order=alt.Order('要因:N'),
+                tooltip=['週開始日', '要因', '頭数']
+            ).properties(height=300)
+            st.altair_chart(failure_chart, use_container_width=True)
             
-            st.write(f"**合計:** {gilt_total_count}頭 / **平均P2値:** {gilt_average_p2:.1f}mm")
+            col_f1, col_f2 = st.columns(2)
+            for col, label in [(col_f1, '産次'), (col_f2, '精液')]:
+                with col:
+                    failure_display = failure_tables[label].copy()
+                    if label == '産次':
+                        failure_display['産次'] = failure_display['産次'].astype(str) + '産'
+                    else:
+                        failure_display = failure_display.sort_values('種付', ascending=False)
+                    failure_display['不受胎率'] = failure_display['不受胎率'].astype(str) + '%'
+                    st.write(f"**{label}別**")
+                    display_centered_table(failure_display[[label, '種付', '不受胎', '不受胎率'] + FAILURE_MODES])
         else:
-            st.info("初産P2値データがありません")
-    else:
-        st.info(f"種付開始週 {week_id} に対応する初産P2値データがスプレッドシートに登録されていません")
-    
-    # ===================
-    # 採精レポート（花泉1号・花泉2号のみ）
-    # ===================
-    if farm_name in ["花泉1号", "花泉2号"]:
-        st.subheader("【採精レポート】")
-        
-        # スプレッドシートまたはアップロードファイルからデータを取得
-        df_semen_week = None
-        
-        # まずスプレッドシートから読み込み
-        if spreadsheet:
-            df_semen_week = load_semen_report_from_sheet(spreadsheet, start_date)
+            st.info("不受胎データがありません")
         
-        if df_semen_week is not None and len(df_semen_week) > 0:
-            # 対象期間を計算
-            days_since_monday = start_date.weekday()
-            if days_since_monday == 0:
-                previous_sunday = start_date - timedelta(days=1)
-            else:
-                previous_sunday = start_date - timedelta(days=days_since_monday + 1)
-            
-            days_until_saturday = 5 - start_date.weekday()
-            if days_until_saturday < 0:
-                days_until_saturday += 7
-            saturday_of_week = start_date + timedelta(days=days_until_saturday)
-            
-            st.write(f"**対象期間:** {previous_sunday.strftime('%Y-%m-%d')} ～ {saturday_of_week.strftime('%Y-%m-%d')}")
-            
-            # 表示用に整形
-            display_cols = ['採精日', '個体番号', '採精量', '精子数', '備考']
-            available_cols = [col for col in display_cols if col in df_semen_week.columns]
-            df_semen_display = df_semen_week[available_cols].copy()
-            
-            # 採精日を文字列に変換
-            if '採精日' in df_semen_display.columns:
-                df_semen_display['採精日'] = pd.to_datetime(df_semen_display['採精日']).dt.strftime('%Y-%m-%d')
-            
-            # 備考のNaNを空文字に
-            if '備考' in df_semen_display.columns:
-                df_semen_display['備考'] = df_semen_display['備考'].fillna('').astype(str)
-            
-            # 列名を変更
-            df_semen_display.columns = ['採精日', '個体番号', '採精量(ml)', '精子数(億)', '備考'][:len(available_cols)]
+        st.subheader("【分娩舎・ロット・哺乳日数別の不受胎】")
+        df_annotated = slice_by_period(
+            get_annotated_failures(record_store, record_store.version, annotations, annotations.version, farm_name),
+            farm_name, period_start, period_end
+        )
+        if df_annotated is not None and len(df_annotated) > 0:
+            tabs = st.tabs(["分娩舎", "ロット", "哺乳日数"])
+            for tab, by in zip(tabs, ['分娩舎', 'ロット', '哺乳区分']):
+                with tab:
+                    display_centered_table(detail_breakdown(df_annotated, by).fillna(''))
+            st.caption("※ 母豚詳細は不受胎の母豚のみ入力されるため、頭数は不受胎の内訳です")
+        else:
+            st.info("不受胎データがありません")
+        
+        st.subheader("【投与ホルモン別受胎率】")
+        hormone_tables = get_hormone_breakdowns(record_store, record_store.version, farm_name, period_start, period_end)
+        if hormone_tables is not None:
+            tabs = st.tabs(list(hormone_tables.keys()))
+            for tab, (label, table) in zip(tabs, hormone_tables.items()):
+                with tab:
+                    table_display = table.copy()
+                    if '産次' in table_display.columns:
+                        table_display['産次'] = table_display['産次'].astype(str) + '産'
+                    table_display['受胎率'] = table_display['受胎率'].astype(str) + '%'
+                    display_centered_table(table_display)
+        else:
+            st.info("ホルモン投与データがありません")
+        
+        st.subheader("【非生産日数（NPD）】")
+        df_npd = slice_by_period(record_store.derived("NPD", compute_npd, farm_name), farm_name, period_start, period_end)
+        if df_npd is not None and len(df_npd) > 0:
+            npd_per_sow, npd_farm = npd_summary(df_npd)
+            col_n1, col_n2, col_n3, col_n4 = st.columns(4)
+            col_n1.metric("母豚数", f"{npd_farm['母豚数']}頭")
+            col_n2.metric("平均NPD", f"{npd_farm['平均NPD']:.1f}日/頭")
+            col_n3.metric("平均WSI", f"{npd_farm['平均WSI']:.1f}日")
+            col_n4.metric("WSI 7日以内", f"{npd_farm['WSI7日以内率']:.1f}%")
             
-            display_centered_table(df_semen_display)
+            st.write("**NPDの多い母豚（上位20頭）**")
+            npd_top = npd_per_sow.head(20)[['母豚番号', '種付回数', '再発付', 'NPD']].copy()
+            npd_top['再発付'] = npd_top['再発付'].astype(int)
+            npd_top['NPD'] = npd_top['NPD'].round(0).astype(int)
+            npd_top.columns = ['母豚番号', '種付回数', '再発付け回数', 'NPD(日)']
+            display_centered_table(npd_top)
+            st.caption("※ NPD = 離乳から種付までの日数（再発付けは前回種付からの日数）+ 不受胎で廃用された場合は種付から廃用までの日数")
         else:
-            st.info("この週の採精レポートがスプレッドシートに登録されていません")
-    
-    # ===================
-    # 週全体のコメント
-    # ===================
-    st.subheader("【週のコメント】")
-    
-    comment_key = f"{farm_name}_{week_id}"
-    saved_week_comment = comments_data["week_comments"].get(comment_key, "")
+            st.info("NPDを計算できるデータがありません")
+        
+        st.divider()
+        st.success(f"集計対象: {len(df)}頭のデータを集計しました")
+        st.stop()
     
-    if st.session_state.edit_mode:
-        # 編集モード：入力欄を表示
-        week_comment = st.text_area(
-            "この週の鑑定落ちリストに対するコメント",
-            value=saved_week_comment,
-            height=150,
-            placeholder="必要妊豚在庫の確保状況、不受胎の原因分析、今後の対応など",
-            key="week_comment_input"
-        )
-        st.session_state.temp_week_comment = week_comment
-    else:
-        # 閲覧モード：保存済みコメントを表示
-        week_comment = saved_week_comment
-        if week_comment:
-            # コメントを表形式で表示（左詰め）
-            st.markdown(f"""
-            <div style="border: 1px solid #ddd; padding: 15px; background-color: white; color: #333; border-radius: 5px; margin: 10px 0; text-align: left; white-space: pre-wrap; font-size: 14px;">
-{week_comment}
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.info("コメントはありません")
+    # セクションが使う保存先・索引（モジュールの変数は参照せず引数で渡す）
+    stores = {
+        'spreadsheet': spreadsheet, 'record_store': record_store, 'annotations': annotations,
+        'sow_index': sow_index, 'report_snapshots': report_snapshots,
+    }
+    not_pregnant_section(report, farm_name, week_id, week_notes, df_repeat, stores)
+    p2_section(report)
+    semen_section(report)
+    comment_section(week_notes["week_comment"])
     
-    # ===================
-    # 保存ボタン
-    # ===================
     st.divider()
-    
-    if st.session_state.edit_mode:
-        col_save, col_pdf, col_status = st.columns([1, 1, 2])
-    else:
-        col_pdf, col_status = st.columns([1, 3])
-    
-    if st.session_state.edit_mode:
-        with col_save:
-            if st.button("💾 データを保存", type="primary"):
-                with st.spinner("💾 データを保存中...しばらくお待ちください"):
-                    # 種付記録を保存
-                    save_breeding_records(spreadsheet, df.drop(columns=['受胎']), week_id, farm_name)
-                    
-                    # キーのプレフィックス
-                    key_prefix = f"{farm_name}_{week_id}"
-                    
-                    # 週コメントをセッションステートから取得
-                    current_week_comment = st.session_state.get('temp_week_comment', '')
-                    
-                    # 手入力データを保存
-                    save_data = {
-                        "pig_details": st.session_state.temp_pig_details if 'temp_pig_details' in st.session_state else {},
-                        "repeat_breeding": {key_prefix: st.session_state.temp_repeat_breeding} if 'temp_repeat_breeding' in st.session_state else {},
-                        "week_comments": {key_prefix: current_week_comment}
-                    }
-                    
-                    success = save_data_to_sheet(spreadsheet, save_data, week_id, farm_name)
-                    
-                    if success:
-                        st.success("✅ データを保存しました！")
-                        st.cache_resource.clear()
-                        st.cache_data.clear()
-                    else:
-                        st.error("データの保存に失敗しました")
-
-    with col_pdf:
-        # P2値データの準備（スプレッドシートから取得）
-        p2_data = None
-        gilt_p2_data = None
-        semen_report = None
-        
-        # 経産P2値
-        try:
-            df_sow_for_p2 = df[df['産次'].astype(int) >= 2]
-            if len(df_sow_for_p2) > 0 and df_sow_for_p2['前回離乳日'].notna().any():
-                most_common_weaning = df_sow_for_p2['前回離乳日'].value_counts().idxmax()
-                
-                if spreadsheet:
-                    p2_record = load_p2_data_from_sheet(spreadsheet, farm_name, most_common_weaning)
-                    if p2_record:
-                        p2_columns = [str(i) for i in range(4, 21)]
-                        p2_table_data = []
-                        total_count = 0
-                        weighted_sum = 0
-                        for p2 in p2_columns:
-                            if p2 in p2_record:
-                                try:
-                                    count = int(p2_record[p2])
-                                    if count > 0:
-                                        total_count += count
-                                        weighted_sum += int(p2) * count
-                                        p2_table_data.append({'P2値(mm)': f"{p2}mm", '頭数': count})
-                                except:
-                                    pass
-                        if total_count > 0:
-                            p2_data = {
-                                'weaning_date': most_common_weaning,
-                                'lot': p2_record.get('離乳ロット', ''),
-                                'average': weighted_sum / total_count,
-                                'table': pd.DataFrame(p2_table_data)
-                            }
-        except:
-            pass
-        
-        # 初産P2値
-        try:
-            if spreadsheet:
-                gilt_p2_record = load_gilt_p2_data_from_sheet(spreadsheet, farm_name, week_id)
-                if gilt_p2_record:
-                    p2_columns = [str(i) for i in range(4, 21)]
-                    gilt_p2_table_data = []
-                    gilt_total_count = 0
-                    gilt_weighted_sum = 0
-                    for p2 in p2_columns:
-                        if p2 in gilt_p2_record:
-                            try:
-                                count = int(gilt_p2_record[p2])
-                                if count > 0:
-                                    gilt_total_count += count
-                                    gilt_weighted_sum += int(p2) * count
-                                    gilt_p2_table_data.append({'P2値(mm)': f"{p2}mm", '頭数': count})
-                            except:
-                                pass
-                    if gilt_total_count > 0:
-                        gilt_p2_data = {
-                            'average': gilt_weighted_sum / gilt_total_count,
-                            'table': pd.DataFrame(gilt_p2_table_data)
-                        }
-        except:
-            pass
-        
-        # 採精レポート（花泉1号・花泉2号のみ）
-        if farm_name in ["花泉1号", "花泉2号"]:
-            try:
-                if spreadsheet:
-                    df_semen_week = load_semen_report_from_sheet(spreadsheet, start_date)
-                    if df_semen_week is not None and len(df_semen_week) > 0:
-                        display_cols = ['採精日', '個体番号', '採精量', '精子数', '備考']
-                        available_cols = [col for col in display_cols if col in df_semen_week.columns]
-                        semen_report = df_semen_week[available_cols].copy()
-                        if '採精日' in semen_report.columns:
-                            semen_report['採精日'] = pd.to_datetime(semen_report['採精日']).dt.strftime('%Y-%m-%d')
-                        if '備考' in semen_report.columns:
-                            semen_report['備考'] = semen_report['備考'].fillna('').astype(str)
-                        semen_report.columns = ['採精日', '個体番号', '採精量(ml)', '精子数(億)', '備考'][:len(available_cols)]
-            except:
-                pass
-        
-        # 印刷用HTML生成
-        print_html = generate_print_html(
-            df=df,
-            week_id=week_id,
-            farm_name=farm_name,
-            start_date=start_date,
-            end_date=end_date,
-            comments_data=comments_data,
-            df_parity=df_parity,
-            semen_stats=semen_stats,
-            df_not_pregnant=df_not_pregnant,
-            week_comment=week_comment,
-            p2_data=p2_data,
-            gilt_p2_data=gilt_p2_data,
-            semen_report=semen_report
-        )
-        
-        # HTMLダウンロードボタン
-        st.download_button(
-            label="印刷用ページ",
-            data=print_html,
-            file_name=f"鑑定落ちリスト_{farm_name}_{week_id}.html",
-            mime="text/html",
-            help="ダウンロード後、ブラウザで開いて印刷（Cmd+P）でPDF保存できます"
-        )
-    
-    with col_status:
-        is_saved = farm_name in farm_weeks and week_id in farm_weeks.get(farm_name, [])
-        if is_saved:
-            st.caption(f"✅ この週のデータは保存済みです")
-        else:
-            st.caption(f"⚠️ この週のデータはまだ保存されていません")
+    is_saved = farm_name in farm_weeks and week_id in farm_weeks.get(farm_name, [])
+    export_section(report, report_inputs, saved_repeat, is_saved, stores)
 
 else:
     st.info("👈 サイドバーからデータを選択してください")
@@ -1867,7 +1904,7 @@ else:
     5. レポートを確認し、「データを保存」をクリック
     
     **PDFレポート出力方法**
-    1. 方法1または方法2のいずれかでレポートを作成後、最下部にある「印刷用ページ」を選択
+    1. 方法1または方法2のいずれかでレポートを作成後、最下部にある「印刷用ページを作成」→「印刷用ページ」を選択
     2. HTML形式でレポートがダウンロードされます
     3. ダウンロードされたレポートをブラウザで開く
     4. 「印刷/PDF」を選択しPDFで保存する
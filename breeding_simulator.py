@@ -0,0 +1,186 @@
+import logging
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+# ===================
+# 種付頭数シミュレーション（モンテカルロ）
+# ===================
+PARITY_GROUPS = ['初産', '2産', '3-5産', '6産以上']
+
+
+def parity_group(parity):
+    """産次を区分に変換"""
+    parity = np.asarray(parity)
+    return np.select(
+        [parity <= 1, parity == 2, parity <= 5],
+        PARITY_GROUPS[:3],
+        default=PARITY_GROUPS[3]
+    )
+
+
+def breeding_cells(cube, gilt_share=None):
+    """キューブから（産次区分 × 精液）ごとの構成比と種付・受胎頭数を作成
+
+    gilt_share を指定すると初産の構成比をその割合に置き換える。
+    """
+    cells = cube.assign(産次区分=parity_group(cube['産次'].to_numpy())).groupby(['産次区分', '精液']).agg(
+        種付=('種付', 'sum'),
+        受胎=('受胎', 'sum')
+    ).reset_index()
+    cells = cells[cells['種付'] > 0].reset_index(drop=True)
+    cells['構成比'] = cells['種付'] / cells['種付'].sum()
+
+    if gilt_share is not None:
+        is_gilt = (cells['産次区分'] == '初産').to_numpy()
+        for mask, share in [(is_gilt, gilt_share), (~is_gilt, 1 - gilt_share)]:
+            subtotal = cells.loc[mask, '構成比'].sum()
+            if subtotal > 0:
+                cells.loc[mask, '構成比'] = cells.loc[mask, '構成比'] / subtotal * share
+        cells['構成比'] = cells['構成比'] / cells['構成比'].sum()
+    return cells
+
+
+def historical_losses(pregnancies, as_of=None):
+    """分娩予定日を過ぎた受胎豚の頭数と、そのうち流産・分娩前廃用した頭数"""
+    if pregnancies is None or len(pregnancies) == 0:
+        return 0, 0
+    as_of = pd.Timestamp(as_of if as_of is not None else pd.Timestamp.now()).normalize()
+    completed = pregnancies[pregnancies['分娩予定日_dt'] < as_of]
+    lost = completed[completed['損耗日数'].notna()]
+    return int(completed['頭数'].sum()), int(lost['頭数'].sum())
+
+
+# 1ブロックで同時に持つ（種付頭数 × 試行）の要素数（ブロックごとの作業メモリを20MB程度に抑える）
+SIM_BLOCK_CELLS = 500_000
+
+
+def _simulate_block(rng, n_trials, shares, services, conceptions, loss_heads, loss_events, n_breedings):
+    """n_trials 回の試行で n_breedings 頭を順に種付し、累積分娩頭数（種付頭数 × 試行）を返す
+
+    乱数は種付の順に引くため、同じ rng なら n_breedings を減らしても先頭の種付は同じ結果になる。
+    """
+    # 受胎率・損耗率はベータ事後分布から試行ごとにサンプリング（頭数が少ない区分ほどばらつく）
+    rates = rng.beta(conceptions + 1, services - conceptions + 1, size=(n_trials, len(shares)))
+    loss = rng.beta(loss_events + 1, loss_heads - loss_events + 1, size=n_trials)
+
+    # 各種付の区分と分娩成否（1頭ごとに一様乱数2つ）
+    draws = rng.random((n_breedings, n_trials, 2))
+    cell = np.minimum(np.searchsorted(np.cumsum(shares), draws[..., 0], side='right'), len(shares) - 1)
+    success_prob = rates[np.arange(n_trials), cell] * (1 - loss)
+    del cell
+    farrowed = draws[..., 1] < success_prob
+    del draws, success_prob
+    return np.cumsum(farrowed, axis=0, dtype=np.int32)
+
+
+def _simulate_chunk(args):
+    """試行の一部をブロックに分けて実行し、集計だけを返す（プロセスプール用）
+
+    at_breedings が None なら必要種付頭数ごとの試行数（max_breedings + 1 は未達）、
+    指定すればその頭数を種付したときの分娩頭数ごとの試行数を返す。ブロックごとに
+    seed から乱数を作り直すため、どちらで呼んでも同じ試行を再現する。
+    """
+    seed, n_trials, shares, services, conceptions, loss_heads, loss_events, target, max_breedings, at_breedings = args
+    if at_breedings is None:
+        counts = np.zeros(max_breedings + 2, dtype=np.int64)
+    else:
+        counts = np.zeros(at_breedings + 1, dtype=np.int64)
+
+    block = max(1, SIM_BLOCK_CELLS // max_breedings)
+    for i, start in enumerate(range(0, n_trials, block)):
+        rng = np.random.default_rng(np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (i,)))
+        cumulative = _simulate_block(
+            rng, min(block, n_trials - start), shares, services, conceptions,
+            loss_heads, loss_events, max_breedings if at_breedings is None else at_breedings
+        )
+        if at_breedings is None:
+            reached = cumulative >= target
+            needed = np.where(reached.any(axis=0), reached.argmax(axis=0) + 1, max_breedings + 1)
+            counts += np.bincount(needed, minlength=max_breedings + 2)
+        else:
+            counts += np.bincount(cumulative[-1], minlength=at_breedings + 1)
+    return counts
+
+
+def _pool_context():
+    """プロセスプールの開始方式（Streamlit のスレッドから fork しないよう forkserver / spawn）"""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _run_chunks(pool, jobs):
+    """チャンクを実行（プールを使えなければ1プロセスで実行し、以降はプールを使わない）
+
+    戻り値: (結果のリスト, 以降に使うプール)
+    """
+    if pool is not None:
+        try:
+            return list(pool.map(_simulate_chunk, jobs)), pool
+        except (BrokenProcessPool, OSError, pickle.PicklingError) as e:
+            logger.warning("プロセスプールを使えないため1プロセスで実行します: %r", e)
+            pool.shutdown(wait=False, cancel_futures=True)
+    return [_simulate_chunk(job) for job in jobs], None
+
+
+def simulate_breeding_target(cells, loss_heads, loss_events, target, confidence=0.9,
+                             n_trials=20000, max_breedings=None, workers=None, seed=None):
+    """目標分娩頭数を confidence の確率で達成するために必要な種付頭数を推定
+
+    戻り値: (必要種付頭数, 種付頭数ごとの達成確率の表, 必要頭数で種付したときの分娩頭数の分布)
+    """
+    shares = cells['構成比'].to_numpy(dtype=float)
+    services = cells['種付'].to_numpy(dtype=float)
+    conceptions = cells['受胎'].to_numpy(dtype=float)
+    overall = conceptions.sum() / services.sum()
+    if max_breedings is None:
+        max_breedings = int(np.ceil(target / max(overall * 0.5, 0.05))) + 10
+
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, n_trials // 2000 or 1))
+    chunk = int(np.ceil(n_trials / workers))
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    jobs = [
+        (s, min(chunk, n_trials - i * chunk), shares, services, conceptions,
+         float(loss_heads), float(loss_events), target, max_breedings)
+        for i, s in enumerate(seeds) if n_trials - i * chunk > 0
+    ]
+
+    pool = None
+    if len(jobs) > 1:
+        try:
+            pool = ProcessPoolExecutor(max_workers=len(jobs), mp_context=_pool_context())
+        except OSError as e:
+            logger.warning("プロセスプールを使えないため1プロセスで実行します: %r", e)
+    try:
+        results, pool = _run_chunks(pool, [job + (None,) for job in jobs])
+        needed_counts = sum(results)
+
+        # 種付頭数ごとの目標達成確率（= 必要頭数がその頭数以下の試行の割合）
+        counts = np.arange(1, max_breedings + 1)
+        achieve = np.cumsum(needed_counts)[1:max_breedings + 1] / n_trials
+        table = pd.DataFrame({'種付頭数': counts, '達成確率': achieve * 100})
+
+        meets = np.nonzero(achieve >= confidence)[0]
+        required = int(counts[meets[0]]) if len(meets) > 0 else None
+
+        # 必要頭数で種付したときの分娩頭数の分布（同じ試行を必要頭数の分だけ再実行）
+        distribution = None
+        if required is not None:
+            results, pool = _run_chunks(pool, [job + (required,) for job in jobs])
+            trials_by_farrowings = sum(results)
+            farrowings = np.nonzero(trials_by_farrowings)[0]
+            distribution = pd.DataFrame({'分娩頭数': farrowings, '試行数': trials_by_farrowings[farrowings]})
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return required, table, distribution
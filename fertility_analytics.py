@@ -0,0 +1,977 @@
+import re
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+# ===================
+# 共通: 種付記録の型変換
+# ===================
+def to_halfwidth(text):
+    """全角英数字を半角に変換"""
+    if not text:
+        return text
+    halfwidth = str.maketrans(
+        'ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚ０１２３４５６７８９',
+        'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+    )
+    return text.translate(halfwidth)
+
+
+def parse_date_flexible(date_value, year=2025):
+    """柔軟な日付パース（7月4日 や 2025-07-04 など）"""
+    if pd.isna(date_value) or date_value == '':
+        return None
+
+    date_str = str(date_value)
+
+    # すでにdatetime型の場合
+    if isinstance(date_value, (pd.Timestamp, datetime)):
+        return date_value.strftime('%Y-%m-%d')
+
+    # 2025-07-04 形式
+    if '-' in date_str and len(date_str) >= 10:
+        return date_str[:10]
+
+    # 7月4日 形式
+    match = re.match(r'(\d+)月(\d+)日', date_str)
+    if match:
+        month = int(match.group(1))
+        day = int(match.group(2))
+        return f"{year}-{month:02d}-{day:02d}"
+
+    # 7/4 形式
+    match = re.match(r'(\d+)/(\d+)', date_str)
+    if match:
+        month = int(match.group(1))
+        day = int(match.group(2))
+        return f"{year}-{month:02d}-{day:02d}"
+
+    return date_str
+
+
+SEMEN_COLUMN = '雄豚・精液・あて雄'
+DATE_COLUMNS = ['種付日', '前回離乳日', '分娩予定日', '再発日', '流産日', '母豚廃用日']
+
+
+def to_datetime_column(series):
+    """空文字を含む日付列をdatetime型に変換"""
+    return pd.to_datetime(series.replace('', np.nan), errors='coerce')
+
+
+def prepare_records(df):
+    """種付記録（シート保存時は全列が文字列）を集計用に型変換"""
+    typed = df.copy()
+    typed['受胎'] = typed['妊娠鑑定結果'] == '受胎確定'
+    typed['産次'] = pd.to_numeric(typed['産次'], errors='coerce').fillna(0).astype(int)
+    for col in DATE_COLUMNS:
+        if col in typed.columns:
+            typed[f'{col}_dt'] = to_datetime_column(typed[col])
+    if SEMEN_COLUMN in typed.columns:
+        typed['精液'] = typed[SEMEN_COLUMN].astype(str).str.strip()
+    return typed
+
+
+# ===================
+# 雄豚別: 採精成績 × 受胎成績
+# ===================
+SEMEN_METRICS = ['採精量', '精子数', '容量', '1号', '2号']
+
+
+def prepare_semen_collections(df_semen):
+    """採精レポートを個体番号・採精日で整列した型付きの表に変換"""
+    if df_semen is None or len(df_semen) == 0:
+        return None
+    sem = pd.DataFrame({
+        '個体番号': df_semen['個体番号'].astype(str).str.strip(),
+        '採精日': to_datetime_column(df_semen['採精日'].astype(str)),
+    })
+    for col in SEMEN_METRICS:
+        if col in df_semen.columns:
+            sem[col] = pd.to_numeric(df_semen[col], errors='coerce')
+        else:
+            sem[col] = np.nan
+    sem = sem.dropna(subset=['採精日'])
+    return sem.sort_values('採精日').reset_index(drop=True)
+
+
+def semen_collection_outcomes(df, sem, tolerance_days=7):
+    """種付記録を直近の採精に紐付け、（農場, 週, 採精）ごとの受胎成績を集計
+
+    sem は prepare_semen_collections() 済みの採精レポート。
+    種付日以前で最も新しい同じ個体番号の採精（tolerance_days 日以内）を使用精液とみなす。
+    """
+    if sem is None or df is None or len(df) == 0:
+        return None
+
+    recs = prepare_records(df)
+    recs = recs.dropna(subset=['種付日_dt']).sort_values('種付日_dt')
+    if len(recs) == 0:
+        return None
+
+    joined = pd.merge_asof(
+        recs[['farm_name', 'week_id', '種付日_dt', '精液', '受胎']],
+        sem,
+        left_on='種付日_dt', right_on='採精日',
+        left_by='精液', right_by='個体番号',
+        direction='backward',
+        tolerance=pd.Timedelta(days=tolerance_days)
+    )
+    joined = joined.dropna(subset=['採精日'])
+    if len(joined) == 0:
+        return None
+
+    agg = {col: (col, 'first') for col in SEMEN_METRICS}
+    return joined.groupby(['farm_name', 'week_id', '個体番号', '採精日'], sort=False).agg(
+        種付=('受胎', 'count'),
+        受胎=('受胎', 'sum'),
+        **agg
+    ).reset_index()
+
+
+def combine_semen_outcomes(df_rollup):
+    """週ごとの採精成績を採精単位にまとめ直す（農場・週をまたいで使われた採精を合算）"""
+    if df_rollup is None or len(df_rollup) == 0:
+        return None
+    agg = {col: (col, 'first') for col in SEMEN_METRICS}
+    table = df_rollup.groupby(['個体番号', '採精日']).agg(
+        種付=('種付', 'sum'),
+        受胎=('受胎', 'sum'),
+        **agg
+    ).reset_index()
+    table['受胎'] = table['受胎'].astype(int)
+    table['受胎率'] = (table['受胎'] / table['種付'] * 100).round(1)
+    return table.sort_values(['個体番号', '採精日']).reset_index(drop=True)
+
+
+def filter_semen_outcomes(table, boars=None, start_date=None, end_date=None):
+    """採精成績表を雄豚・採精日の範囲で絞り込み"""
+    if table is None:
+        return None
+    mask = np.ones(len(table), dtype=bool)
+    if boars:
+        mask &= table['個体番号'].isin(boars).to_numpy()
+    if start_date is not None:
+        mask &= (table['採精日'] >= pd.to_datetime(start_date)).to_numpy()
+    if end_date is not None:
+        mask &= (table['採精日'] <= pd.to_datetime(end_date)).to_numpy()
+    return table[mask]
+
+
+# ===================
+# 再発付け（リピートブリーダー）判定
+# ===================
+def detect_repeat_services(df):
+    """全履歴の種付記録から再発付けを判定（母豚ごとに種付日順で並べてベクトル演算）
+
+    同じ母豚の直前の種付が不受胎で、産次が同じ（分娩を挟んでいない）ものを再発付けとする。
+    戻り値は型変換済みの種付記録に以下の列を加えたもの。
+      再発付: 再発付けかどうか
+      前回種付日: 直前の種付日
+      再発間隔: 直前の（不受胎の）種付からの日数
+      連続不受胎: その種付までの連続不受胎回数（受胎で0に戻る）
+    """
+    recs = prepare_records(df)
+    if len(recs) == 0:
+        for col in ['再発付', '前回種付日', '再発間隔', '連続不受胎']:
+            recs[col] = pd.Series(dtype=object)
+        return recs
+
+    recs['母豚番号'] = recs['母豚番号'].astype(str).str.strip()
+    recs = recs.sort_values(['farm_name', '母豚番号', '種付日_dt'], kind='stable').reset_index(drop=True)
+
+    farm = recs['farm_name'].to_numpy()
+    sow = recs['母豚番号'].to_numpy()
+    dates = recs['種付日_dt'].to_numpy()
+    parity = recs['産次'].to_numpy()
+    pregnant = recs['受胎'].to_numpy()
+
+    same_sow = np.zeros(len(recs), dtype=bool)
+    same_sow[1:] = (farm[1:] == farm[:-1]) & (sow[1:] == sow[:-1])
+
+    prev_dates = np.empty_like(dates)
+    prev_dates[0] = np.datetime64('NaT')
+    prev_dates[1:] = dates[:-1]
+    prev_dates[~same_sow] = np.datetime64('NaT')
+    interval = (dates - prev_dates) / np.timedelta64(1, 'D')
+
+    prev_failed = np.zeros(len(recs), dtype=bool)
+    prev_failed[1:] = ~pregnant[:-1]
+    same_parity = np.zeros(len(recs), dtype=bool)
+    same_parity[1:] = parity[1:] == parity[:-1]
+
+    is_repeat = same_sow & prev_failed & same_parity & (interval > 0)
+
+    # 連続不受胎: 母豚が変わるか受胎した行で区切り、区間内の不受胎を累積
+    failed = ~pregnant
+    run_id = np.cumsum(~same_sow | pregnant)
+    streak = pd.Series(failed.astype(int)).groupby(run_id).cumsum().to_numpy()
+
+    recs['再発付'] = is_repeat
+    recs['前回種付日'] = prev_dates
+    recs['再発間隔'] = np.where(is_repeat, interval, np.nan)
+    recs['連続不受胎'] = streak
+    return recs
+
+
+def repeat_breeding_counts(df_repeat, farm_name, week_id):
+    """指定週の再発付けの種付頭数・受胎頭数"""
+    df_week = df_repeat[(df_repeat['farm_name'] == farm_name) & (df_repeat['week_id'] == week_id)]
+    df_week = df_week[df_week['再発付']]
+    return len(df_week), int(df_week['受胎'].sum())
+
+
+def repeat_breeders(df_repeat, min_failures=2):
+    """連続不受胎が min_failures 回以上の母豚（農場, 母豚番号ごとの最大連続回数）"""
+    flagged = df_repeat[df_repeat['連続不受胎'] >= min_failures]
+    if len(flagged) == 0:
+        return pd.DataFrame(columns=['farm_name', '母豚番号', '連続不受胎', '最終種付日'])
+    return flagged.groupby(['farm_name', '母豚番号']).agg(
+        連続不受胎=('連続不受胎', 'max'),
+        最終種付日=('種付日_dt', 'max')
+    ).reset_index()
+
+
+# ===================
+# 離乳後交配日数（WSI）
+# ===================
+WSI_BIN_EDGES = [0, 4, 6, 8, 11, 21]
+WSI_LABELS = ['0-3日', '4-5日', '6-7日', '8-10日', '11-20日', '21日以上']
+
+
+def weaning_to_service_days(recs):
+    """離乳後交配日数（WSI）。Porkerの列を優先し、なければ種付日-前回離乳日で補完"""
+    if '離乳後交配日数' in recs.columns:
+        wsi = pd.to_numeric(recs['離乳後交配日数'], errors='coerce')
+    else:
+        wsi = pd.Series(np.nan, index=recs.index)
+    if '前回離乳日_dt' in recs.columns:
+        wsi = wsi.fillna((recs['種付日_dt'] - recs['前回離乳日_dt']).dt.days)
+    # 初産は離乳がないので対象外
+    return wsi.where(recs['産次'] >= 2)
+
+
+def wsi_bin_labels(wsi):
+    """WSIを区分ラベルに変換（欠損・負値は「不明」）"""
+    values = wsi.to_numpy(dtype=float)
+    idx = np.digitize(np.nan_to_num(values, nan=-1), WSI_BIN_EDGES) - 1
+    labels = np.array(WSI_LABELS + ['不明'])
+    return labels[idx]
+
+
+# ===================
+# 受胎成績キューブ（週単位ロールアップ）
+# ===================
+CUBE_DIMENSIONS = ['産次', '精液', 'WSI区分', '投与ホルモン']
+
+
+def hormone_labels(recs):
+    """投与ホルモンを正規化（未投与は「なし」）"""
+    if '投与ホルモン' not in recs.columns:
+        return np.full(len(recs), 'なし', dtype=object)
+    hormone = recs['投与ホルモン'].fillna('').astype(str).str.strip()
+    return hormone.mask(hormone.isin(['', 'nan']), 'なし').to_numpy()
+
+
+FAILURE_MODES = ['再発', '流産', '廃用', '不明']
+
+
+def failure_modes(recs):
+    """不受胎の要因を分類（流産日 > 再発日 > 母豚廃用日 の順に判定、受胎は空文字）"""
+    def has_date(col):
+        return recs[col].notna().to_numpy() if col in recs.columns else np.zeros(len(recs), dtype=bool)
+
+    failed = ~recs['受胎'].to_numpy()
+    return np.select(
+        [~failed, has_date('流産日_dt'), has_date('再発日_dt'), has_date('母豚廃用日_dt')],
+        ['', '流産', '再発', '廃用'],
+        default='不明'
+    )
+
+
+def fertility_cube(df):
+    """（農場, 週, 種付日, 産次, 精液, WSI区分, 投与ホルモン）ごとの種付・受胎頭数
+
+    産次別・精液別・WSI区分別・ホルモン別などの内訳はすべてこの表を再集計して求める。
+    """
+    recs = prepare_records(df)
+    recs['WSI区分'] = wsi_bin_labels(weaning_to_service_days(recs))
+    recs['投与ホルモン'] = hormone_labels(recs)
+    mode = failure_modes(recs)
+    for label in FAILURE_MODES:
+        recs[label] = mode == label
+    recs = recs.dropna(subset=['種付日_dt'])
+    return recs.groupby(['farm_name', 'week_id', '種付日_dt'] + CUBE_DIMENSIONS, sort=False).agg(
+        種付=('受胎', 'size'),
+        受胎=('受胎', 'sum'),
+        **{label: (label, 'sum') for label in FAILURE_MODES}
+    ).reset_index()
+
+
+def slice_by_period(df, farm_name=None, start_date=None, end_date=None, date_col='種付日_dt'):
+    """農場・種付日の範囲で絞り込み"""
+    if df is None:
+        return None
+    mask = np.ones(len(df), dtype=bool)
+    if farm_name is not None:
+        mask &= (df['farm_name'] == farm_name).to_numpy()
+    if start_date is not None:
+        mask &= (df[date_col] >= pd.to_datetime(start_date)).to_numpy()
+    if end_date is not None:
+        mask &= (df[date_col] < pd.to_datetime(end_date) + pd.Timedelta(days=1)).to_numpy()
+    return df[mask]
+
+
+def cube_breakdown(cube, by):
+    """キューブを指定の列で再集計し受胎率を付ける"""
+    if isinstance(by, str):
+        by = [by]
+    table = cube.groupby(by, observed=True).agg(
+        種付=('種付', 'sum'),
+        受胎=('受胎', 'sum')
+    ).reset_index()
+    table['受胎'] = table['受胎'].astype(int)
+    table['受胎率'] = np.where(table['種付'] > 0, table['受胎'] / table['種付'] * 100, np.nan).round(1)
+    return table
+
+
+def farm_period_matrix(cube, freq='週'):
+    """農場 × 週（または月）の種付・受胎頭数と受胎率（縦持ち）
+
+    freq: '週'（月曜始まり）または '月'
+    """
+    dates = cube['種付日_dt']
+    if freq == '月':
+        period = dates.dt.to_period('M').dt.start_time
+    else:
+        period = dates.dt.normalize() - pd.to_timedelta(dates.dt.weekday, unit='D')
+    table = cube.groupby(['farm_name', period.rename('期間')]).agg(
+        種付=('種付', 'sum'),
+        受胎=('受胎', 'sum')
+    ).reset_index()
+    table['受胎'] = table['受胎'].astype(int)
+    table['受胎率'] = (table['受胎'] / table['種付'] * 100).round(1)
+    return table
+
+
+def rolling_fertility(cube, windows=(4, 8, 13), lag_weeks=52):
+    """週ごとの受胎率と移動受胎率・前年同週比較
+
+    欠けた週を0頭で埋めた週次の累積和から、任意の窓の受胎率を O(1) で求める。
+    """
+    dates = cube['種付日_dt']
+    week_start = dates.dt.normalize() - pd.to_timedelta(dates.dt.weekday, unit='D')
+    weekly = cube.groupby(week_start.rename('週開始日')).agg(種付=('種付', 'sum'), 受胎=('受胎', 'sum'))
+    if len(weekly) == 0:
+        return None
+    full_index = pd.date_range(weekly.index.min(), weekly.index.max(), freq='7D', name='週開始日')
+    weekly = weekly.reindex(full_index, fill_value=0)
+
+    n = weekly['種付'].to_numpy(dtype=float)
+    k = weekly['受胎'].to_numpy(dtype=float)
+    cum_n = np.concatenate([[0.0], np.cumsum(n)])
+    cum_k = np.concatenate([[0.0], np.cumsum(k)])
+    end = np.arange(1, len(n) + 1)
+
+    def window_rate(w, lag=0):
+        stop = end - lag
+        start = np.maximum(stop - w, 0)
+        valid = stop >= w
+        stop = np.clip(stop, 0, None)
+        total = cum_n[stop] - cum_n[start]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = (cum_k[stop] - cum_k[start]) / total * 100
+        return np.where(valid & (total > 0), rate, np.nan).round(1)
+
+    result = weekly.reset_index()
+    result['受胎'] = result['受胎'].astype(int)
+    result['受胎率'] = window_rate(1)
+    for w in windows:
+        result[f'{w}週移動'] = window_rate(w)
+    result['前年同週'] = window_rate(1, lag_weeks)
+    result[f'前年{windows[0]}週移動'] = window_rate(windows[0], lag_weeks)
+    result['前年差'] = (result[f'{windows[0]}週移動'] - result[f'前年{windows[0]}週移動']).round(1)
+    return result
+
+
+def failure_breakdown(cube, by):
+    """不受胎の要因別頭数（再発・流産・廃用・不明）をキューブから再集計"""
+    if isinstance(by, str):
+        by = [by]
+    cube = cube.copy()
+    if '週開始日' in by and '週開始日' not in cube.columns:
+        dates = cube['種付日_dt']
+        cube['週開始日'] = dates.dt.normalize() - pd.to_timedelta(dates.dt.weekday, unit='D')
+    table = cube.groupby(by).agg(
+        種付=('種付', 'sum'),
+        **{label: (label, 'sum') for label in FAILURE_MODES}
+    ).reset_index()
+    table[FAILURE_MODES] = table[FAILURE_MODES].astype(int)
+    table['不受胎'] = table[FAILURE_MODES].sum(axis=1)
+    table['不受胎率'] = (table['不受胎'] / table['種付'] * 100).round(1)
+    return table
+
+
+def wsi_distribution(cube):
+    """WSI区分ごとの種付頭数・構成比・受胎率（経産のみ）"""
+    table = cube_breakdown(cube[cube['産次'] >= 2], 'WSI区分')
+    order = {label: i for i, label in enumerate(WSI_LABELS + ['不明'])}
+    table = table.sort_values('WSI区分', key=lambda s: s.map(order)).reset_index(drop=True)
+    total = table['種付'].sum()
+    table['構成比'] = (table['種付'] / total * 100).round(1) if total > 0 else 0.0
+    return table[['WSI区分', '種付', '構成比', '受胎', '受胎率']]
+
+
+# ===================
+# 非生産日数（NPD）
+# ===================
+def compute_npd(df):
+    """全履歴から種付ごとの非生産日数（NPD）を計算
+
+    NPD = 種付までの空胎日数（初回種付はWSI、再発付けは前回種付からの日数）
+        + 不受胎のまま再発付けされずに廃用された場合は種付から廃用までの日数
+    """
+    recs = detect_repeat_services(df)
+    if len(recs) == 0:
+        return pd.DataFrame(columns=['farm_name', 'week_id', '母豚番号', '種付日_dt', '産次',
+                                     '受胎', '再発付', 'WSI', 'WSI区分', 'NPD'])
+
+    wsi = weaning_to_service_days(recs)
+    farm = recs['farm_name'].to_numpy()
+    sow = recs['母豚番号'].to_numpy()
+    next_same_sow = np.zeros(len(recs), dtype=bool)
+    next_same_sow[:-1] = (farm[:-1] == farm[1:]) & (sow[:-1] == sow[1:])
+    next_repeat = np.zeros(len(recs), dtype=bool)
+    next_repeat[:-1] = recs['再発付'].to_numpy()[1:]
+    next_repeat &= next_same_sow
+
+    entry_days = np.where(recs['再発付'].to_numpy(), recs['再発間隔'].to_numpy(dtype=float), wsi.to_numpy(dtype=float))
+    if '母豚廃用日_dt' in recs.columns:
+        cull_days = (recs['母豚廃用日_dt'] - recs['種付日_dt']).dt.days.to_numpy(dtype=float)
+    else:
+        cull_days = np.full(len(recs), np.nan)
+    cull_days = np.where(~recs['受胎'].to_numpy() & ~next_repeat & (cull_days >= 0), cull_days, np.nan)
+
+    npd = np.nan_to_num(entry_days) + np.nan_to_num(cull_days)
+
+    result = recs[['farm_name', 'week_id', '母豚番号', '種付日_dt', '産次', '受胎', '再発付']].copy()
+    result['WSI'] = wsi.to_numpy()
+    result['WSI区分'] = wsi_bin_labels(wsi)
+    result['NPD'] = npd
+    return result
+
+
+def npd_summary(df_npd):
+    """期間内のNPDを母豚別・農場全体にまとめる"""
+    per_sow = df_npd.groupby(['farm_name', '母豚番号']).agg(
+        種付回数=('NPD', 'size'),
+        再発付=('再発付', 'sum'),
+        NPD=('NPD', 'sum')
+    ).reset_index().sort_values('NPD', ascending=False)
+
+    wsi = df_npd['WSI'].dropna()
+    farm = {
+        '母豚数': int(len(per_sow)),
+        'NPD合計': float(df_npd['NPD'].sum()),
+        '平均NPD': float(per_sow['NPD'].mean()) if len(per_sow) > 0 else 0.0,
+        '平均WSI': float(wsi.mean()) if len(wsi) > 0 else float('nan'),
+        'WSI7日以内率': float((wsi <= 7).mean() * 100) if len(wsi) > 0 else float('nan'),
+    }
+    return per_sow, farm
+
+
+# ===================
+# 投与ホルモン別
+# ===================
+def hormone_breakdowns(cube):
+    """ホルモン別・ホルモン×産次・ホルモン×WSI区分の受胎率（キューブの再集計）"""
+    by_hormone = cube_breakdown(cube, '投与ホルモン').sort_values('種付', ascending=False)
+    by_parity = cube_breakdown(cube, ['投与ホルモン', '産次'])
+    by_wsi = cube_breakdown(cube[cube['産次'] >= 2], ['投与ホルモン', 'WSI区分'])
+    order = {label: i for i, label in enumerate(WSI_LABELS + ['不明'])}
+    by_wsi = by_wsi.sort_values(['投与ホルモン', 'WSI区分'], key=lambda s: s.map(order) if s.name == 'WSI区分' else s)
+    return {
+        'ホルモン別': by_hormone.reset_index(drop=True),
+        'ホルモン×産次': by_parity.reset_index(drop=True),
+        'ホルモン×WSI': by_wsi.reset_index(drop=True),
+    }
+
+
+# ===================
+# 受胎率の信頼区間・縮小推定
+# ===================
+def wilson_interval(successes, totals, z=1.96):
+    """Wilsonスコア区間（%）を配列でまとめて計算"""
+    k = np.asarray(successes, dtype=float)
+    n = np.asarray(totals, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = k / n
+        denom = 1 + z ** 2 / n
+        center = (p + z ** 2 / (2 * n)) / denom
+        half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    lower = np.where(n > 0, np.clip(center - half, 0, 1) * 100, np.nan)
+    upper = np.where(n > 0, np.clip(center + half, 0, 1) * 100, np.nan)
+    return lower, upper
+
+
+def empirical_bayes_rates(successes, totals, prior_mask=None):
+    """ベータ二項モデルの経験ベイズで縮小した受胎率（%）
+
+    事前分布はグループ全体（prior_mask で対象を限定可）からモーメント法で推定する。
+    頭数の少ないグループほど全体の受胎率に引き寄せられる。
+    """
+    k = np.asarray(successes, dtype=float)
+    n = np.asarray(totals, dtype=float)
+    mask = n > 0 if prior_mask is None else (np.asarray(prior_mask, dtype=bool) & (n > 0))
+    if not mask.any():
+        return np.full(len(n), np.nan)
+
+    p = k[mask].sum() / n[mask].sum()
+    rates = k[mask] / n[mask]
+    observed_var = np.average((rates - p) ** 2, weights=n[mask])
+    between_var = observed_var - p * (1 - p) / n[mask].mean()
+
+    if between_var <= 0 or p <= 0 or p >= 1:
+        # グループ間の差がばらつきの範囲内 → 全体の受胎率に寄せる
+        return np.where(n > 0, p * 100, np.nan)
+    prior_size = p * (1 - p) / between_var - 1
+    alpha, beta = p * prior_size, (1 - p) * prior_size
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shrunk = (k + alpha) / (n + alpha + beta) * 100
+    return np.where(n > 0, shrunk, np.nan)
+
+
+def add_rate_intervals(table, success_col='受胎', total_col='種付', shrink=True, prior_mask=None):
+    """集計表に95%信頼区間（下限・上限）と縮小推定の受胎率列を追加"""
+    table = table.copy()
+    k = pd.to_numeric(table[success_col], errors='coerce').to_numpy(dtype=float)
+    n = pd.to_numeric(table[total_col], errors='coerce').to_numpy(dtype=float)
+    lower, upper = wilson_interval(k, n)
+    table['下限'] = lower.round(1)
+    table['上限'] = upper.round(1)
+    if shrink:
+        table['推定受胎率'] = empirical_bayes_rates(k, n, prior_mask).round(1)
+    return table
+
+
+def format_interval(lower, upper):
+    """信頼区間を「xx.x～yy.y%」形式の文字列に"""
+    return [f"{lo:.1f}～{hi:.1f}%" if pd.notna(lo) else '' for lo, hi in zip(lower, upper)]
+
+
+# ===================
+# 受胎率の管理図（CUSUM / EWMA）
+# ===================
+def series_observations(df):
+    """種付記録（farm_name / week_id 列付き）から管理図の系列ごとの週別（種付, 受胎）頭数を集計
+
+    戻り値: {(farm_name, week_id): {(区分, 対象): (種付, 受胎)}}
+    """
+    recs = prepare_records(df)
+    recs['合計'] = '合計'
+    recs['産次区分'] = np.where(recs['産次'] >= 2, '経産', '初産')
+    series = [('全体', '合計'), ('産次区分', '産次区分')]
+    if '精液' in recs.columns:
+        series.append(('精液', '精液'))
+
+    obs = {}
+    for kind, col in series:
+        counts = recs.groupby(['farm_name', 'week_id', col]).agg(
+            種付=('受胎', 'size'),
+            受胎=('受胎', 'sum')
+        )
+        for (farm, week, target), n, k in zip(counts.index, counts['種付'], counts['受胎']):
+            obs.setdefault((farm, week), {})[(kind, target)] = (int(n), int(k))
+    return obs
+
+
+class FertilityMonitor:
+    """週ごとの受胎率に CUSUM（下側）と EWMA の管理図を適用し、低下を検知する
+
+    系列ごとに直近の統計量だけを持ち、新しい週は O(1) で更新する。
+    過去の週が保存し直された場合のみ、その系列を履歴から再計算する。
+    """
+
+    def __init__(self, ewma_lambda=0.3, ewma_width=2.5, cusum_k=0.5, cusum_h=4.0, warmup_services=40):
+        self.ewma_lambda = ewma_lambda
+        self.ewma_width = ewma_width
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.warmup_services = warmup_services
+        self._lock = threading.RLock()
+        self._history = {}   # (farm, 区分, 対象) -> {week_id: (種付, 受胎)}
+        self._state = {}     # (farm, 区分, 対象) -> 状態 dict
+
+    def build(self, store):
+        """ストアの全週から状態を構築（集計は全件まとめて1回）"""
+        df = store.records()
+        if len(df) == 0:
+            return
+        for (farm_name, week_id), obs in sorted(series_observations(df).items()):
+            self._apply_week(farm_name, week_id, obs)
+
+    def update_week(self, farm_name, week_id, df):
+        """保存された1週分で状態を更新（RecordStore のリスナーとして使用）"""
+        obs = {}
+        if df is not None and len(df) > 0:
+            obs = series_observations(df.assign(farm_name=farm_name, week_id=week_id)).get((farm_name, week_id), {})
+        self._apply_week(farm_name, week_id, obs)
+
+    def _apply_week(self, farm_name, week_id, obs):
+        """1週分の系列別観測を反映"""
+        with self._lock:
+            # この週に記録がなくなった系列は履歴から除く
+            for key, history in self._history.items():
+                if key[0] == farm_name and week_id in history and key[1:] not in obs:
+                    del history[week_id]
+                    self._replay(key)
+            for series, counts in obs.items():
+                key = (farm_name,) + series
+                history = self._history.setdefault(key, {})
+                state = self._state.get(key)
+                replaced = week_id in history
+                history[week_id] = counts
+                if state is None or (not replaced and week_id > state['週']):
+                    self._step(key, week_id, counts)
+                else:
+                    self._replay(key)
+
+    def _replay(self, key):
+        """系列を履歴の最初から計算し直す"""
+        self._state.pop(key, None)
+        for week_id in sorted(self._history.get(key, {})):
+            self._step(key, week_id, self._history[key][week_id])
+
+    def _step(self, key, week_id, counts):
+        """1週分の観測で CUSUM / EWMA を更新"""
+        n, k = counts
+        state = self._state.get(key)
+        if state is None:
+            state = {'週': week_id, '基準種付': 0, '基準受胎': 0, 'EWMA': None,
+                     'CUSUM': 0.0, 'EWMAアラーム': False, 'CUSUMアラーム': False,
+                     '種付': 0, '受胎': 0}
+        state.update({'週': week_id, '種付': n, '受胎': k, 'EWMAアラーム': False, 'CUSUMアラーム': False})
+
+        base_n, base_k = state['基準種付'], state['基準受胎']
+        if n > 0 and base_n >= self.warmup_services and 0 < base_k < base_n:
+            p0 = base_k / base_n
+            rate = k / n
+            sigma = np.sqrt(p0 * (1 - p0) / n)
+            lam = self.ewma_lambda
+            ewma = rate if state['EWMA'] is None else lam * rate + (1 - lam) * state['EWMA']
+            state['EWMA'] = ewma
+            state['EWMAアラーム'] = ewma < p0 - self.ewma_width * sigma * np.sqrt(lam / (2 - lam))
+            cusum = min(0.0, state['CUSUM'] + (rate - p0) / sigma + self.cusum_k)
+            state['CUSUM'] = cusum
+            state['CUSUMアラーム'] = cusum < -self.cusum_h
+            state['基準'] = p0
+
+        # 基準受胎率は当週を含めない累積値
+        state['基準種付'] = base_n + n
+        state['基準受胎'] = base_k + k
+        self._state[key] = state
+
+    def alarms(self, latest_only=True):
+        """アラーム中の系列一覧（latest_only なら各農場の最新週のみ）"""
+        with self._lock:
+            latest = {}
+            for (farm, _, _), state in self._state.items():
+                latest[farm] = max(latest.get(farm, ''), state['週'])
+            rows = []
+            for (farm, kind, target), state in self._state.items():
+                if not (state['EWMAアラーム'] or state['CUSUMアラーム']):
+                    continue
+                if latest_only and state['週'] != latest[farm]:
+                    continue
+                methods = [name for name, flag in [('CUSUM', state['CUSUMアラーム']), ('EWMA', state['EWMAアラーム'])] if flag]
+                rows.append({
+                    '農場': farm,
+                    '区分': kind,
+                    '対象': target,
+                    '週': state['週'],
+                    '受胎率': state['受胎'] / state['種付'] * 100 if state['種付'] else float('nan'),
+                    '基準受胎率': state.get('基準', float('nan')) * 100,
+                    '検知': '・'.join(methods),
+                })
+        return pd.DataFrame(rows, columns=['農場', '区分', '対象', '週', '受胎率', '基準受胎率', '検知'])
+
+
+# ===================
+# 分娩予測・妊娠豚在庫
+# ===================
+def pregnancy_rollup(df):
+    """受胎確定の母豚を（農場, 週, 種付日, 分娩予定日, 損耗日数）ごとに集計（週単位ロールアップ）
+
+    損耗日数は流産日または分娩予定日前の廃用日までの種付後日数（損耗なしは欠損）。
+    """
+    recs = prepare_records(df)
+    recs = recs[recs['受胎']]
+    if '分娩予定日_dt' not in recs.columns:
+        return None
+    recs = recs.dropna(subset=['種付日_dt', '分娩予定日_dt'])
+    if len(recs) == 0:
+        return None
+
+    loss_date = pd.Series(pd.NaT, index=recs.index)
+    if '流産日_dt' in recs.columns:
+        loss_date = recs['流産日_dt']
+    if '母豚廃用日_dt' in recs.columns:
+        culled = recs['母豚廃用日_dt'].where(recs['母豚廃用日_dt'] < recs['分娩予定日_dt'])
+        loss_date = loss_date.fillna(culled)
+    recs = recs.assign(損耗日数=(loss_date - recs['種付日_dt']).dt.days)
+
+    return recs.groupby(['farm_name', 'week_id', '種付日_dt', '分娩予定日_dt', '損耗日数'], dropna=False).size() \
+        .rename('頭数').reset_index()
+
+
+def farrowing_forecast(pregnancies, as_of=None, horizon_weeks=17):
+    """分娩予定週ごとの予測分娩頭数と、週ごとの妊娠豚在庫の予測
+
+    過去の受胎豚（分娩予定日を過ぎたもの）から損耗率と損耗時期の分布を求め、
+    在胎中の母豚ごとに「今後損耗しない確率」をベクトル演算で掛ける。
+    """
+    as_of = pd.Timestamp(as_of if as_of is not None else pd.Timestamp.now()).normalize()
+    week_start = as_of - pd.Timedelta(days=as_of.weekday())
+    weeks = pd.date_range(week_start, periods=horizon_weeks, freq='7D')
+
+    lost = pregnancies['損耗日数'].notna().to_numpy()
+    heads = pregnancies['頭数'].to_numpy(dtype=float)
+    due = pregnancies['分娩予定日_dt']
+    completed = (due < as_of).to_numpy()
+
+    # 過去の損耗率と損耗時期（種付後日数）の分布
+    total_completed = heads[completed].sum()
+    loss_rate = heads[completed & lost].sum() / total_completed if total_completed > 0 else 0.0
+    loss_days = np.repeat(pregnancies['損耗日数'].to_numpy(dtype=float)[completed & lost],
+                          heads[completed & lost].astype(int))
+    loss_days.sort()
+
+    def share_after(days):
+        """種付後 days 日より後に起きた損耗の割合"""
+        if len(loss_days) == 0:
+            return np.ones_like(days, dtype=float)
+        return 1 - np.searchsorted(loss_days, days, side='right') / len(loss_days)
+
+    active = pregnancies[~completed & ~lost]
+    if len(active) == 0:
+        empty = pd.DataFrame({'週開始日': weeks, '予定頭数': 0, '予測分娩頭数': 0.0, '予測妊娠豚在庫': 0.0})
+        return empty, loss_rate
+
+    active_heads = active['頭数'].to_numpy(dtype=float)
+    service = active['種付日_dt'].to_numpy()
+    due_active = active['分娩予定日_dt'].to_numpy()
+    days_now = (as_of.to_datetime64() - service) / np.timedelta64(1, 'D')
+    alive_now = 1 - loss_rate * (1 - share_after(days_now))
+
+    # 分娩予定日まで損耗せずに残る確率
+    days_due = (due_active - service) / np.timedelta64(1, 'D')
+    survive_due = (1 - loss_rate * (1 - share_after(days_due))) / alive_now
+    due_week = pd.Series(due_active).dt.normalize() - pd.to_timedelta(pd.Series(due_active).dt.weekday, unit='D')
+    forecast = pd.DataFrame({
+        '週開始日': due_week.to_numpy(),
+        '予定頭数': active_heads,
+        '予測分娩頭数': active_heads * survive_due,
+    }).groupby('週開始日').sum()
+    forecast = forecast.reindex(weeks, fill_value=0).rename_axis('週開始日').reset_index()
+
+    # 各週の開始時点で在胎している見込み頭数（母豚 × 週 のブロードキャスト）
+    week_values = weeks.to_numpy()
+    days_week = (week_values[None, :] - service[:, None]) / np.timedelta64(1, 'D')
+    survive_week = (1 - loss_rate * (1 - share_after(days_week))) / alive_now[:, None]
+    in_gestation = due_active[:, None] > week_values[None, :]
+    inventory = (active_heads[:, None] * np.clip(survive_week, 0, 1) * in_gestation).sum(axis=0)
+    forecast['予測妊娠豚在庫'] = inventory
+    return forecast, loss_rate
+
+
+# ===================
+# 母豚詳細（分娩舎・ロット・哺乳日数・P2値）の型付き表
+# ===================
+LACTATION_BIN_EDGES = [0, 18, 22, 25, 29]
+LACTATION_LABELS = ['17日以下', '18-21日', '22-24日', '25-28日', '29日以上']
+
+
+def normalize_detail_text(series):
+    """手入力の文字列を to_halfwidth で正規化（ダッシュ類は半角ハイフンに統一）"""
+    text = series.fillna('').astype(str).map(to_halfwidth).str.strip()
+    return text.str.replace(r'[ー−‐–―－]', '-', regex=True)
+
+
+def parse_detail_number(series):
+    """「21日」「12mm」などから数値部分を取り出す"""
+    return pd.to_numeric(normalize_detail_text(series).str.extract(r'(\d+(?:\.\d+)?)')[0], errors='coerce')
+
+
+DETAIL_KEYS = ['farm_name', 'week_id', '母豚番号']
+DETAIL_FIELDS = ['分娩舎', 'ロット', '哺乳日数', 'P2値', 'コメント']
+
+
+def empty_pig_details():
+    """空の母豚詳細表"""
+    details = pd.DataFrame({col: pd.Series(dtype=object) for col in DETAIL_KEYS + DETAIL_FIELDS})
+    details['哺乳日数'] = details['哺乳日数'].astype(float)
+    details['P2値'] = details['P2値'].astype(float)
+    return details.set_index(DETAIL_KEYS)
+
+
+def empty_week_details():
+    """空の1週分の母豚詳細表（母豚番号インデックス）"""
+    return empty_pig_details().droplevel(['farm_name', 'week_id'])
+
+
+def _typed_detail_fields(raw):
+    """各項目の列を正規化（哺乳日数・P2値は数値）"""
+    fields = {}
+    for col in DETAIL_FIELDS:
+        values = raw[col] if col in raw.columns else pd.Series('', index=raw.index)
+        if col in ['哺乳日数', 'P2値']:
+            fields[col] = parse_detail_number(values).astype(float).to_numpy()
+        elif col == 'コメント':
+            fields[col] = values.fillna('').astype(str).to_numpy()
+        else:
+            fields[col] = normalize_detail_text(values).to_numpy()
+    return fields
+
+
+def typed_pig_details(raw):
+    """母豚詳細の生データ（farm_name, week_id, 母豚番号, 各項目の列を持つ表）を型付きの表に変換
+
+    （農場, 週, 母豚番号）をインデックスにし、哺乳日数・P2値は数値で持つ。
+    """
+    if raw is None or len(raw) == 0:
+        return empty_pig_details()
+    table = pd.DataFrame({col: raw[col].astype(str).str.strip().to_numpy() for col in DETAIL_KEYS})
+    table = table.assign(**_typed_detail_fields(raw))
+    table = table[(table['farm_name'] != '') & (table['week_id'] != '')]
+    table = table.drop_duplicates(subset=DETAIL_KEYS, keep='last')
+    return table.set_index(DETAIL_KEYS).sort_index()
+
+
+def pig_details_from_records(records):
+    """「母豚詳細」シートのレコード（key, farm_name, week_id, 各項目）を型付きの表に変換"""
+    records = [record for record in records if record.get("key")]
+    if not records:
+        return empty_pig_details()
+    raw = pd.DataFrame(records)
+    # key は「農場_週_母豚番号」
+    prefix_len = raw["farm_name"].astype(str).str.len() + raw["week_id"].astype(str).str.len() + 2
+    raw["母豚番号"] = [key[n:] for key, n in zip(raw["key"].astype(str), prefix_len)]
+    return typed_pig_details(raw)
+
+
+def week_details_table(entries):
+    """入力中の1週分の母豚詳細（{母豚番号: {項目: 値}}）を型付きの表に変換"""
+    if not entries:
+        return empty_week_details()
+    raw = pd.DataFrame.from_dict(entries, orient='index')
+    table = pd.DataFrame(_typed_detail_fields(raw), index=raw.index.astype(str).str.strip().rename('母豚番号'))
+    return table[~table.index.duplicated(keep='last')]
+
+
+def format_detail_number(values):
+    """数値の詳細項目を表示用文字列に（整数は小数点なし、欠損は空文字）"""
+    return [
+        '' if pd.isna(v) else (str(int(v)) if float(v).is_integer() else str(v))
+        for v in values
+    ]
+
+
+def join_pig_details(df, week_details, on='母豚番号'):
+    """種付記録に1週分の母豚詳細を1回のマージで結合（表示用の文字列列を追加）"""
+    sow_ids = df[on].astype(str).str.strip()
+    joined = week_details.reindex(sow_ids.to_numpy())
+    result = df.copy()
+    for col in ['分娩舎', 'ロット', 'コメント']:
+        result[col] = joined[col].fillna('').to_numpy()
+    for col in ['哺乳日数', 'P2値']:
+        result[col] = format_detail_number(joined[col].to_numpy())
+    return result
+
+
+def details_editor_frame(df, entries, on='母豚番号'):
+    """不受胎母豚の詳細入力用の型付きの表（種付記録1件につき1行。母豚番号・産次・精液は参照用）
+
+    entries は {母豚番号: {項目: 値}}（入力中の値）または week_details_table の表。
+    """
+    week_details = entries if isinstance(entries, pd.DataFrame) else week_details_table(entries)
+    sow_ids = df[on].astype(str).str.strip()
+    joined = week_details.reindex(sow_ids.to_numpy())
+    frame = pd.DataFrame({
+        '母豚番号': sow_ids.to_numpy(),
+        '産次': df['産次'].astype(str).to_numpy(),
+        '精液': df['雄豚・精液・あて雄'].fillna('').astype(str).to_numpy(),
+    })
+    for col in DETAIL_FIELDS:
+        if col in ['哺乳日数', 'P2値']:
+            frame[col] = joined[col].astype(float).to_numpy()
+        else:
+            frame[col] = joined[col].fillna('').astype(str).to_numpy()
+    return frame
+
+
+def apply_detail_edits(frame, edited_rows):
+    """詳細入力表に変更分（{行番号: {列: 値}}）を行の位置で反映し、{母豚番号: {項目: 値}} を返す
+
+    母豚詳細は母豚ごとに1件のため、同じ週に同じ母豚の行が複数あれば1件にまとめる。
+    まとめるときは編集したセルの値を優先する（同じ項目を複数の行で編集したら後の行の値）。
+    """
+    frame = frame.copy()
+    edits = sorted((int(row), changes) for row, changes in edited_rows.items())
+    for row, changes in edits:
+        for col, value in changes.items():
+            if col not in DETAIL_FIELDS:
+                continue
+            if col in ['哺乳日数', 'P2値']:
+                frame.at[row, col] = parse_detail_number(pd.Series([value])).iloc[0]
+            else:
+                frame.at[row, col] = '' if value is None else str(value)
+    entries = frame.drop_duplicates('母豚番号', keep='last').set_index('母豚番号')[DETAIL_FIELDS].to_dict('index')
+    for row, changes in edits:
+        for col in changes:
+            if col in DETAIL_FIELDS:
+                entries[frame.at[row, '母豚番号']][col] = frame.at[row, col]
+    return entries
+
+
+def duplicate_sow_ids(frame):
+    """詳細入力表で複数行ある母豚番号（同じ週に複数回種付）"""
+    sow_ids = frame['母豚番号']
+    return sow_ids[sow_ids.duplicated()].unique().tolist()
+
+
+def lactation_bin_labels(days):
+    """哺乳日数を区分ラベルに変換（欠損は「未入力」）"""
+    values = np.asarray(days, dtype=float)
+    idx = np.digitize(np.nan_to_num(values, nan=-1), LACTATION_BIN_EDGES) - 1
+    return np.array(LACTATION_LABELS + ['未入力'])[idx]
+
+
+def annotated_failures(df, details):
+    """不受胎の種付記録に母豚詳細を結合（（農場, 週, 母豚番号）で1回のマージ）"""
+    recs = prepare_records(df)
+    recs = recs[~recs['受胎']].copy()
+    recs['要因'] = failure_modes(recs)
+    recs['母豚番号'] = recs['母豚番号'].astype(str).str.strip()
+    keep = ['farm_name', 'week_id', '母豚番号', '種付日_dt', '産次', '精液', '要因']
+    joined = recs[keep].merge(details.reset_index(), on=DETAIL_KEYS, how='left')
+    for col in ['分娩舎', 'ロット']:
+        joined[col] = joined[col].fillna('').replace('', '未入力')
+    joined['哺乳区分'] = lactation_bin_labels(joined['哺乳日数'])
+    return joined
+
+
+def detail_breakdown(joined, by):
+    """分娩舎・ロット・哺乳区分ごとの不受胎頭数（要因別）と平均P2値"""
+    table = pd.crosstab(joined[by], joined['要因']).reindex(columns=FAILURE_MODES, fill_value=0)
+    table.insert(0, '不受胎', table.sum(axis=1))
+    table['平均哺乳日数'] = joined.groupby(by)['哺乳日数'].mean().round(1)
+    table['平均P2値'] = joined.groupby(by)['P2値'].mean().round(1)
+    table = table.rename_axis(columns=None).reset_index()
+    if by == '哺乳区分':
+        order = {label: i for i, label in enumerate(LACTATION_LABELS + ['未入力'])}
+        table = table.sort_values(by, key=lambda s: s.map(order))
+    else:
+        table = table.sort_values('不受胎', ascending=False)
+    return table.reset_index(drop=True)
@@ -0,0 +1,462 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from fertility_analytics import DETAIL_KEYS, empty_pig_details, empty_week_details, pig_details_from_records
+
+
+# ===================
+# 種付記録ストア
+# ===================
+class RecordStore:
+    """種付記録を（農場, 週）単位で保持し、週ごとの集計結果をキャッシュする
+
+    スプレッドシートから一度だけ構築し、以降は保存された週だけを差し替える。
+    集計（ロールアップ）は週単位で計算・キャッシュされるため、
+    新しい週を保存しても再計算されるのはその週の分だけになる。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._weeks = {}            # (farm_name, week_id) -> DataFrame
+        self._week_versions = {}    # (farm_name, week_id) -> int
+        self._tables = {}           # 補助テーブル名 -> DataFrame
+        self._table_versions = {}   # 補助テーブル名 -> int
+        self._rollups = {}          # ロールアップ名 -> (関数, 依存テーブル名)
+        self._rollup_cache = {}     # (ロールアップ名, farm_name, week_id) -> (キー, DataFrame)
+        self._concat_cache = {}
+        self._listeners = []
+        self.version = 0
+
+    # ----- 種付記録 -----
+    def load_rows(self, headers, rows):
+        """「種付記録」シートの値（farm_name, week_id, CSV列...）から一括構築"""
+        rows = [row for row in rows if row and len(row) >= 2 and row[0] and row[1]]
+        if not rows:
+            return
+        width = len(headers)
+        rows = [(row + [''] * width)[:width] for row in rows]
+        df_all = pd.DataFrame(rows, columns=headers)
+        with self._lock:
+            for (farm, week), df_week in df_all.groupby(['farm_name', 'week_id'], sort=False):
+                self._weeks[(farm, week)] = df_week.drop(columns=['farm_name', 'week_id']).reset_index(drop=True)
+                self._week_versions[(farm, week)] = self._week_versions.get((farm, week), 0) + 1
+            self.version += 1
+
+    def put_week(self, farm_name, week_id, df):
+        """保存した週の種付記録を差し替え（シートと同じ文字列形式で保持）"""
+        df_week = df.copy()
+        for col in df_week.columns:
+            df_week[col] = [str(v) if pd.notna(v) else '' for v in df_week[col]]
+        df_week = df_week.reset_index(drop=True)
+        key = (farm_name, week_id)
+        with self._lock:
+            self._weeks[key] = df_week
+            self._week_versions[key] = self._week_versions.get(key, 0) + 1
+            self.version += 1
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(farm_name, week_id, df_week)
+
+    def week_keys(self, farm_name=None):
+        """保持している（農場, 週）の一覧"""
+        with self._lock:
+            keys = list(self._weeks.keys())
+        if farm_name is not None:
+            keys = [key for key in keys if key[0] == farm_name]
+        return sorted(keys)
+
+    def farms(self):
+        """保持している農場の一覧"""
+        return sorted({farm for farm, _ in self.week_keys()})
+
+    def week_frame(self, farm_name, week_id):
+        """1週分の種付記録"""
+        with self._lock:
+            return self._weeks.get((farm_name, week_id))
+
+    def week_version(self, farm_name, week_id):
+        """週ごとの更新回数（未登録なら0）"""
+        with self._lock:
+            return self._week_versions.get((farm_name, week_id), 0)
+
+    def records(self, farm_name=None):
+        """全週（または1農場）の種付記録を farm_name / week_id 列付きで結合"""
+        cache_key = ('records', farm_name)
+        with self._lock:
+            cached = self._concat_cache.get(cache_key)
+            if cached is not None and cached[0] == self.version:
+                return cached[1]
+            version = self.version
+            frames = []
+            for (farm, week) in sorted(self._weeks.keys()):
+                if farm_name is not None and farm != farm_name:
+                    continue
+                df_week = self._weeks[(farm, week)]
+                frames.append(df_week.assign(farm_name=farm, week_id=week))
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['farm_name', 'week_id'])
+        with self._lock:
+            self._concat_cache[cache_key] = (version, df)
+        return df
+
+    def add_listener(self, listener):
+        """週の保存時に listener(farm_name, week_id, df) を呼び出す"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    # ----- 補助テーブル（採精レポートなど） -----
+    def set_table(self, name, df):
+        """補助テーブルを登録（内容が変わったときだけ版を上げる）"""
+        with self._lock:
+            if name in self._tables:
+                current = self._tables[name]
+                if current is None and df is None:
+                    return
+                if current is not None and df is not None and current.equals(df):
+                    return
+            self._tables[name] = df
+            self._table_versions[name] = self._table_versions.get(name, 0) + 1
+
+    def get_table(self, name):
+        """補助テーブルを取得"""
+        with self._lock:
+            return self._tables.get(name)
+
+    # ----- 全履歴を使う集計 -----
+    def derived(self, name, func, farm_name=None):
+        """全週の種付記録から計算する集計を、データの版ごとにキャッシュ"""
+        with self._lock:
+            key = (self.version, tuple(sorted(self._table_versions.items())))
+            cached = self._concat_cache.get(('derived', name, farm_name))
+            if cached is not None and cached[0] == key:
+                return cached[1]
+        result = func(self.records(farm_name))
+        with self._lock:
+            self._concat_cache[('derived', name, farm_name)] = (key, result)
+        return result
+
+    # ----- 週単位ロールアップ -----
+    def register_rollup(self, name, func, tables=()):
+        """週単位の集計関数を登録
+
+        func(df, *補助テーブル) は farm_name / week_id 列付きの種付記録を受け取り、
+        farm_name / week_id 列を残したまま集計した DataFrame を返すこと。
+        """
+        with self._lock:
+            self._rollups[name] = (func, tuple(tables))
+
+    def rollup(self, name, farm_name=None):
+        """登録済みロールアップを全週分結合して返す（変更のあった週だけ再計算）"""
+        func, tables = self._rollups[name]
+        with self._lock:
+            table_values = [self._tables.get(t) for t in tables]
+            table_key = tuple(self._table_versions.get(t, 0) for t in tables)
+            results = {}
+            stale = []
+            for key in self._weeks:
+                if farm_name is not None and key[0] != farm_name:
+                    continue
+                cache_key = (self._week_versions.get(key, 0), table_key)
+                cached = self._rollup_cache.get((name,) + key)
+                if cached is not None and cached[0] == cache_key:
+                    results[key] = cached[1]
+                else:
+                    stale.append((key, cache_key, self._weeks[key]))
+
+        # 再計算が必要な週はまとめて1回で集計し、週ごとに分割してキャッシュ
+        if stale:
+            df_stale = pd.concat(
+                [df_week.assign(farm_name=key[0], week_id=key[1]) for key, _, df_week in stale],
+                ignore_index=True
+            )
+            computed = func(df_stale, *table_values)
+            parts = {}
+            if computed is not None and len(computed) > 0:
+                parts = {key: part for key, part in computed.groupby(['farm_name', 'week_id'], sort=False)}
+            with self._lock:
+                for key, cache_key, _ in stale:
+                    part = parts.get(key)
+                    self._rollup_cache[(name,) + key] = (cache_key, part)
+                    results[key] = part
+
+        frames = [results[key] for key in sorted(results) if results[key] is not None]
+        if not frames:
+            return None
+        return pd.concat(frames, ignore_index=True)
+
+
+# ===================
+# 母豚別索引
+# ===================
+class SowIndex:
+    """（農場, 母豚番号）から全週の種付記録を引くための索引
+
+    週ごとに母豚番号 -> 行位置 を保持するだけなので、保存時はその週の分だけ差し替える。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._week_frames = {}   # (farm_name, week_id) -> DataFrame
+        self._week_sows = {}     # (farm_name, week_id) -> {母豚番号: 行位置}
+        self._sow_weeks = {}     # (farm_name, 母豚番号) -> set(week_id)
+
+    def build(self, store):
+        """ストアの全週から索引を構築"""
+        for farm_name, week_id in store.week_keys():
+            self.update_week(farm_name, week_id, store.week_frame(farm_name, week_id))
+
+    def update_week(self, farm_name, week_id, df):
+        """1週分の索引を差し替え（RecordStore のリスナーとして使用）"""
+        key = (farm_name, week_id)
+        if df is not None and '母豚番号' in df.columns and len(df) > 0:
+            sow_ids = df['母豚番号'].astype(str).str.strip()
+            positions = pd.Series(range(len(df))).groupby(sow_ids.to_numpy()).indices
+        else:
+            positions = {}
+        with self._lock:
+            for sow_id in self._week_sows.get(key, {}):
+                weeks = self._sow_weeks.get((farm_name, sow_id))
+                if weeks is not None:
+                    weeks.discard(week_id)
+                    if not weeks:
+                        del self._sow_weeks[(farm_name, sow_id)]
+            self._week_frames[key] = df
+            self._week_sows[key] = positions
+            for sow_id in positions:
+                self._sow_weeks.setdefault((farm_name, sow_id), set()).add(week_id)
+
+    def weeks_for(self, farm_name, sow_id):
+        """母豚の種付記録がある週の一覧"""
+        with self._lock:
+            return sorted(self._sow_weeks.get((farm_name, str(sow_id).strip()), ()))
+
+    def history(self, farm_name, sow_id):
+        """母豚の全週の種付記録を種付日順で返す（week_id 列付き）"""
+        sow_id = str(sow_id).strip()
+        with self._lock:
+            parts = []
+            for week_id in sorted(self._sow_weeks.get((farm_name, sow_id), ())):
+                df_week = self._week_frames[(farm_name, week_id)]
+                rows = self._week_sows[(farm_name, week_id)][sow_id]
+                parts.append(df_week.iloc[rows].assign(week_id=week_id))
+        if not parts:
+            return None
+        df = pd.concat(parts, ignore_index=True)
+        if '種付日' in df.columns:
+            sort_key = pd.to_datetime(df['種付日'].replace('', None), errors='coerce')
+            df = df.iloc[sort_key.argsort(kind='stable')].reset_index(drop=True)
+        return df
+
+
+# ===================
+# 手入力データ（母豚詳細・再発付け・週コメント）
+# ===================
+class WeekAnnotations:
+    """手入力データを 農場 -> 週 -> 母豚 の階層で保持する
+
+    読み込み時の母豚詳細は（農場, 週, 母豚番号）順の型付き表1つにまとめ、
+    週ごとにはその行範囲だけを持つ。保存した週はその週の表だけを差し替えるため、
+    週の取得・保存はその週の分しか触らず、週数が増えてもメモリは表1つ分で済む。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._base = empty_pig_details()   # 読み込み時の母豚詳細
+        self._farms = {}                   # farm_name -> {week_id: {"pig_details": 行範囲 or DataFrame, ...}}
+        self._concat_cache = {}
+        self.version = 0
+
+    def load(self, pig_details, repeat_breeding, week_comments):
+        """シートから読み込んだ値で構築
+
+        pig_details は typed_pig_details の表、repeat_breeding / week_comments は
+        （農場, 週）をキーにした辞書。
+        """
+        base = pig_details.sort_index()
+        farms = {}
+        if len(base) > 0:
+            farm_codes = pd.factorize(base.index.get_level_values('farm_name'))[0]
+            week_codes = pd.factorize(base.index.get_level_values('week_id'))[0]
+            starts = np.flatnonzero(np.r_[True, (np.diff(farm_codes) != 0) | (np.diff(week_codes) != 0)])
+            stops = np.r_[starts[1:], len(base)]
+            for start, stop in zip(starts, stops):
+                farm_name, week_id, _ = base.index[start]
+                farms.setdefault(farm_name, {})[week_id] = {"pig_details": slice(start, stop)}
+        for (farm_name, week_id), repeat in repeat_breeding.items():
+            farms.setdefault(farm_name, {}).setdefault(week_id, {})["repeat_breeding"] = repeat
+        for (farm_name, week_id), comment in week_comments.items():
+            farms.setdefault(farm_name, {}).setdefault(week_id, {})["week_comment"] = comment
+        with self._lock:
+            self._base = base
+            self._farms = farms
+            self._concat_cache = {}
+            self.version += 1
+
+    def load_records(self, pig_records, repeat_records, comment_records):
+        """「母豚詳細」「再発付け」「週コメント」シートのレコードから構築"""
+        repeat_breeding = {}
+        for record in repeat_records:
+            farm, week = record.get("farm_name", ""), record.get("week_id", "")
+            if farm and week:
+                repeat_breeding[(farm, week)] = {
+                    "種付": str(record.get("種付", "")),
+                    "受胎": str(record.get("受胎", ""))
+                }
+        week_comments = {}
+        for record in comment_records:
+            farm, week = record.get("farm_name", ""), record.get("week_id", "")
+            if farm and week:
+                week_comments[(farm, week)] = str(record.get("コメント", ""))
+        self.load(pig_details_from_records(pig_records), repeat_breeding, week_comments)
+
+    def week(self, farm_name, week_id):
+        """1週分の手入力データ（母豚詳細は母豚番号インデックスの表）"""
+        with self._lock:
+            entry = self._farms.get(farm_name, {}).get(week_id, {})
+            details = entry.get("pig_details")
+            if isinstance(details, slice):
+                details = self._base.iloc[details].droplevel(['farm_name', 'week_id'])
+        return {
+            "pig_details": details if details is not None else empty_week_details(),
+            "repeat_breeding": entry.get("repeat_breeding"),
+            "week_comment": entry.get("week_comment", ""),
+        }
+
+    def put_week(self, farm_name, week_id, pig_details, repeat_breeding, week_comment):
+        """保存した週の手入力データを差し替え"""
+        with self._lock:
+            self._farms.setdefault(farm_name, {})[week_id] = {
+                "pig_details": pig_details,
+                "repeat_breeding": repeat_breeding,
+                "week_comment": week_comment,
+            }
+            self.version += 1
+
+    def pig_details(self, farm_name=None):
+        """全週（または1農場）の母豚詳細を（農場, 週, 母豚番号）インデックスの表で返す"""
+        with self._lock:
+            cached = self._concat_cache.get(farm_name)
+            if cached is not None and cached[0] == self.version:
+                return cached[1]
+            version = self.version
+            positions = []
+            frames = []
+            for farm in sorted(self._farms):
+                if farm_name is not None and farm != farm_name:
+                    continue
+                for week_id, entry in self._farms[farm].items():
+                    details = entry.get("pig_details")
+                    if isinstance(details, slice):
+                        positions.append(np.arange(details.start, details.stop))
+                    elif details is not None and len(details) > 0:
+                        frames.append(details.reset_index().assign(farm_name=farm, week_id=week_id))
+            base = self._base
+        if positions:
+            frames.insert(0, base.iloc[np.concatenate(positions)].reset_index())
+        if frames:
+            df = pd.concat(frames, ignore_index=True).set_index(DETAIL_KEYS).sort_index()
+        else:
+            df = empty_pig_details()
+        with self._lock:
+            self._concat_cache[farm_name] = (version, df)
+        return df
+
+
+# ===================
+# 週レポートのスナップショット
+# ===================
+class ReportSnapshots:
+    """週レポートのスナップショットを（農場, 週, データ版）ごとに保持する
+
+    保存時（または初回の閲覧時）に、種付記録とスプレッドシートから読み込んだ
+    P2値・採精レポート、そこから作った表を1つにまとめて pickle で保存する。
+    データ版はその週の種付記録・手入力データと、その週が参照する P2値・採精レポートの
+    行の内容から作るため、それらが変わったときだけ別の版になり、古い版は書き込み時に削除される。
+    """
+
+    FORMAT = 4   # スナップショットの中身・データ版の作り方を変えたら上げる（古い版は使わない）
+
+    def __init__(self, directory=None, max_items=32):
+        self._lock = threading.Lock()
+        self._items = OrderedDict()   # (農場, 週) -> (データ版, スナップショット)
+        self.max_items = max_items
+        self.directory = directory
+
+    @classmethod
+    def data_version(cls, records, week_notes, sources=None):
+        """週の種付記録・手入力データ・P2値と採精レポートの元データからデータ版を作成（同じ内容なら同じ版）
+
+        sources は build_report_model の fetch_sources が返す {'p2_record', 'gilt_p2_record', 'semen_week'}。
+        """
+        if records is None:
+            return None
+        digest = hashlib.sha256(str(cls.FORMAT).encode('utf-8'))
+        sources = sources or {}
+        semen_week = sources.get('semen_week')
+        frames = [records, week_notes["pig_details"].reset_index()]
+        if semen_week is not None:
+            frames.append(semen_week)
+        for df in frames:
+            digest.update('|'.join(map(str, df.columns)).encode('utf-8'))
+            digest.update(pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy().tobytes())
+        digest.update(repr(sorted((week_notes["repeat_breeding"] or {}).items())).encode('utf-8'))
+        digest.update(week_notes["week_comment"].encode('utf-8'))
+        for key in ['p2_record', 'gilt_p2_record']:
+            record = sources.get(key)
+            digest.update(repr(sorted((str(k), str(v)) for k, v in record.items()) if record else None).encode('utf-8'))
+        digest.update(b'semen' if semen_week is not None else b'no-semen')
+        return digest.hexdigest()
+
+    def _dir(self, farm_name, week_id):
+        key = hashlib.sha1(f"{farm_name}\0{week_id}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key)
+
+    def get(self, farm_name, week_id, version):
+        """スナップショット（版が違う・なければ None）"""
+        if version is None:
+            return None
+        with self._lock:
+            item = self._items.get((farm_name, week_id))
+            if item is not None and item[0] == version:
+                self._items.move_to_end((farm_name, week_id))
+                return item[1]
+        if self.directory:
+            try:
+                with open(os.path.join(self._dir(farm_name, week_id), version + '.pkl'), 'rb') as f:
+                    snapshot = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                return None
+            self._remember(farm_name, week_id, version, snapshot)
+            return snapshot
+        return None
+
+    def put(self, farm_name, week_id, version, snapshot):
+        """スナップショットを保存（その週の古い版は削除）"""
+        if version is None:
+            return
+        self._remember(farm_name, week_id, version, snapshot)
+        if self.directory:
+            path = self._dir(farm_name, week_id)
+            try:
+                os.makedirs(path, exist_ok=True)
+                tmp_path = os.path.join(path, f"{version}.{os.getpid()}.{threading.get_ident()}.tmp")
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, os.path.join(path, version + '.pkl'))
+                for name in os.listdir(path):
+                    if name.endswith('.pkl') and name != version + '.pkl':
+                        os.remove(os.path.join(path, name))
+            except OSError:
+                pass
+
+    def _remember(self, farm_name, week_id, version, snapshot):
+        with self._lock:
+            self._items[(farm_name, week_id)] = (version, snapshot)
+            self._items.move_to_end((farm_name, week_id))
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
@@ -0,0 +1,292 @@
+import hashlib
+import html
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from io import BytesIO
+
+
+# ===================
+# 印刷用グラフの描画環境
+# ===================
+# フォント候補リスト（先に見つかったものを使用）
+FONT_CANDIDATES = [
+    'Hiragino Sans',
+    'Hiragino Kaku Gothic ProN',
+    'Yu Gothic',
+    'Meiryo',
+    'MS Gothic',
+    'Noto Sans CJK JP',
+    'IPAGothic',
+    'IPAPGothic',
+    'VL Gothic',
+    'Takao Gothic',
+    'DejaVu Sans'
+]
+
+_lock = threading.Lock()          # 初期化（matplotlib の読み込み・フォント検索）の間は保持
+_warmup_lock = threading.Lock()   # ウォームアップ用スレッドの起動だけを保護（初期化を待たない）
+_state = {'font': None, 'warmup': None}
+_timings = {}
+
+
+@contextmanager
+def timed(name):
+    """処理時間を記録（同じ名前は最新値で上書き）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings[name] = time.perf_counter() - start
+
+
+def timings():
+    """記録した処理時間（秒）"""
+    return dict(_timings)
+
+
+def _initialize():
+    """matplotlib を Agg で読み込み、日本語フォントを一度だけ探して設定"""
+    with _lock:
+        if _state['font'] is not None:
+            return _state['font']
+
+        with timed('matplotlib読み込み'):
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+            from matplotlib import font_manager
+
+        with timed('フォント検索'):
+            available_fonts = {f.name for f in font_manager.fontManager.ttflist}
+            selected_font = next((font for font in FONT_CANDIDATES if font in available_fonts), None)
+            # フォントが見つからない場合は英語で表示
+            plt.rcParams['font.family'] = selected_font or 'DejaVu Sans'
+
+        _state['font'] = selected_font or 'DejaVu Sans'
+        return _state['font']
+
+
+def font_family():
+    """グラフに使うフォント名"""
+    return _initialize()
+
+
+def _warm_up():
+    """初期化と小さなグラフの描画を済ませておく（pyplot の状態は使わない）"""
+    _initialize()
+    with timed('ウォームアップ描画'):
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(2, 1))
+        ax = fig.add_subplot()
+        ax.bar(['1', '2'], [1, 2])
+        ax.set_title('P2')
+        fig.savefig(BytesIO(), format='png', dpi=50)
+
+
+def warm_up():
+    """バックグラウンドで描画環境を準備（プロセスごとに一度だけ起動し、初期化の完了は待たない）"""
+    with _warmup_lock:
+        if _state['warmup'] is None:
+            _state['warmup'] = threading.Thread(target=_warm_up, name='render-warmup', daemon=True)
+            _state['warmup'].start()
+        return _state['warmup']
+
+
+# ===================
+# グラフ画像キャッシュ
+# ===================
+class ChartCache:
+    """描画済みのグラフ画像を、データ・スタイル・解像度のハッシュで引くキャッシュ
+
+    メモリ上は LRU で max_items 件まで保持し、directory を指定するとディスクにも保存する
+    （プロセスを再起動しても同じグラフは描画し直さない）。
+    """
+
+    def __init__(self, max_items=256, directory=None):
+        self._lock = threading.Lock()
+        self._items = OrderedDict()   # キー -> 画像データ
+        self.max_items = max_items
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*parts):
+        """キーを作成（同じ内容なら同じキー）"""
+        text = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def get(self, key, suffix=''):
+        """キャッシュ済みの画像（なければ None）"""
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.directory:
+            try:
+                with open(self._path(key, suffix), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                data = None
+            if data is not None:
+                self._remember(key, data)
+                with self._lock:
+                    self.hits += 1
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data, suffix=''):
+        """画像を保存"""
+        self._remember(key, data)
+        if self.directory:
+            path = self._path(key, suffix)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def get_or_render(self, key, render, suffix=''):
+        """キャッシュになければ render() で作成して保存"""
+        data = self.get(key, suffix)
+        if data is None:
+            data = render()
+            self.put(key, data, suffix)
+        return data
+
+
+# CHART_CACHE_DIR を設定するとディスクにも保存
+chart_cache = ChartCache(directory=os.environ.get('CHART_CACHE_DIR') or None)
+
+
+def _render_bar_chart_png(labels, counts, title, color, xlabel, ylabel, dpi):
+    """棒グラフをPNGで描画（pyplot の状態を使わないのでスレッドからも呼べる）"""
+    _initialize()
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(8, 4))
+    ax = fig.add_subplot()
+    bars = ax.bar(labels, counts, color=color, edgecolor='white')
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+
+    # 値をバーの上に表示
+    for bar, val in zip(bars, counts):
+        if val > 0:
+            ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
+                    str(int(val)), ha='center', va='bottom', fontsize=8)
+
+    fig.tight_layout()
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def bar_chart_png(labels, counts, title, color, xlabel='P2 (mm)', ylabel='Count', dpi=150):
+    """棒グラフのPNG（同じデータ・スタイル・解像度なら描画済みの画像を再利用）"""
+    labels = [str(v) for v in labels]
+    counts = [int(v) for v in counts]
+    key = ChartCache.key('bar', 'png', labels, counts, title, color, xlabel, ylabel, dpi, font_family())
+    with timed('グラフ描画'):
+        return chart_cache.get_or_render(
+            key,
+            lambda: _render_bar_chart_png(labels, counts, title, color, xlabel, ylabel, dpi),
+            suffix='.png'
+        )
+
+
+def _nice_step(max_value, max_ticks=6):
+    """目盛り間隔（1, 2, 5 × 10^n）"""
+    if max_value <= 0:
+        return 1
+    raw = max_value / max_ticks
+    magnitude = 10 ** math.floor(math.log10(raw))
+    for factor in (1, 2, 5, 10):
+        if raw <= factor * magnitude:
+            return max(1, int(factor * magnitude))
+    return max(1, int(10 * magnitude))
+
+
+def _render_bar_chart_svg(labels, counts, title, color, xlabel, ylabel, width, height):
+    """棒グラフをSVGで直接生成（matplotlib を使わない）"""
+    left, right, top, bottom = 48, 12, 34, 44
+    plot_w = width - left - right
+    plot_h = height - top - bottom
+    # 値ラベルの分だけ上に余白を取る
+    step = _nice_step(max(counts, default=0) * 1.1)
+    y_max = max(step, math.ceil(max(counts, default=0) * 1.1 / step) * step)
+    slot = plot_w / max(len(labels), 1)
+    bar_w = slot * 0.8
+
+    def y_pos(value):
+        return top + plot_h - value / y_max * plot_h
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'width="100%" font-family="sans-serif" font-size="10">',
+        f'<text x="{left + plot_w / 2:.1f}" y="18" text-anchor="middle" font-size="13">{html.escape(title)}</text>',
+    ]
+    # 目盛りと補助線
+    for tick in range(0, y_max + 1, step):
+        y = y_pos(tick)
+        parts.append(f'<line x1="{left}" y1="{y:.1f}" x2="{left + plot_w}" y2="{y:.1f}" stroke="#e5e5e5"/>')
+        parts.append(f'<text x="{left - 4}" y="{y + 3:.1f}" text-anchor="end">{tick}</text>')
+    # 棒と値
+    for i, (label, count) in enumerate(zip(labels, counts)):
+        x = left + slot * i + (slot - bar_w) / 2
+        y = y_pos(count)
+        parts.append(
+            f'<rect x="{x:.1f}" y="{y:.1f}" width="{bar_w:.1f}" height="{top + plot_h - y:.1f}" '
+            f'fill="{html.escape(color)}" stroke="white"/>'
+        )
+        if count > 0:
+            parts.append(f'<text x="{x + bar_w / 2:.1f}" y="{y - 3:.1f}" text-anchor="middle" font-size="8">{count}</text>')
+        parts.append(
+            f'<text x="{x + bar_w / 2:.1f}" y="{top + plot_h + 13:.1f}" text-anchor="middle" font-size="8">{html.escape(label)}</text>'
+        )
+    # 軸と軸ラベル
+    parts.append(f'<line x1="{left}" y1="{top + plot_h}" x2="{left + plot_w}" y2="{top + plot_h}" stroke="#333"/>')
+    parts.append(f'<line x1="{left}" y1="{top}" x2="{left}" y2="{top + plot_h}" stroke="#333"/>')
+    parts.append(f'<text x="{left + plot_w / 2:.1f}" y="{height - 8}" text-anchor="middle" font-size="11">{html.escape(xlabel)}</text>')
+    parts.append(
+        f'<text x="12" y="{top + plot_h / 2:.1f}" text-anchor="middle" font-size="11" '
+        f'transform="rotate(-90 12 {top + plot_h / 2:.1f})">{html.escape(ylabel)}</text>'
+    )
+    parts.append('</svg>')
+    return '\n'.join(parts).encode('utf-8')
+
+
+def bar_chart_svg(labels, counts, title, color, xlabel='P2 (mm)', ylabel='Count', width=640, height=320):
+    """棒グラフのSVG（インラインで埋め込む文字列。描画済みのものはキャッシュから）"""
+    labels = [str(v) for v in labels]
+    counts = [int(v) for v in counts]
+    key = ChartCache.key('bar', 'svg', labels, counts, title, color, xlabel, ylabel, width, height)
+    with timed('グラフ描画'):
+        svg = chart_cache.get_or_render(
+            key,
+            lambda: _render_bar_chart_svg(labels, counts, title, color, xlabel, ylabel, width, height),
+            suffix='.svg'
+        )
+    return svg.decode('utf-8')
@@ -0,0 +1,214 @@
+import argparse
+import io
+import logging
+import multiprocessing
+import os
+import pickle
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from fertility_analytics import parse_date_flexible, detect_repeat_services, repeat_breeding_counts
+from fertility_store import RecordStore, WeekAnnotations
+from report_html import generate_print_html
+from report_model import build_report_model, semen_week_window, SEMEN_REPORT_FARMS
+
+logger = logging.getLogger(__name__)
+
+
+# ===================
+# 一括出力用の索引
+# ===================
+class P2Index:
+    """P2値シートを（農場, 日付）で引けるようにした索引（最初に見つかった行を使用）"""
+
+    def __init__(self, sow_records=(), gilt_records=()):
+        self.sow = {}
+        self.gilt = {}
+        for record in sow_records:
+            key = (record.get("農場"), parse_date_flexible(record.get("離乳日", "")))
+            self.sow.setdefault(key, record)
+        for record in gilt_records:
+            key = (record.get("農場"), parse_date_flexible(record.get("種付開始週", "")))
+            self.gilt.setdefault(key, record)
+
+    def sow_record(self, farm_name, weaning_date):
+        return self.sow.get((farm_name, parse_date_flexible(weaning_date)))
+
+    def gilt_record(self, farm_name, week_id):
+        return self.gilt.get((farm_name, parse_date_flexible(week_id)))
+
+
+def week_semen_report(semen_all, start_date):
+    """全期間の採精レポート（採精日は正規化済み）から種付開始週の分を抜き出す"""
+    if semen_all is None or len(semen_all) == 0:
+        return None
+    previous_sunday, saturday_of_week = semen_week_window(start_date)
+    dates = pd.to_datetime(semen_all['採精日'].replace('', None), errors='coerce')
+    return semen_all[(dates >= previous_sunday) & (dates <= saturday_of_week)]
+
+
+def index_sources(p2_index, semen_all, farm_name, week_id):
+    """読み込み済みの索引から P2値・採精レポートを引く関数（build_report_model に渡す）"""
+    def fetch(weaning_date, start_date):
+        return {
+            'p2_record': p2_index.sow_record(farm_name, weaning_date) if weaning_date is not None else None,
+            'gilt_p2_record': p2_index.gilt_record(farm_name, week_id),
+            'semen_week': week_semen_report(semen_all, start_date) if farm_name in SEMEN_REPORT_FARMS else None,
+        }
+    return fetch
+
+
+# ===================
+# 一括出力（プロセスプール）
+# ===================
+_shared = {}
+
+
+def _init_worker(p2_index, semen_all, chart_format, intervals):
+    """ワーカーごとに一度だけ共有データ・出力設定を受け取る"""
+    _shared.update(p2_index=p2_index, semen_all=semen_all, chart_format=chart_format, intervals=intervals)
+
+
+def _render_week(job):
+    """1週分の印刷用HTMLを作成（プロセスプール用）"""
+    farm_name, week_id, df, week_notes, repeat = job
+    report = build_report_model(
+        df, farm_name, week_id, week_notes,
+        fetch_sources=index_sources(_shared['p2_index'], _shared['semen_all'], farm_name, week_id),
+        repeat=repeat, intervals=_shared['intervals']
+    )
+    html = generate_print_html(report, week_notes["week_comment"], chart_format=_shared['chart_format'])
+    return f"鑑定落ちリスト_{farm_name}_{week_id}.html", html
+
+
+def export_reports(store, annotations, p2_index, semen_all, pairs, chart_format='svg', workers=None, intervals=False):
+    """（農場, 週）ごとの印刷用HTMLを作成し、[(ファイル名, HTML)] を返す
+
+    intervals=True なら産次別・精液別の表に95%信頼区間・推定受胎率の列を加える。
+    """
+    jobs = []
+    repeats = {}
+    for farm_name, week_id in pairs:
+        df = store.week_frame(farm_name, week_id)
+        if df is None or len(df) == 0:
+            continue
+        df = df.assign(受胎=df['妊娠鑑定結果'] == '受胎確定')
+
+        # 再発付けの手入力がなければ履歴から自動判定（農場ごとに一度だけ判定）
+        week_notes = annotations.week(farm_name, week_id)
+        repeat = week_notes["repeat_breeding"] or {}
+        if not repeat.get("種付") and not repeat.get("受胎"):
+            if farm_name not in repeats:
+                repeats[farm_name] = detect_repeat_services(store.records(farm_name))
+            total, pregnant = repeat_breeding_counts(repeats[farm_name], farm_name, week_id)
+            if total > 0:
+                repeat = {"種付": str(total), "受胎": str(pregnant)}
+        jobs.append((farm_name, week_id, df, week_notes, repeat))
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    if workers > 1:
+        # Streamlit のスレッドから fork しないよう forkserver / spawn で起動
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                     initargs=(p2_index, semen_all, chart_format, intervals)) as pool:
+                return list(pool.map(_render_week, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+        except (BrokenProcessPool, OSError, pickle.PicklingError) as e:
+            # プールを起動できない・ワーカーが落ちた場合だけ1プロセスでやり直す（作成中のエラーはそのまま送出）
+            logger.warning("プロセスプールを使えないため1プロセスで出力します: %r", e)
+    _init_worker(p2_index, semen_all, chart_format, intervals)
+    return [_render_week(job) for job in jobs]
+
+
+def reports_zip(reports):
+    """印刷用HTMLをまとめたZIP（bytes）"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for filename, html in reports:
+            zf.writestr(filename, html)
+    return buffer.getvalue()
+
+
+# ===================
+# コマンドライン
+# ===================
+def _records(spreadsheet, sheet_name):
+    """シートのレコード（シートがなければ空）"""
+    import gspread
+    try:
+        return spreadsheet.worksheet(sheet_name).get_all_records()
+    except gspread.WorksheetNotFound:
+        return []
+
+
+def load_sources(spreadsheet):
+    """一括出力に必要なデータをスプレッドシートから一度に読み込み"""
+    import gspread
+    store = RecordStore()
+    try:
+        data = spreadsheet.worksheet("種付記録").get_all_values()
+        if len(data) > 1:
+            store.load_rows(data[0], data[1:])
+    except gspread.WorksheetNotFound:
+        pass
+
+    annotations = WeekAnnotations()
+    annotations.load_records(_records(spreadsheet, "母豚詳細"), _records(spreadsheet, "再発付け"),
+                             _records(spreadsheet, "週コメント"))
+    p2_index = P2Index(_records(spreadsheet, "P2値_経産"), _records(spreadsheet, "P2値_初産"))
+
+    semen_all = pd.DataFrame(_records(spreadsheet, "採精レポート"))
+    if len(semen_all) > 0:
+        semen_all['採精日'] = [parse_date_flexible(v) or '' for v in semen_all['採精日']]
+    return store, annotations, p2_index, semen_all
+
+
+def main():
+    parser = argparse.ArgumentParser(description="鑑定落ちリストの印刷用HTMLを一括出力")
+    parser.add_argument("--spreadsheet-id", required=True, help="GoogleスプレッドシートのID")
+    parser.add_argument("--credentials", default="credentials.json", help="サービスアカウントの認証情報")
+    parser.add_argument("--farm", action="append", help="対象の農場（複数指定可。省略時は全農場）")
+    parser.add_argument("--from", dest="date_from", help="対象の最初の週（YYYY-MM-DD）")
+    parser.add_argument("--to", dest="date_to", help="対象の最後の週（YYYY-MM-DD）")
+    parser.add_argument("--out", default="鑑定落ちリスト.zip", help="出力先（.zip ならZIP、それ以外はフォルダ）")
+    parser.add_argument("--png", action="store_true", help="グラフをSVGではなくPNG画像で埋め込む")
+    parser.add_argument("--intervals", action="store_true", help="受胎率の表に95%%信頼区間・推定受胎率の列を加える")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時はCPU数）")
+    args = parser.parse_args()
+
+    import gspread
+    from google.oauth2.service_account import Credentials
+    credentials = Credentials.from_service_account_file(
+        args.credentials,
+        scopes=['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
+    )
+    spreadsheet = gspread.authorize(credentials).open_by_key(args.spreadsheet_id)
+    store, annotations, p2_index, semen_all = load_sources(spreadsheet)
+
+    pairs = [
+        (farm_name, week_id) for farm_name, week_id in store.week_keys()
+        if (not args.farm or farm_name in args.farm)
+        and (not args.date_from or week_id >= args.date_from)
+        and (not args.date_to or week_id <= args.date_to)
+    ]
+    reports = export_reports(store, annotations, p2_index, semen_all, pairs,
+                             chart_format='png' if args.png else 'svg', workers=args.workers,
+                             intervals=args.intervals)
+
+    if args.out.endswith('.zip'):
+        with open(args.out, 'wb') as f:
+            f.write(reports_zip(reports))
+    else:
+        os.makedirs(args.out, exist_ok=True)
+        for filename, html in reports:
+            with open(os.path.join(args.out, filename), 'w', encoding='utf-8') as f:
+                f.write(html)
+    print(f"{len(reports)}件の印刷用ページを出力しました: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
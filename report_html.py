@@ -0,0 +1,310 @@
+import base64
+import html
+from datetime import datetime
+from string import Template
+
+import pandas as pd
+
+import render_env
+
+
+# ===================
+# 表のHTML
+# ===================
+def _cell_text(value):
+    """セルの表示文字列（欠損は空欄）"""
+    if value is None or (isinstance(value, float) and value != value) or value is pd.NaT:
+        return ''
+    return str(value)
+
+
+def render_table(df, css_class=None, escape=True):
+    """DataFrame を <table> に変換
+
+    to_html のような書式判定をせず、列ごとに文字列化して行をそのまま書き出す。
+    escape=False ならセルの HTML をそのまま埋め込む。
+    """
+    quote = html.escape if escape else str
+    head = ''.join(f'<th>{quote(str(col))}</th>' for col in df.columns)
+    columns = [
+        [quote(_cell_text(v)) for v in df.iloc[:, i].tolist()]
+        for i in range(df.shape[1])
+    ]
+    body = ''.join(
+        '<tr>' + ''.join(f'<td>{cell}</td>' for cell in row) + '</tr>'
+        for row in zip(*columns)
+    )
+    class_attr = f' class="{css_class}"' if css_class else ''
+    return f'<table{class_attr}><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>'
+
+
+# ===================
+# 印刷用HTML
+# ===================
+PRINT_CSS = """
+    @media print {
+        body { -webkit-print-color-adjust: exact; print-color-adjust: exact; }
+    }
+    body {
+        font-family: "Hiragino Sans", "Hiragino Kaku Gothic ProN", "Noto Sans JP", "メイリオ", sans-serif;
+        font-size: 11px;
+        line-height: 1.4;
+        color: #333;
+        max-width: 1000px;
+        margin: 0 auto;
+        padding: 20px;
+    }
+    h1 {
+        font-size: 20px;
+        text-align: center;
+        margin-bottom: 5px;
+        color: #1f77b4;
+    }
+    h2 {
+        font-size: 14px;
+        margin-top: 20px;
+        margin-bottom: 10px;
+        padding-bottom: 3px;
+        border-bottom: 2px solid #1f77b4;
+    }
+    .header-info {
+        text-align: center;
+        margin-bottom: 20px;
+    }
+    .summary-container {
+        display: flex;
+        justify-content: center;
+        gap: 30px;
+        margin: 20px 0;
+    }
+    .summary-item {
+        text-align: center;
+        padding: 15px 25px;
+        background-color: #f0f2f6;
+        border-radius: 10px;
+    }
+    .summary-item .label { font-size: 12px; color: #666; }
+    .summary-item .rate { font-size: 28px; font-weight: bold; }
+    .summary-item .count { font-size: 14px; color: #333; }
+    .rate-total { color: #1f77b4; }
+    .rate-sow { color: #2ca02c; }
+    .rate-gilt { color: #ff7f0e; }
+    .two-column {
+        display: flex;
+        gap: 30px;
+    }
+    .two-column > div { flex: 1; }
+    .chart-container {
+        display: flex;
+        gap: 15px;
+        align-items: flex-start;
+        margin: 10px 0;
+    }
+    .chart {
+        flex-shrink: 0;
+        max-width: 500px;
+        width: 65%;
+    }
+    .table-side {
+        flex: 1;
+        font-size: 9px;
+    }
+    .table-side table {
+        font-size: 9px;
+    }
+    table {
+        width: 100%;
+        border-collapse: collapse;
+        margin: 10px 0;
+        font-size: 10px;
+    }
+    th, td {
+        border: 1px solid #ddd;
+        padding: 6px;
+        text-align: center;
+    }
+    th {
+        background-color: #f0f2f6;
+        font-weight: bold;
+    }
+    .comment-box {
+        background-color: #f9f9f9;
+        border: 1px solid #ddd;
+        border-radius: 5px;
+        padding: 15px;
+        margin-top: 10px;
+        white-space: pre-wrap;
+    }
+    .print-button {
+        position: fixed;
+        top: 10px;
+        right: 10px;
+        padding: 10px 20px;
+        background-color: #1f77b4;
+        color: white;
+        border: none;
+        border-radius: 5px;
+        cursor: pointer;
+        font-size: 14px;
+    }
+    .print-button:hover { background-color: #1565a0; }
+    @media print {
+        .print-button { display: none; }
+    }
+"""
+
+# 文書全体のテンプレート（CSS は読み込み時に一度だけ埋め込む）
+PRINT_DOCUMENT = Template("""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>鑑定落ちリスト_${farm_name}_${week_id}</title>
+    <style>""" + PRINT_CSS.replace('$', '$$') + """</style>
+</head>
+<body>
+    <button class="print-button" onclick="window.print()">🖨️ 印刷 / PDF保存</button>
+
+    <h1>鑑定落ちリスト</h1>
+
+    <div class="header-info">
+        <p><strong>種付期間:</strong> ${start_date} ～ ${end_date}</p>
+        <p><strong>農場:</strong> ${farm_name}</p>
+        <p><strong>作成日:</strong> ${created_at}</p>
+    </div>
+
+    <h2>【受胎率サマリー】</h2>
+    <div class="summary-container">
+        ${summary}
+    </div>
+
+    <div class="two-column">
+        <div>
+            <h2>【産次別受胎率】</h2>
+            ${parity_table}
+        </div>
+        <div>
+            <h2>【精液別受胎率】</h2>
+            ${semen_table}
+        </div>
+    </div>
+
+    <h2>【不受胎リスト】</h2>
+    ${not_pregnant}
+
+    ${sections}
+</body>
+</html>
+""")
+
+SUMMARY_ITEM = Template("""<div class="summary-item">
+            <div class="label">${label}</div>
+            <div class="rate ${rate_class}">${rate}%</div>
+            <div class="count">${pregnant} / ${total} 頭</div>
+        </div>""")
+
+P2_SECTION = Template("""
+    <h2>【${title}】</h2>
+    <p>${caption}</p>
+    <div class="chart-container">
+        ${chart}
+        <div class="table-side">
+            ${table}
+        </div>
+    </div>
+""")
+
+P2_SECTION_NO_CHART = Template("""
+    <h2>【${title}】</h2>
+    <p>${caption}</p>
+    ${table}
+""")
+
+TABLE_SECTION = Template("""
+    <h2>【${title}】</h2>
+    ${body}
+""")
+
+def _chart_html(data_df, title, color, chart_format, x_col='P2値(mm)', y_col='頭数'):
+    """棒グラフを生成してHTMLに埋め込む要素を返す（描画済みの画像はキャッシュから）"""
+    # タイトルは英語で表示（文字化け防止）
+    if '経産' in title:
+        chart_title = 'P2 Distribution (Sow)'
+    elif '初産' in title:
+        chart_title = 'P2 Distribution (Gilt)'
+    else:
+        chart_title = 'P2 Distribution'
+
+    labels = data_df[x_col].astype(str).tolist()
+    counts = data_df[y_col].tolist()
+    if chart_format == 'svg':
+        svg = render_env.bar_chart_svg(labels, counts, chart_title, color)
+        return f'<div class="chart" role="img" aria-label="{title}">{svg}</div>'
+    png = render_env.bar_chart_png(labels, counts, chart_title, color)
+    chart_base64 = base64.b64encode(png).decode('utf-8')
+    return f'<img class="chart" src="data:image/png;base64,{chart_base64}" alt="{title}">'
+
+
+def _p2_section(title, caption, table, color, chart_format):
+    """P2値分布のセクション（グラフが作れなければ表のみ）"""
+    try:
+        chart = _chart_html(table, title, color, chart_format)
+    except Exception:
+        return P2_SECTION_NO_CHART.substitute(title=title, caption=caption, table=render_table(table))
+    return P2_SECTION.substitute(title=title, caption=caption, chart=chart, table=render_table(table))
+
+
+def generate_print_html(report, week_comment, chart_format='png'):
+    """レポートモデル（build_report_model）から印刷用HTMLを生成
+
+    chart_format='svg' ならグラフをインラインSVGで埋め込む。
+    """
+    summary = '\n        '.join(
+        SUMMARY_ITEM.substitute(
+            label=item['label'], rate_class=item['rate_class'], rate=f"{item['rate']:.1f}",
+            pregnant=item['pregnant'], total=item['total']
+        )
+        for item in report['summary']
+    )
+
+    # 不受胎リスト
+    if len(report['not_pregnant_print']) > 0:
+        not_pregnant_html = render_table(report['not_pregnant_print'])
+    else:
+        not_pregnant_html = "<p>不受胎なし</p>"
+
+    sections = []
+    p2 = report['p2']
+    if p2 and p2['total'] > 0:
+        sections.append(_p2_section(
+            '離乳時P2値分布（経産）',
+            f"離乳日: {report['weaning_date']} / ロット: {p2['lot']} / 平均P2値: {p2['average']:.1f}mm",
+            p2['table'], '#1f77b4', chart_format
+        ))
+    gilt_p2 = report['gilt_p2']
+    if gilt_p2 and gilt_p2['total'] > 0:
+        sections.append(_p2_section(
+            '種付時P2値分布（初産）',
+            f"種付開始週: {report['week_id']} / 平均P2値: {gilt_p2['average']:.1f}mm",
+            gilt_p2['table'], '#ff7f0e', chart_format
+        ))
+    semen_report = report['semen_report']
+    if semen_report is not None and len(semen_report) > 0:
+        sections.append(TABLE_SECTION.substitute(title='採精レポート', body=render_table(semen_report)))
+    if week_comment:
+        sections.append(TABLE_SECTION.substitute(
+            title='週のコメント',
+            body=f'<div class="comment-box">{week_comment.replace(chr(10), "<br>")}</div>'
+        ))
+
+    return PRINT_DOCUMENT.substitute(
+        farm_name=report['farm_name'],
+        week_id=report['week_id'],
+        start_date=report['start_date'].strftime('%Y-%m-%d'),
+        end_date=report['end_date'].strftime('%Y-%m-%d'),
+        created_at=datetime.now().strftime('%Y-%m-%d %H:%M'),
+        summary=summary,
+        parity_table=render_table(report['df_parity']),
+        semen_table=render_table(report['semen_stats']),
+        not_pregnant=not_pregnant_html,
+        sections=''.join(sections),
+    )
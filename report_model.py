@@ -0,0 +1,246 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from fertility_analytics import join_pig_details, add_rate_intervals, format_interval
+
+
+# ===================
+# 週レポートのモデル（画面・印刷用ページ・一括出力で共通）
+# ===================
+P2_COLUMNS = [str(i) for i in range(4, 21)]
+SEMEN_REPORT_FARMS = ["花泉1号", "花泉2号"]
+SEMEN_REPORT_COLUMNS = ['採精日', '個体番号', '採精量', '精子数', '備考']
+SEMEN_REPORT_LABELS = ['採精日', '個体番号', '採精量(ml)', '精子数(億)', '備考']
+
+NOT_PREGNANT_VIEW_COLUMNS = ['種付日', '母豚番号', '精液', '分娩予定日', '産次', '投与ホルモン', '離乳後交配日数',
+                             '分娩舎', 'ロット', '哺乳日数', 'P2値', 'コメント']
+NOT_PREGNANT_PRINT_COLUMNS = ['種付日', '母豚番号', '精液', '産次', '分娩舎', 'ロット', '哺乳日数', 'P2値', 'コメント']
+
+SUMMARY_GROUPS = [
+    # (ラベル, 画面の色, 印刷用ページのクラス)
+    ('合計', '#1f77b4', 'rate-total'),
+    ('経産', '#2ca02c', 'rate-sow'),
+    ('初産(Gilt)', '#ff7f0e', 'rate-gilt'),
+]
+
+
+def add_interval_columns(table, prior_mask=None):
+    """表示用の集計表に95%信頼区間と推定受胎率（経験ベイズ）の列を追加"""
+    table = add_rate_intervals(table, prior_mask=prior_mask)
+    table['95%信頼区間'] = format_interval(table['下限'], table['上限'])
+    table['推定受胎率'] = [f"{v:.1f}%" if pd.notna(v) else '' for v in table['推定受胎率']]
+    return table.drop(columns=['下限', '上限'])
+
+
+def parity_rates(df, repeat=None, parity=None):
+    """産次別受胎率の表（repeat に再発付けの頭数があれば最後の行に追加）"""
+    if parity is None:
+        parity = df['産次'].astype(int).to_numpy()
+    counts = pd.DataFrame({'産次': parity, '受胎': df['受胎'].to_numpy(dtype=bool)}).groupby('産次')['受胎']
+    parity_data = [
+        {
+            '産次': f"{p}産",
+            '受胎': int(p_pregnant),
+            '種付': int(p_total),
+            '受胎率': f"{p_pregnant / p_total * 100 if p_total > 0 else 0:.1f}%"
+        }
+        for p, p_pregnant, p_total in zip(counts.sum().index, counts.sum(), counts.count())
+    ]
+
+    repeat = repeat or {}
+    if repeat.get("種付", "") and repeat.get("受胎", ""):
+        try:
+            rt = int(repeat["種付"])
+            rp = int(repeat["受胎"])
+            parity_data.append({
+                '産次': '再発付',
+                '受胎': rp,
+                '種付': rt,
+                '受胎率': f"{rp / rt * 100 if rt > 0 else 0:.1f}%"
+            })
+        except ValueError:
+            pass
+    return pd.DataFrame(parity_data, columns=['産次', '受胎', '種付', '受胎率'])
+
+
+def semen_rates(df):
+    """精液別受胎率の表"""
+    semen_stats = df.groupby('雄豚・精液・あて雄').agg(
+        種付=('受胎', 'count'),
+        受胎=('受胎', 'sum')
+    ).reset_index()
+    semen_stats['受胎率'] = (semen_stats['受胎'] / semen_stats['種付'] * 100).round(1).astype(str) + '%'
+    semen_stats.columns = ['精液', '種付', '受胎', '受胎率']
+    return semen_stats.sort_values('種付', ascending=False)
+
+
+def most_common_weaning(df, is_sow=None):
+    """経産豚の前回離乳日のうち最も多い日（P2値（経産）の検索に使用）"""
+    if is_sow is None:
+        is_sow = df['産次'].astype(int).to_numpy() >= 2
+    weaning = df.loc[is_sow, '前回離乳日']
+    weaning = weaning[weaning.notna() & (weaning.astype(str) != '')]
+    if len(weaning) == 0:
+        return None
+    return weaning.value_counts().idxmax()
+
+
+def p2_distribution(record):
+    """P2値シートの1行から分布を作成
+
+    chart は読み取れた全列（0頭を含む）、table は1頭以上の行だけ。
+    """
+    rows = []
+    for p2 in P2_COLUMNS:
+        try:
+            rows.append((f"{p2}mm", int(p2), int(record.get(p2, 0))))
+        except (TypeError, ValueError):
+            continue
+    chart = pd.DataFrame([(label, count) for label, _, count in rows], columns=['P2値(mm)', '頭数'])
+    total_count = sum(count for _, _, count in rows)
+    weighted_sum = sum(value * count for _, value, count in rows)
+    return {
+        'chart': chart,
+        'table': chart[chart['頭数'] > 0].reset_index(drop=True),
+        'total': total_count,
+        'average': weighted_sum / total_count if total_count > 0 else None,
+    }
+
+
+def fetch_report_sources(df, fetch_sources, is_sow=None):
+    """P2値・採精レポートの元データを取得（経産は最も多い前回離乳日、初産・採精は種付開始週で検索）
+
+    戻り値: (検索に使った前回離乳日, fetch_sources の戻り値)
+    """
+    weaning_date = most_common_weaning(df, is_sow)
+    return weaning_date, fetch_sources(weaning_date, pd.to_datetime(df['種付日'].min()))
+
+
+def semen_week_window(start_date):
+    """種付開始週に対応する採精期間（前の日曜〜土曜）"""
+    start_date = pd.to_datetime(start_date)
+    days_since_monday = start_date.weekday()
+    if days_since_monday == 0:
+        previous_sunday = start_date - timedelta(days=1)
+    else:
+        previous_sunday = start_date - timedelta(days=days_since_monday + 1)
+
+    days_until_saturday = 5 - start_date.weekday()
+    if days_until_saturday < 0:
+        days_until_saturday += 7
+    saturday_of_week = start_date + timedelta(days=days_until_saturday)
+    return previous_sunday, saturday_of_week
+
+
+def format_semen_report(df_semen_week):
+    """採精レポートを表示用の列に整形"""
+    if df_semen_week is None or len(df_semen_week) == 0:
+        return None
+    available_cols = [col for col in SEMEN_REPORT_COLUMNS if col in df_semen_week.columns]
+    semen_report = df_semen_week[available_cols].copy()
+    if '採精日' in semen_report.columns:
+        semen_report['採精日'] = pd.to_datetime(semen_report['採精日']).dt.strftime('%Y-%m-%d')
+    if '備考' in semen_report.columns:
+        semen_report['備考'] = semen_report['備考'].fillna('').astype(str)
+    semen_report.columns = SEMEN_REPORT_LABELS[:len(available_cols)]
+    return semen_report
+
+
+def _days_text(value):
+    """離乳後交配日数の表示（数値なら整数に）"""
+    if pd.isna(value) or value == '':
+        return ''
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return value
+
+
+def not_pregnant_tables(df_not_pregnant, pig_details):
+    """不受胎リストの画面用・印刷用の表（保存済みの母豚詳細を結合）"""
+    df_joined = join_pig_details(df_not_pregnant, pig_details).rename(columns={'雄豚・精液・あて雄': '精液'})
+    df_joined['母豚番号'] = df_joined['母豚番号'].astype(str)
+    for col in ['分娩予定日', '投与ホルモン', '離乳後交配日数']:
+        if col not in df_joined.columns:
+            df_joined[col] = ''
+    df_joined['投与ホルモン'] = df_joined['投与ホルモン'].fillna('')
+    df_joined['離乳後交配日数'] = [_days_text(v) for v in df_joined['離乳後交配日数']]
+    return (df_joined[NOT_PREGNANT_VIEW_COLUMNS].reset_index(drop=True),
+            df_joined[NOT_PREGNANT_PRINT_COLUMNS].reset_index(drop=True))
+
+
+def build_report_model(df, farm_name, week_id, week_notes, fetch_sources=None, repeat=None, intervals=False):
+    """種付記録から、画面と印刷用ページで使う表・グラフ用データを一度にまとめて作成
+
+    fetch_sources(weaning_date, start_date) は P2値・採精レポートの元データ
+    {'p2_record', 'gilt_p2_record', 'semen_week'} を返す関数（シート・索引・スナップショットの
+    どれから読むかは呼び出し側で決める）。None なら P2値・採精レポートは作らない（期間別レポート）。
+    intervals=True なら産次別・精液別の表に信頼区間の列を加える。
+    """
+    start_date = pd.to_datetime(df['種付日'].min())
+    end_date = pd.to_datetime(df['種付日'].max())
+    parity = df['産次'].astype(int).to_numpy()
+    pregnant = df['受胎'].to_numpy(dtype=bool)
+    is_sow = parity >= 2
+    is_gilt = parity == 1
+
+    # 受胎率サマリー
+    summary = []
+    for (label, color, rate_class), values in zip(SUMMARY_GROUPS, (pregnant, pregnant[is_sow], pregnant[is_gilt])):
+        summary.append({
+            'label': label,
+            'color': color,
+            'rate_class': rate_class,
+            'pregnant': int(values.sum()),
+            'total': len(values),
+            'rate': values.sum() / len(values) * 100 if len(values) > 0 else 0,
+        })
+
+    # 産次別・精液別
+    df_parity = parity_rates(df, repeat, parity)
+    semen_stats = semen_rates(df)
+    if intervals:
+        if len(df_parity) > 0:
+            df_parity = add_interval_columns(df_parity, prior_mask=df_parity['産次'] != '再発付')
+        semen_stats = add_interval_columns(semen_stats)
+
+    # 不受胎リスト
+    df_not_pregnant = df[~pregnant].copy()
+    not_pregnant_view, not_pregnant_print = not_pregnant_tables(df_not_pregnant, week_notes["pig_details"])
+
+    model = {
+        'farm_name': farm_name,
+        'week_id': week_id,
+        'start_date': start_date,
+        'end_date': end_date,
+        'repeat': repeat,
+        'intervals': intervals,
+        'summary': summary,
+        'df_parity': df_parity,
+        'semen_stats': semen_stats,
+        'df_not_pregnant': df_not_pregnant,
+        'not_pregnant_view': not_pregnant_view,
+        'not_pregnant_print': not_pregnant_print,
+        'sources': None,
+        'weaning_date': None,
+        'p2': None,
+        'gilt_p2': None,
+        'semen_window': None,
+        'semen_report': None,
+    }
+    if fetch_sources is None:
+        return model
+
+    # P2値・採精レポート
+    weaning_date, sources = fetch_report_sources(df, fetch_sources, is_sow)
+    model['sources'] = sources
+    model['weaning_date'] = weaning_date
+    if sources['p2_record'] and weaning_date is not None:
+        model['p2'] = dict(p2_distribution(sources['p2_record']), lot=sources['p2_record'].get('離乳ロット', ''))
+    if sources['gilt_p2_record']:
+        model['gilt_p2'] = p2_distribution(sources['gilt_p2_record'])
+    if farm_name in SEMEN_REPORT_FARMS:
+        model['semen_window'] = semen_week_window(start_date)
+        model['semen_report'] = format_semen_report(sources['semen_week'])
+    return model
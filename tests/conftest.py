@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fertility_store import RecordStore  # noqa: E402
+
+
+RECORD_COLUMNS = ['種付日', '母豚番号', '産次', '雄豚・精液・あて雄', '妊娠鑑定結果', '前回離乳日',
+                  '分娩予定日', '投与ホルモン', '離乳後交配日数', '再発日', '流産日', '母豚廃用日']
+
+
+def make_week(rows):
+    """1週分の種付記録（シートと同じく全列文字列）
+
+    rows は {列名: 値} のリスト。省略した列は空文字。
+    """
+    return pd.DataFrame([{col: str(row.get(col, '')) for col in RECORD_COLUMNS} for row in rows],
+                        columns=RECORD_COLUMNS)
+
+
+def make_records(weeks):
+    """{(農場, 週): rows} から farm_name / week_id 列付きの種付記録を作成"""
+    frames = [make_week(rows).assign(farm_name=farm, week_id=week) for (farm, week), rows in weeks.items()]
+    return pd.concat(frames, ignore_index=True)
+
+
+def service(date, sow, result='受胎確定', parity=2, semen='A', **extra):
+    """種付記録1行"""
+    return dict({'種付日': date, '母豚番号': sow, '産次': parity, '雄豚・精液・あて雄': semen,
+                 '妊娠鑑定結果': result}, **extra)
+
+
+def sheet_rows(weeks):
+    """{(農場, 週): rows} を「種付記録」シートの値（ヘッダー, 行）に変換"""
+    headers = None
+    rows = []
+    for (farm, week), week_rows in weeks.items():
+        df = make_week(week_rows)
+        headers = ['farm_name', 'week_id'] + list(df.columns)
+        rows += [[farm, week] + list(row) for row in df.itertuples(index=False)]
+    return headers, rows
+
+
+def make_store():
+    """2農場・3週分の種付記録を読み込んだストア"""
+    store = RecordStore()
+    store.load_rows(*sheet_rows({
+        ('A', '2025-01-06'): [service('2025-01-06', 'S1'), service('2025-01-07', 'S2', '不受胎')],
+        ('A', '2025-01-13'): [service('2025-01-13', 'S3')],
+        ('B', '2025-01-06'): [service('2025-01-06', 'S9', '不受胎')],
+    }))
+    return store
@@ -0,0 +1,104 @@
+from math import comb
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import breeding_simulator
+from breeding_simulator import breeding_cells, historical_losses, simulate_breeding_target, parity_group
+
+
+def cells(services=10000, conceptions=5000):
+    return pd.DataFrame({'産次区分': ['2産'], '精液': ['A'], '種付': [services], '受胎': [conceptions], '構成比': [1.0]})
+
+
+def binomial_required(target, p, confidence):
+    """損耗なし・受胎率 p 固定のときの必要種付頭数（厳密解）"""
+    m = target
+    while sum(comb(m, j) * p ** j * (1 - p) ** (m - j) for j in range(target, m + 1)) < confidence:
+        m += 1
+    return m
+
+
+def test_parity_groups_and_cell_shares():
+    assert parity_group([1, 2, 3, 5, 6, 9]).tolist() == ['初産', '2産', '3-5産', '3-5産', '6産以上', '6産以上']
+    cube = pd.DataFrame({
+        '産次': [1, 2, 4, 4],
+        '精液': ['A', 'A', 'A', 'B'],
+        '種付': [10, 20, 30, 40],
+        '受胎': [5, 15, 25, 30],
+    })
+    shares = breeding_cells(cube).set_index(['産次区分', '精液'])['構成比']
+    assert shares.to_dict() == pytest.approx({('初産', 'A'): 0.1, ('2産', 'A'): 0.2, ('3-5産', 'A'): 0.3, ('3-5産', 'B'): 0.4})
+
+    # 初産の割合を指定すると、残りは経産の構成比のまま配分し直す
+    shares = breeding_cells(cube, gilt_share=0.5).set_index(['産次区分', '精液'])['構成比']
+    assert shares[('初産', 'A')] == pytest.approx(0.5)
+    assert shares[('3-5産', 'B')] == pytest.approx(0.5 * 40 / 90)
+
+
+def test_historical_losses_counts_completed_pregnancies_only():
+    pregnancies = pd.DataFrame({
+        '分娩予定日_dt': pd.to_datetime(['2025-01-10', '2025-01-10', '2025-12-01']),
+        '損耗日数': [np.nan, 40.0, 30.0],
+        '頭数': [9, 1, 3],
+    })
+    assert historical_losses(pregnancies, as_of='2025-06-01') == (10, 1)
+    assert historical_losses(None) == (0, 0)
+
+
+def test_required_breedings_match_binomial_solution():
+    required, table, distribution = simulate_breeding_target(
+        cells(), loss_heads=10000, loss_events=0, target=10, confidence=0.9, n_trials=20000, workers=1, seed=1
+    )
+    assert abs(required - binomial_required(10, 0.5, 0.9)) <= 1
+    assert (np.diff(table['達成確率'].to_numpy()) >= 0).all()
+    assert table.loc[table['種付頭数'] == required, '達成確率'].iloc[0] >= 90
+    assert distribution['試行数'].sum() == 20000
+    assert distribution['分娩頭数'].max() <= required
+
+
+def test_blocked_run_keeps_totals_and_bounds_block_size(monkeypatch):
+    monkeypatch.setattr(breeding_simulator, 'SIM_BLOCK_CELLS', 5000)
+    seen = []
+    original = breeding_simulator._simulate_block
+
+    def spy(*args):
+        cumulative = original(*args)
+        seen.append(cumulative.size)
+        return cumulative
+
+    monkeypatch.setattr(breeding_simulator, '_simulate_block', spy)
+    required, table, distribution = simulate_breeding_target(
+        cells(), loss_heads=10000, loss_events=0, target=10, confidence=0.9, n_trials=3000, workers=1, seed=1
+    )
+    assert len(seen) > 1
+    assert max(seen) <= 5000
+    assert distribution['試行数'].sum() == 3000
+    assert abs(required - binomial_required(10, 0.5, 0.9)) <= 1
+
+
+def test_distribution_replays_the_same_trials():
+    required, table, distribution = simulate_breeding_target(
+        cells(), loss_heads=100, loss_events=10, target=10, confidence=0.8, n_trials=3000, workers=1, seed=3
+    )
+    # 必要頭数で種付した再実行でも、目標に届いた試行の割合は達成確率と一致する
+    reached = distribution.loc[distribution['分娩頭数'] >= 10, '試行数'].sum()
+    assert reached / 3000 * 100 == pytest.approx(table.loc[table['種付頭数'] == required, '達成確率'].iloc[0])
+
+
+def test_same_seed_gives_same_result():
+    first = simulate_breeding_target(cells(), 10000, 0, target=10, n_trials=4000, workers=1, seed=7)
+    second = simulate_breeding_target(cells(), 10000, 0, target=10, n_trials=4000, workers=1, seed=7)
+    assert first[0] == second[0]
+    assert first[1].equals(second[1])
+    assert first[2].equals(second[2])
+
+
+def test_unreachable_target_returns_none():
+    required, table, distribution = simulate_breeding_target(
+        cells(), 10000, 0, target=10, confidence=0.9, n_trials=2000, max_breedings=12, workers=1, seed=1
+    )
+    assert required is None
+    assert distribution is None
+    assert len(table) == 12
@@ -0,0 +1,52 @@
+import os
+import tempfile
+
+import render_env
+from render_env import ChartCache
+
+
+def test_keys_depend_only_on_content():
+    assert ChartCache.key('bar', ['4', '5'], [1, 2]) == ChartCache.key('bar', ['4', '5'], [1, 2])
+    assert ChartCache.key('bar', ['4', '5'], [1, 2]) != ChartCache.key('bar', ['4', '5'], [2, 1])
+    assert ChartCache.key({'b': 1, 'a': 2}) == ChartCache.key({'a': 2, 'b': 1})
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ChartCache(max_items=2)
+    cache.put('a', b'A')
+    cache.put('b', b'B')
+    assert cache.get('a') == b'A'    # a を最近使ったことにする
+    cache.put('c', b'C')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'A' and cache.get('c') == b'C'
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_disk_tier_survives_a_new_cache_and_renders_once():
+    with tempfile.TemporaryDirectory() as directory:
+        calls = []
+
+        def render():
+            calls.append(1)
+            return b'<svg/>'
+
+        key = ChartCache.key('bar', 'svg', [1])
+        assert ChartCache(directory=directory).get_or_render(key, render, suffix='.svg') == b'<svg/>'
+        assert os.path.exists(os.path.join(directory, key[:2], key + '.svg'))
+
+        # プロセスを再起動した相当（メモリは空）でもディスクから読み、描画し直さない
+        fresh = ChartCache(directory=directory)
+        assert fresh.get_or_render(key, render, suffix='.svg') == b'<svg/>'
+        assert len(calls) == 1
+        assert ChartCache(directory=directory).get(key, suffix='.png') is None
+
+
+def test_bar_chart_png_is_cached_by_data(monkeypatch):
+    monkeypatch.setattr(render_env, 'chart_cache', ChartCache())
+    png = render_env.bar_chart_png(['10mm', '12mm'], [2, 3], 'P2', '#1f77b4', dpi=30)
+    assert png.startswith(b'\x89PNG\r\n\x1a\n')
+
+    assert render_env.bar_chart_png(['10mm', '12mm'], [2, 3], 'P2', '#1f77b4', dpi=30) is png
+    assert render_env.chart_cache.hits == 1
+    assert render_env.bar_chart_png(['10mm', '12mm'], [2, 4], 'P2', '#1f77b4', dpi=30) != png
+    assert render_env.chart_cache.misses == 2
@@ -0,0 +1,36 @@
+import xml.etree.ElementTree as ET
+
+import render_env
+from render_env import ChartCache, _nice_step
+
+SVG = '{http://www.w3.org/2000/svg}'
+
+
+def test_bar_chart_svg_draws_one_bar_per_label(monkeypatch):
+    monkeypatch.setattr(render_env, 'chart_cache', ChartCache())
+    svg = render_env.bar_chart_svg(['10mm', '11mm', '12mm'], [4, 0, 7], 'P2 <Sow>', '#1f77b4')
+    root = ET.fromstring(svg)   # 整形式のSVG（タイトルはエスケープ済み）
+
+    assert root.tag == SVG + 'svg'
+    bars = root.findall(SVG + 'rect')
+    assert len(bars) == 3
+    assert {bar.get('fill') for bar in bars} == {'#1f77b4'}
+    heights = [float(bar.get('height')) for bar in bars]
+    assert heights[1] == 0 and heights[2] > heights[0] > 0
+
+    texts = [t.text for t in root.findall(SVG + 'text')]
+    assert 'P2 <Sow>' in texts and '12mm' in texts
+    # 値ラベルは1頭以上の棒だけ
+    assert '7' in texts and '4' in texts
+
+
+def test_bar_chart_svg_is_reused_from_cache(monkeypatch):
+    monkeypatch.setattr(render_env, 'chart_cache', ChartCache())
+    first = render_env.bar_chart_svg(['10mm'], [3], 'P2', '#ff7f0e')
+    assert render_env.bar_chart_svg(['10mm'], [3], 'P2', '#ff7f0e') == first
+    assert (render_env.chart_cache.hits, render_env.chart_cache.misses) == (1, 1)
+    assert render_env.bar_chart_svg(['10mm'], [3], 'P2', '#ff7f0e', width=320) != first
+
+
+def test_nice_steps():
+    assert [_nice_step(v) for v in [0, 5, 11, 33, 110, 900]] == [1, 1, 2, 10, 20, 200]
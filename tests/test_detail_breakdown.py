@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from conftest import make_records, service
+from fertility_analytics import (
+    annotated_failures, detail_breakdown, lactation_bin_labels, parse_detail_number, typed_pig_details
+)
+
+
+def test_lactation_bins_and_number_parsing():
+    assert lactation_bin_labels([10, 17, 18, 21.5, 22, 25, 28, 29, np.nan]).tolist() == [
+        '17日以下', '17日以下', '18-21日', '18-21日', '22-24日', '25-28日', '25-28日', '29日以上', '未入力'
+    ]
+    # 全角数字・単位付きの手入力から数値を取り出す
+    values = parse_detail_number(pd.Series(['２１日', '12.5mm', '', None]))
+    assert values[:2].tolist() == [21.0, 12.5]
+    assert values[2:].isna().all()
+
+
+def test_failures_are_joined_to_details_and_broken_down():
+    df = make_records({
+        ('A', '2025-01-06'): [
+            service('2025-01-06', 'S1'),
+            service('2025-01-06', 'S2', '不受胎', 再発日='2025-01-27'),
+            service('2025-01-06', 'S3', '不受胎', 流産日='2025-02-20'),
+            service('2025-01-07', 'S4', '不受胎'),
+        ],
+        ('A', '2025-01-13'): [
+            service('2025-01-13', 'S2', '不受胎', 再発日='2025-02-03'),
+        ],
+    })
+    details = typed_pig_details(pd.DataFrame({
+        'farm_name': ['A', 'A', 'A'],
+        'week_id': ['2025-01-06', '2025-01-06', '2025-01-13'],
+        '母豚番号': ['S2', 'S3', 'S2'],
+        '分娩舎': ['１号舎', '1号舎', '2号舎'],
+        'ロット': ['L1', 'L1', ''],
+        '哺乳日数': ['21日', '24', '30'],
+        'P2値': ['12', '14', ''],
+    }))
+
+    joined = annotated_failures(df, details)
+    # 受胎した S1 は含まず、同じ母豚でも週ごとに別の詳細を結合
+    assert joined[['week_id', '母豚番号', '要因', '分娩舎', 'ロット', '哺乳区分']].values.tolist() == [
+        ['2025-01-06', 'S2', '再発', '1号舎', 'L1', '18-21日'],
+        ['2025-01-06', 'S3', '流産', '1号舎', 'L1', '22-24日'],
+        ['2025-01-06', 'S4', '不明', '未入力', '未入力', '未入力'],
+        ['2025-01-13', 'S2', '再発', '2号舎', '未入力', '29日以上'],
+    ]
+
+    by_house = detail_breakdown(joined, '分娩舎')
+    assert by_house[['分娩舎', '不受胎', '再発', '流産', '不明', '平均P2値']].values.tolist()[0] == [
+        '1号舎', 2, 1, 1, 0, 13.0
+    ]
+    assert by_house['不受胎'].tolist() == [2, 1, 1]
+
+    by_lactation = detail_breakdown(joined, '哺乳区分')
+    assert by_lactation['哺乳区分'].tolist() == ['18-21日', '22-24日', '29日以上', '未入力']
+    assert by_lactation['平均哺乳日数'].tolist()[:3] == [21.0, 24.0, 30.0]
@@ -0,0 +1,59 @@
+import numpy as np
+
+from conftest import make_week, service
+from fertility_analytics import apply_detail_edits, details_editor_frame, duplicate_sow_ids
+
+
+def make_frame():
+    df = make_week([
+        service('2025-01-06', 'S1', '不受胎', parity=3, semen='B'),
+        service('2025-01-06', 'S2', '不受胎'),
+    ])
+    return details_editor_frame(df, {'S1': {'分娩舎': '１号舎', '哺乳日数': '21日'}})
+
+
+def test_editor_frame_has_one_typed_row_per_sow():
+    frame = make_frame()
+    assert frame.columns.tolist() == ['母豚番号', '産次', '精液', '分娩舎', 'ロット', '哺乳日数', 'P2値', 'コメント']
+    assert frame[['母豚番号', '産次', '精液', '分娩舎', 'ロット']].values.tolist() == [
+        ['S1', '3', 'B', '1号舎', ''], ['S2', '2', 'A', '', '']
+    ]
+    assert frame['哺乳日数'].dtype == float
+    assert frame['哺乳日数'].iloc[0] == 21.0 and np.isnan(frame['哺乳日数'].iloc[1])
+
+
+def test_apply_detail_edits_changes_only_edited_cells():
+    frame = make_frame()
+    # 編集がなければ入力済みの値をそのまま返す
+    unchanged = apply_detail_edits(frame, {})
+    assert unchanged['S1']['分娩舎'] == '1号舎' and unchanged['S1']['哺乳日数'] == 21.0
+
+    entries = apply_detail_edits(frame, {
+        1: {'ロット': 'L2', 'P2値': '１４mm', '産次': '9'},   # 参照用の列は無視
+        '0': {'分娩舎': None, 'コメント': '跛行'},
+    })
+    assert entries['S1']['分娩舎'] == '' and entries['S1']['コメント'] == '跛行'
+    assert entries['S1']['哺乳日数'] == 21.0
+    assert entries['S2']['ロット'] == 'L2' and entries['S2']['P2値'] == 14.0
+    assert '産次' not in entries['S2']
+    assert frame.loc[1, 'ロット'] == ''    # 元の表は変更しない
+
+
+def test_duplicate_sow_rows_are_merged_preferring_edited_cells():
+    df = make_week([
+        service('2025-01-06', 'S1', '不受胎'),
+        service('2025-01-06', 'S2', '不受胎'),
+        service('2025-01-08', 'S1', '不受胎'),
+    ])
+    frame = details_editor_frame(df, {'S1': {'分娩舎': '1号舎'}})
+    assert len(frame) == 3
+    assert duplicate_sow_ids(frame) == ['S1']
+
+    # 先の行だけ編集しても、編集していない後の行で上書きしない
+    entries = apply_detail_edits(frame, {0: {'ロット': 'L1'}})
+    assert sorted(entries) == ['S1', 'S2']
+    assert entries['S1']['ロット'] == 'L1' and entries['S1']['分娩舎'] == '1号舎'
+
+    # 同じ項目を両方の行で編集したら後の行の値
+    entries = apply_detail_edits(frame, {'2': {'ロット': 'L2'}, 0: {'ロット': 'L1', 'P2値': '12'}})
+    assert entries['S1']['ロット'] == 'L2' and entries['S1']['P2値'] == 12.0
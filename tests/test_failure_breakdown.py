@@ -0,0 +1,47 @@
+from conftest import make_records, service
+from fertility_analytics import FAILURE_MODES, fertility_cube, failure_breakdown
+
+
+def make_cube():
+    return fertility_cube(make_records({
+        ('A', '2025-01-06'): [
+            service('2025-01-06', 'S1'),
+            service('2025-01-06', 'S2', '不受胎', 再発日='2025-01-27'),
+            # 流産日と再発日の両方があれば流産を優先
+            service('2025-01-07', 'S3', '不受胎', parity=1, 流産日='2025-02-20', 再発日='2025-02-25'),
+            service('2025-01-07', 'S4', '不受胎', parity=1, 母豚廃用日='2025-02-01'),
+        ],
+        ('A', '2025-01-13'): [
+            service('2025-01-13', 'S5', '不受胎', semen='B'),
+            # 受胎確定なら廃用日があっても要因に数えない
+            service('2025-01-14', 'S6', semen='B', 母豚廃用日='2025-03-01'),
+        ],
+        ('B', '2025-01-06'): [
+            service('2025-01-06', 'S7', '不受胎', 再発日='2025-01-28'),
+        ],
+    }))
+
+
+def test_failure_modes_are_counted_once_per_service():
+    cube = make_cube()
+    assert cube[FAILURE_MODES].sum().to_dict() == {'再発': 2, '流産': 1, '廃用': 1, '不明': 1}
+    assert (cube[FAILURE_MODES].sum(axis=1) == cube['種付'] - cube['受胎']).all()
+
+
+def test_failure_breakdown_by_week_parity_and_farm():
+    cube = make_cube()
+    columns = ['種付'] + FAILURE_MODES + ['不受胎', '不受胎率']
+
+    by_week = failure_breakdown(cube[cube['farm_name'] == 'A'], '週開始日')
+    assert by_week['週開始日'].dt.strftime('%Y-%m-%d').tolist() == ['2025-01-06', '2025-01-13']
+    assert by_week[columns].values.tolist() == [[4, 1, 1, 1, 0, 3, 75.0], [2, 0, 0, 0, 1, 1, 50.0]]
+
+    by_parity = failure_breakdown(cube, '産次')
+    assert by_parity[['産次'] + columns].values.tolist() == [
+        [1, 2, 0, 1, 1, 0, 2, 100.0], [2, 5, 2, 0, 0, 1, 3, 60.0]
+    ]
+
+    by_farm = failure_breakdown(cube, ['farm_name', '精液'])
+    assert by_farm[['farm_name', '精液', '種付', '不受胎']].values.tolist() == [
+        ['A', 'A', 4, 3], ['A', 'B', 2, 1], ['B', 'A', 1, 1]
+    ]
@@ -0,0 +1,27 @@
+import pandas as pd
+
+from conftest import make_records, service
+from fertility_analytics import farm_period_matrix, fertility_cube
+
+
+def cube():
+    return fertility_cube(make_records({
+        ('A', '2025-01-27'): [service('2025-01-27', 'S1'), service('2025-02-01', 'S2', '不受胎')],
+        ('A', '2025-02-03'): [service('2025-02-03', 'S3'), service('2025-02-04', 'S4')],
+        ('B', '2025-01-27'): [service('2025-01-29', 'S1', '不受胎')],
+    }))
+
+
+def test_weekly_matrix_groups_by_monday():
+    table = farm_period_matrix(cube(), '週')
+    assert table['期間'].dt.strftime('%Y-%m-%d').tolist() == ['2025-01-27', '2025-02-03', '2025-01-27']
+    assert table[['farm_name', '種付', '受胎', '受胎率']].values.tolist() == [
+        ['A', 2, 1, 50.0], ['A', 2, 2, 100.0], ['B', 1, 0, 0.0]
+    ]
+
+
+def test_monthly_matrix_splits_at_month_start():
+    table = farm_period_matrix(cube(), '月')
+    assert table['期間'].tolist() == [pd.Timestamp('2025-01-01'), pd.Timestamp('2025-02-01'), pd.Timestamp('2025-01-01')]
+    # 2025-02-01（土）の種付は週では1月27日の週、月では2月
+    assert table[['farm_name', '種付', '受胎']].values.tolist() == [['A', 1, 1], ['A', 3, 2], ['B', 1, 0]]
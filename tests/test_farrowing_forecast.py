@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_records, service
+from fertility_analytics import pregnancy_rollup, farrowing_forecast
+
+AS_OF = '2025-06-02'
+
+
+def pregnancies():
+    """完了済み10頭（うち2頭が種付後30日で損耗）と在胎中の2群"""
+    rows = [
+        ('2025-01-01', '2025-04-25', np.nan, 8),
+        ('2025-01-01', '2025-04-25', 30.0, 2),
+        ('2025-05-01', '2025-08-23', np.nan, 5),   # すでに損耗時期を過ぎた群
+        ('2025-05-20', '2025-09-11', np.nan, 5),   # これから損耗しうる群
+    ]
+    return pd.DataFrame({
+        '種付日_dt': pd.to_datetime([r[0] for r in rows]),
+        '分娩予定日_dt': pd.to_datetime([r[1] for r in rows]),
+        '損耗日数': [r[2] for r in rows],
+        '頭数': [r[3] for r in rows],
+    })
+
+
+def test_pregnancy_rollup_counts_losses_before_due_date():
+    rollup = pregnancy_rollup(make_records({
+        ('A', '2025-01-06'): [
+            service('2025-01-06', 'S1', 分娩予定日='2025-04-30'),
+            service('2025-01-06', 'S2', 分娩予定日='2025-04-30', 流産日='2025-02-05'),
+            service('2025-01-06', 'S3', 分娩予定日='2025-04-30', 母豚廃用日='2025-03-07'),
+            service('2025-01-06', 'S4', 分娩予定日='2025-04-30', 母豚廃用日='2025-06-01'),   # 分娩後の廃用
+            service('2025-01-06', 'S5', '不受胎', 分娩予定日='2025-04-30'),
+        ],
+    }))
+    assert rollup['頭数'].sum() == 4
+    losses = rollup.dropna(subset=['損耗日数']).sort_values('損耗日数')
+    assert losses['損耗日数'].tolist() == [30, 60]
+    assert rollup.loc[rollup['損耗日数'].isna(), '頭数'].sum() == 2
+
+
+def test_forecast_applies_remaining_loss_risk():
+    forecast, loss_rate = farrowing_forecast(pregnancies(), as_of=AS_OF, horizon_weeks=17)
+    assert loss_rate == pytest.approx(0.2)
+    by_week = forecast.set_index(forecast['週開始日'].dt.strftime('%Y-%m-%d'))
+    assert by_week['週開始日'].iloc[0] == pd.Timestamp(AS_OF)
+    assert len(by_week) == 17
+    # 損耗時期を過ぎた群はそのまま、これからの群は2割減る
+    assert by_week.loc['2025-08-18', '予測分娩頭数'] == pytest.approx(5.0)
+    assert by_week.loc['2025-09-08', '予測分娩頭数'] == pytest.approx(4.0)
+    assert by_week.loc['2025-09-08', '予定頭数'] == 5
+    assert forecast['予測分娩頭数'].sum() == pytest.approx(9.0)
+
+
+def test_inventory_declines_after_loss_window_and_due_dates():
+    forecast, _ = farrowing_forecast(pregnancies(), as_of=AS_OF, horizon_weeks=17)
+    inventory = forecast.set_index(forecast['週開始日'].dt.strftime('%Y-%m-%d'))['予測妊娠豚在庫']
+    assert inventory['2025-06-02'] == pytest.approx(10.0)
+    assert inventory['2025-06-23'] == pytest.approx(9.0)
+    assert inventory['2025-08-18'] == pytest.approx(9.0)
+    assert inventory['2025-08-25'] == pytest.approx(4.0)
+
+
+def test_forecast_without_active_pregnancies():
+    forecast, loss_rate = farrowing_forecast(pregnancies().iloc[:2], as_of=AS_OF, horizon_weeks=4)
+    assert forecast['予測分娩頭数'].tolist() == [0.0] * 4
+    assert loss_rate == pytest.approx(0.2)
@@ -0,0 +1,80 @@
+import pandas as pd
+
+from conftest import make_week, service
+from fertility_analytics import FertilityMonitor
+from fertility_store import RecordStore
+
+WEEKS = [d.strftime('%Y-%m-%d') for d in pd.date_range('2025-01-06', periods=11, freq='7D')]
+
+
+def week(week_id, pregnant, total=10):
+    """種付 total 頭のうち pregnant 頭が受胎した1週分（全頭経産・精液A）"""
+    return make_week([
+        service(week_id, f"S{i}", '受胎確定' if i < pregnant else '不受胎')
+        for i in range(total)
+    ])
+
+
+def stable_store(last_pregnant):
+    """80%の週が10週続いたあと、最終週だけ last_pregnant/10"""
+    store = RecordStore()
+    for week_id in WEEKS[:-1]:
+        store.put_week('A', week_id, week(week_id, 8))
+    store.put_week('A', WEEKS[-1], week(WEEKS[-1], last_pregnant))
+    return store
+
+
+def test_no_alarm_while_rate_is_stable():
+    monitor = FertilityMonitor()
+    monitor.build(stable_store(8))
+    assert len(monitor.alarms()) == 0
+
+
+def test_sharp_drop_raises_cusum_and_ewma_alarms():
+    monitor = FertilityMonitor()
+    monitor.build(stable_store(2))
+    alarms = monitor.alarms()
+    assert sorted(zip(alarms['区分'], alarms['対象'])) == [('全体', '合計'), ('産次区分', '経産'), ('精液', 'A')]
+    assert set(alarms['検知']) == {'CUSUM・EWMA'}
+    assert set(alarms['週']) == {WEEKS[-1]}
+    assert alarms['受胎率'].iloc[0] == 20
+    assert alarms['基準受胎率'].iloc[0] == 80
+
+
+def test_no_alarm_before_warmup_services():
+    store = RecordStore()
+    for week_id, pregnant in zip(WEEKS[:4], [8, 8, 8, 0]):   # 基準は30頭分しかない
+        store.put_week('A', week_id, week(week_id, pregnant))
+    monitor = FertilityMonitor()
+    monitor.build(store)
+    assert len(monitor.alarms()) == 0
+
+
+def test_incremental_updates_match_full_build():
+    store = RecordStore()
+    incremental = FertilityMonitor()
+    store.add_listener(incremental.update_week)
+    for week_id in WEEKS[:-1]:
+        store.put_week('A', week_id, week(week_id, 8))
+    store.put_week('A', WEEKS[-1], week(WEEKS[-1], 2))
+
+    rebuilt = FertilityMonitor()
+    rebuilt.build(store)
+    assert incremental.alarms().equals(rebuilt.alarms())
+    assert incremental._state == rebuilt._state
+
+
+def test_resaving_a_past_week_replays_the_series():
+    store = stable_store(2)
+    monitor = FertilityMonitor()
+    monitor.build(store)
+    store.add_listener(monitor.update_week)
+    assert len(monitor.alarms()) == 3
+
+    # 最終週を修正すると、その週だけでなく系列が計算し直されアラームが消える
+    store.put_week('A', WEEKS[-1], week(WEEKS[-1], 8))
+    assert len(monitor.alarms()) == 0
+
+    # 過去の週を下げても、最新週が正常ならアラームは出ない
+    store.put_week('A', WEEKS[3], week(WEEKS[3], 2))
+    assert len(monitor.alarms()) == 0
@@ -0,0 +1,27 @@
+from conftest import make_records, service
+from fertility_analytics import fertility_cube, hormone_breakdowns
+
+
+def test_hormone_breakdowns_regroup_the_cube():
+    cube = fertility_cube(make_records({
+        ('A', '2025-01-06'): [
+            service('2025-01-06', 'S1', 投与ホルモン='PG', 離乳後交配日数='5'),
+            service('2025-01-06', 'S2', '不受胎', 投与ホルモン=' PG ', 離乳後交配日数='9'),
+            service('2025-01-07', 'S3', parity=3, 投与ホルモン='PG', 離乳後交配日数='5'),
+            service('2025-01-07', 'S4', parity=1),
+            service('2025-01-07', 'S5', '不受胎', parity=1, 投与ホルモン='nan'),
+        ],
+    }))
+    tables = hormone_breakdowns(cube)
+
+    by_hormone = tables['ホルモン別']
+    assert by_hormone[['投与ホルモン', '種付', '受胎', '受胎率']].values.tolist() == [
+        ['PG', 3, 2, 66.7], ['なし', 2, 1, 50.0]
+    ]
+    assert tables['ホルモン×産次'][['投与ホルモン', '産次', '種付', '受胎']].values.tolist() == [
+        ['PG', 2, 2, 1], ['PG', 3, 1, 1], ['なし', 1, 2, 1]
+    ]
+    # WSI区分別は経産のみ、区分の順に並ぶ
+    assert tables['ホルモン×WSI'][['投与ホルモン', 'WSI区分', '種付']].values.tolist() == [
+        ['PG', '4-5日', 2], ['PG', '8-10日', 1]
+    ]
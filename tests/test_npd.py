@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_records, service
+from fertility_analytics import compute_npd, npd_summary, fertility_cube, wsi_distribution, wsi_bin_labels
+
+
+def history():
+    return make_records({
+        ('A', '2025-01-06'): [
+            # 離乳後交配日数が空なら種付日 - 前回離乳日（5日）
+            service('2025-01-06', 'S1', '不受胎', 前回離乳日='2025-01-01', 再発日='2025-01-27'),
+            # 不受胎のまま廃用: WSI 4日 + 種付から廃用まで14日
+            service('2025-01-06', 'S2', '不受胎', parity=3, 離乳後交配日数='4', 投与ホルモン='PG',
+                    母豚廃用日='2025-01-20'),
+            service('2025-01-06', 'S3', parity=1),
+        ],
+        ('A', '2025-01-27'): [service('2025-01-27', 'S1')],
+    })
+
+
+def test_wsi_bins():
+    labels = wsi_bin_labels(pd.Series([0, 3, 4, 7, 10, 20, 21, np.nan, -2]))
+    assert labels.tolist() == ['0-3日', '0-3日', '4-5日', '6-7日', '8-10日', '11-20日', '21日以上', '不明', '不明']
+
+
+def test_compute_npd_counts_entry_and_cull_days():
+    npd = compute_npd(history()).set_index(['母豚番号', 'week_id'])
+    assert npd.loc[('S1', '2025-01-06'), 'NPD'] == 5
+    assert npd.loc[('S1', '2025-01-27'), 'NPD'] == 21   # 再発付けは前回種付からの日数
+    assert npd.loc[('S2', '2025-01-06'), 'NPD'] == 18
+    assert npd.loc[('S3', '2025-01-06'), 'NPD'] == 0    # 初産はWSIなし
+    assert npd.loc[('S3', '2025-01-06'), 'WSI区分'] == '不明'
+
+
+def test_npd_summary():
+    per_sow, farm = npd_summary(compute_npd(history()))
+    assert per_sow[['母豚番号', '種付回数', '再発付', 'NPD']].values.tolist() == [
+        ['S1', 2, 1, 26.0], ['S2', 1, 0, 18.0], ['S3', 1, 0, 0.0]
+    ]
+    assert farm['母豚数'] == 3
+    assert farm['NPD合計'] == 44
+    assert farm['平均NPD'] == pytest.approx(44 / 3)
+    assert farm['平均WSI'] == 4.5
+    assert farm['WSI7日以内率'] == 100
+
+
+def test_fertility_cube_and_wsi_distribution():
+    cube = fertility_cube(history())
+    assert cube['種付'].sum() == 4
+    assert cube['受胎'].sum() == 2
+    assert cube['再発'].sum() == 1
+    assert cube['廃用'].sum() == 1
+    assert sorted(cube['投与ホルモン'].unique()) == ['PG', 'なし']
+
+    table = wsi_distribution(cube)
+    assert table[['WSI区分', '種付', '受胎']].values.tolist() == [['4-5日', 2, 0], ['不明', 1, 1]]
+    assert table['構成比'].tolist() == [66.7, 33.3]
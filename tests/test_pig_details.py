@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from conftest import make_week, service
+from fertility_analytics import join_pig_details, pig_details_from_records, typed_pig_details, week_details_table
+
+
+def test_records_become_a_typed_table_keyed_by_farm_week_and_sow():
+    details = pig_details_from_records([
+        # 母豚番号に「_」が含まれていても農場・週の長さで切り出す
+        {'key': 'A_2025-01-06_S_1', 'farm_name': 'A', 'week_id': '2025-01-06',
+         '分娩舎': '１号舎', 'ロット': 'L１', '哺乳日数': '21日', 'P2値': '12.5', 'コメント': ' 跛行 '},
+        {'key': 'A_2025-01-06_S2', 'farm_name': 'A', 'week_id': '2025-01-06', '哺乳日数': '', 'P2値': 14},
+        {'key': 'B_2025-01-06_S1', 'farm_name': 'B', 'week_id': '2025-01-06', 'ロット': 'L－2'},
+        {'key': '', 'farm_name': 'A', 'week_id': '2025-01-06'},
+    ])
+    assert details.index.names == ['farm_name', 'week_id', '母豚番号']
+    assert details.index.tolist() == [('A', '2025-01-06', 'S2'), ('A', '2025-01-06', 'S_1'), ('B', '2025-01-06', 'S1')]
+    assert details['哺乳日数'].dtype == float and details['P2値'].dtype == float
+
+    s1 = details.loc[('A', '2025-01-06', 'S_1')]
+    assert (s1['分娩舎'], s1['ロット'], s1['哺乳日数'], s1['P2値']) == ('1号舎', 'L1', 21.0, 12.5)
+    # コメントは正規化しない
+    assert s1['コメント'] == ' 跛行 '
+    assert np.isnan(details.loc[('A', '2025-01-06', 'S2'), '哺乳日数'])
+    assert details.loc[('B', '2025-01-06', 'S1'), 'ロット'] == 'L-2'
+
+
+def test_typed_pig_details_drops_rows_without_keys_and_keeps_last_duplicate():
+    details = typed_pig_details(pd.DataFrame({
+        'farm_name': ['A', 'A', '', 'A'],
+        'week_id': ['2025-01-06', '2025-01-06', '2025-01-06', ''],
+        '母豚番号': ['S1', 'S1 ', 'S2', 'S3'],
+        'P2値': ['10', '11', '12', '13'],
+    }))
+    assert details.index.tolist() == [('A', '2025-01-06', 'S1')]
+    assert details['P2値'].tolist() == [11.0]
+    assert details['分娩舎'].tolist() == ['']
+    assert len(typed_pig_details(None)) == 0
+
+
+def test_week_details_are_joined_as_display_strings():
+    week_details = week_details_table({
+        'S1': {'分娩舎': '１号舎', '哺乳日数': '21', 'P2値': '12.5'},
+        ' S2': {'ロット': 'L1', '哺乳日数': ''},
+    })
+    assert week_details.index.tolist() == ['S1', 'S2']
+    df = make_week([service('2025-01-06', 'S1'), service('2025-01-06', 'S2'), service('2025-01-06', 'S3')])
+
+    joined = join_pig_details(df, week_details)
+    assert joined[['母豚番号', '分娩舎', 'ロット', '哺乳日数', 'P2値']].values.tolist() == [
+        ['S1', '1号舎', '', '21', '12.5'],
+        ['S2', '', 'L1', '', ''],
+        ['S3', '', '', '', ''],
+    ]
+    assert len(week_details_table({})) == 0
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fertility_analytics import wilson_interval, empirical_bayes_rates, add_rate_intervals, format_interval
+
+
+def test_wilson_interval_matches_reference_values():
+    lower, upper = wilson_interval([8, 0, 5], [10, 5, 0])
+    # 8/10: 49.0～94.3%（Wilson, z=1.96）
+    assert lower[0] == pytest.approx(49.02, abs=0.01)
+    assert upper[0] == pytest.approx(94.33, abs=0.01)
+    # 0頭受胎でも下限は0、上限は正
+    assert lower[1] == 0
+    assert upper[1] == pytest.approx(43.45, abs=0.01)
+    # 種付0頭は区間なし
+    assert np.isnan(lower[2]) and np.isnan(upper[2])
+
+
+def test_wilson_interval_narrows_with_more_services():
+    lower, upper = wilson_interval([8, 80, 800], [10, 100, 1000])
+    widths = upper - lower
+    assert widths[0] > widths[1] > widths[2]
+
+
+def test_empirical_bayes_shrinks_small_groups_toward_pooled_rate():
+    k = np.array([90, 60, 1, 0])
+    n = np.array([100, 100, 1, 0])
+    shrunk = empirical_bayes_rates(k, n)
+    pooled = k[:3].sum() / n[:3].sum() * 100
+    # 1頭だけのグループは 100% ではなく全体に大きく寄る
+    assert pooled < shrunk[2] < 100
+    assert abs(shrunk[2] - pooled) < abs(shrunk[0] - pooled)
+    # 頭数の多いグループはほぼそのまま
+    assert shrunk[0] == pytest.approx(90, abs=2)
+    assert shrunk[1] == pytest.approx(60, abs=2)
+    assert np.isnan(shrunk[3])
+
+
+def test_empirical_bayes_without_between_group_variance_returns_pooled_rate():
+    shrunk = empirical_bayes_rates([40, 41], [50, 50])
+    assert shrunk.tolist() == pytest.approx([81.0, 81.0])
+
+
+def test_empirical_bayes_prior_mask_excludes_rows_from_prior():
+    k = np.array([40, 41, 0])
+    n = np.array([50, 50, 10])
+    with_row = empirical_bayes_rates(k, n)
+    without_row = empirical_bayes_rates(k, n, prior_mask=[True, True, False])
+    assert without_row[0] == pytest.approx(81.0)
+    assert with_row[0] != pytest.approx(81.0)
+
+
+def test_add_rate_intervals_and_format():
+    table = add_rate_intervals(pd.DataFrame({'受胎': [8, 0], '種付': [10, 0]}))
+    assert table[['下限', '上限']].values.tolist()[0] == [49.0, 94.3]
+    assert format_interval(table['下限'], table['上限']) == ['49.0～94.3%', '']
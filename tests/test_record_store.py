@@ -0,0 +1,118 @@
+import pandas as pd
+
+from conftest import make_store, make_week, service, sheet_rows
+from fertility_analytics import prepare_semen_collections, semen_collection_outcomes, combine_semen_outcomes
+from fertility_store import RecordStore
+
+
+class CountingRollup:
+    """呼ばれるたびに受け取った週を記録する集計関数"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, df, *tables):
+        self.calls.append(sorted(set(zip(df['farm_name'], df['week_id']))))
+        return df.groupby(['farm_name', 'week_id']).size().rename('頭数').reset_index()
+
+
+def test_load_rows_groups_by_farm_and_week():
+    store = make_store()
+    assert store.week_keys() == [('A', '2025-01-06'), ('A', '2025-01-13'), ('B', '2025-01-06')]
+    assert store.farms() == ['A', 'B']
+    assert list(store.week_frame('A', '2025-01-06')['母豚番号']) == ['S1', 'S2']
+    assert 'farm_name' not in store.week_frame('A', '2025-01-06').columns
+    assert len(store.records('A')) == 3
+
+
+def test_load_rows_skips_rows_without_farm_or_week():
+    store = RecordStore()
+    headers, rows = sheet_rows({('A', '2025-01-06'): [service('2025-01-06', 'S1')]})
+    store.load_rows(headers, rows + [['', '2025-01-06'], ['A', ''], []])
+    assert store.week_keys() == [('A', '2025-01-06')]
+
+
+def test_put_week_replaces_only_that_week_and_notifies_listeners():
+    store = make_store()
+    seen = []
+    store.add_listener(lambda farm, week, df: seen.append((farm, week, len(df))))
+    version = store.version
+
+    df = make_week([service('2025-01-13', 'S3'), service('2025-01-14', 'S4')]).assign(産次=['2', None])
+    store.put_week('A', '2025-01-13', df)
+
+    assert store.version == version + 1
+    assert store.week_version('A', '2025-01-13') == 2
+    assert store.week_version('A', '2025-01-06') == 1
+    assert seen == [('A', '2025-01-13', 2)]
+    # シートと同じ文字列形式で保持（欠損は空文字）
+    assert list(store.week_frame('A', '2025-01-13')['産次']) == ['2', '']
+    assert len(store.records()) == 5
+
+
+def test_rollup_recomputes_only_weeks_put_again():
+    store = make_store()
+    rollup = CountingRollup()
+    store.register_rollup('頭数', rollup)
+
+    first = store.rollup('頭数')
+    assert first['頭数'].tolist() == [2, 1, 1]
+    assert rollup.calls == [[('A', '2025-01-06'), ('A', '2025-01-13'), ('B', '2025-01-06')]]
+
+    # 変更がなければ再計算しない
+    assert store.rollup('頭数').equals(first)
+    assert len(rollup.calls) == 1
+
+    # 保存し直した週だけ再計算
+    store.put_week('A', '2025-01-13', make_week([service('2025-01-13', 'S3'), service('2025-01-14', 'S4')]))
+    second = store.rollup('頭数')
+    assert rollup.calls[1] == [('A', '2025-01-13')]
+    assert second['頭数'].tolist() == [2, 2, 1]
+
+    # 農場を絞っても、未変更の週はキャッシュから
+    assert store.rollup('頭数', 'B')['頭数'].tolist() == [1]
+    assert len(rollup.calls) == 2
+
+
+def test_rollup_recomputes_all_weeks_when_dependent_table_changes():
+    store = make_store()
+    rollup = CountingRollup()
+    store.register_rollup('頭数', rollup, tables=('採精レポート',))
+    table = pd.DataFrame({'個体番号': ['A'], '採精日': ['2025-01-01']})
+
+    store.set_table('採精レポート', table)
+    store.rollup('頭数')
+    store.set_table('採精レポート', table.copy())   # 同じ内容なら版は変わらない
+    store.rollup('頭数')
+    assert len(rollup.calls) == 1
+
+    store.set_table('採精レポート', table.assign(採精日='2025-01-02'))
+    store.rollup('頭数')
+    assert len(rollup.calls) == 2
+    assert len(rollup.calls[1]) == 3
+
+
+def test_semen_collection_outcomes_uses_latest_collection_within_tolerance():
+    df = make_week([
+        service('2025-01-06', 'S1', semen='B1'),
+        service('2025-01-07', 'S2', '不受胎', semen='B1'),
+        service('2025-01-09', 'S3', semen='B1'),
+        service('2025-01-20', 'S4', semen='B1'),   # 直前の採精から8日以上あくので対象外
+        service('2025-01-06', 'S5', semen='B2'),   # 採精記録なし
+    ]).assign(farm_name='A', week_id='2025-01-06')
+    sem = prepare_semen_collections(pd.DataFrame({
+        '個体番号': ['B1', 'B1'],
+        '採精日': ['2025-01-05', '2025-01-08'],
+        '採精量': ['200', '250'],
+        '精子数': ['300', '350'],
+    }))
+
+    outcomes = semen_collection_outcomes(df, sem)
+    outcomes = outcomes.sort_values('採精日').reset_index(drop=True)
+    assert outcomes['採精日'].dt.strftime('%Y-%m-%d').tolist() == ['2025-01-05', '2025-01-08']
+    assert outcomes['種付'].tolist() == [2, 1]
+    assert outcomes['受胎'].tolist() == [1, 1]
+    assert outcomes['採精量'].tolist() == [200, 250]
+
+    combined = combine_semen_outcomes(outcomes)
+    assert combined['受胎率'].tolist() == [50.0, 100.0]
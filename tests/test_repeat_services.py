@@ -0,0 +1,47 @@
+import numpy as np
+
+from conftest import make_records, service
+from fertility_analytics import detect_repeat_services, repeat_breeding_counts, repeat_breeders
+
+
+def history():
+    return make_records({
+        ('A', '2025-01-06'): [service('2025-01-06', 'S1', '不受胎'), service('2025-01-06', 'S2', '不受胎')],
+        ('A', '2025-01-27'): [service('2025-01-27', 'S1', '不受胎')],
+        ('A', '2025-02-17'): [service('2025-02-17', 'S1')],
+        # 分娩を挟んだ（産次が変わった）種付は再発付けではない
+        ('A', '2025-05-19'): [service('2025-05-20', 'S2', parity=3)],
+        # 別農場の同じ母豚番号とは連続しない
+        ('B', '2025-01-27'): [service('2025-01-27', 'S1')],
+    })
+
+
+def test_detect_repeat_services_flags_same_parity_return_after_failure():
+    recs = detect_repeat_services(history())
+    s1 = recs[(recs['farm_name'] == 'A') & (recs['母豚番号'] == 'S1')]
+    assert s1['再発付'].tolist() == [False, True, True]
+    assert s1['再発間隔'].tolist()[1:] == [21.0, 21.0]
+    assert np.isnan(s1['再発間隔'].iloc[0])
+    assert s1['連続不受胎'].tolist() == [1, 2, 0]
+
+    s2 = recs[(recs['farm_name'] == 'A') & (recs['母豚番号'] == 'S2')]
+    assert s2['再発付'].tolist() == [False, False]
+    assert not recs.loc[recs['farm_name'] == 'B', '再発付'].any()
+
+
+def test_repeat_breeding_counts_per_week():
+    recs = detect_repeat_services(history())
+    assert repeat_breeding_counts(recs, 'A', '2025-01-27') == (1, 0)
+    assert repeat_breeding_counts(recs, 'A', '2025-02-17') == (1, 1)
+    assert repeat_breeding_counts(recs, 'A', '2025-05-19') == (0, 0)
+
+
+def test_repeat_breeders_reports_longest_failure_run():
+    breeders = repeat_breeders(detect_repeat_services(history()))
+    assert breeders[['farm_name', '母豚番号', '連続不受胎']].values.tolist() == [['A', 'S1', 2]]
+
+
+def test_detect_repeat_services_on_empty_records():
+    recs = detect_repeat_services(history().iloc[0:0])
+    assert len(recs) == 0
+    assert '再発付' in recs.columns
@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+from conftest import make_store
+from fertility_store import WeekAnnotations
+from report_export import P2Index, export_reports, index_sources, week_semen_report
+
+
+SEMEN_ALL = pd.DataFrame({
+    '採精日': ['2025-01-04', '2025-01-05', '2025-01-11', '2025-01-12', ''],
+    '個体番号': ['B1', 'B2', 'B3', 'B4', 'B5'],
+})
+
+
+def test_p2_index_matches_flexible_dates_and_keeps_first_row():
+    index = P2Index(
+        [{'農場': 'A', '離乳日': '1月2日', 'P2値': '1'}, {'農場': 'A', '離乳日': '2025-01-02', 'P2値': '2'}],
+        [{'農場': 'A', '種付開始週': '1/6', 'P2値': '3'}],
+    )
+    assert index.sow_record('A', '2025-01-02')['P2値'] == '1'
+    assert index.sow_record('B', '2025-01-02') is None
+    assert index.gilt_record('A', '2025-01-06')['P2値'] == '3'
+
+
+def test_week_semen_report_takes_previous_sunday_to_saturday():
+    # 2025-01-06（月）の週は 01-05（日）〜 01-11（土）
+    assert week_semen_report(SEMEN_ALL, '2025-01-06')['個体番号'].tolist() == ['B2', 'B3']
+    assert week_semen_report(SEMEN_ALL, '2025-01-08')['個体番号'].tolist() == ['B2', 'B3']
+    assert week_semen_report(None, '2025-01-06') is None
+
+
+def test_index_sources_only_reports_semen_for_semen_farms():
+    index = P2Index([{'農場': '花泉1号', '離乳日': '2025-01-01'}], [])
+    sources = index_sources(index, SEMEN_ALL, '花泉1号', '2025-01-06')(None, pd.Timestamp('2025-01-06'))
+    assert sources['p2_record'] is None
+    assert sources['semen_week']['個体番号'].tolist() == ['B2', 'B3']
+
+    sources = index_sources(index, SEMEN_ALL, '花泉1号', '2025-01-06')('2025-01-01', pd.Timestamp('2025-01-06'))
+    assert sources['p2_record'] == {'農場': '花泉1号', '離乳日': '2025-01-01'}
+    assert index_sources(index, SEMEN_ALL, 'A', '2025-01-06')(None, pd.Timestamp('2025-01-06'))['semen_week'] is None
+
+
+def test_export_reports_gives_same_pages_with_or_without_pool():
+    store = make_store()
+    pairs = store.week_keys() + [('A', '2099-01-05')]   # 記録のない週は出力しない
+    serial = export_reports(store, WeekAnnotations(), P2Index(), None, pairs, workers=1)
+    pooled = export_reports(store, WeekAnnotations(), P2Index(), None, pairs, workers=2)
+    assert [name for name, _ in serial] == [
+        '鑑定落ちリスト_A_2025-01-06.html', '鑑定落ちリスト_A_2025-01-13.html', '鑑定落ちリスト_B_2025-01-06.html'
+    ]
+    assert pooled == serial
+
+
+def test_export_reports_adds_interval_columns_on_request():
+    store = make_store()
+    plain = export_reports(store, WeekAnnotations(), P2Index(), None, store.week_keys()[:1], workers=1)
+    with_ci = export_reports(store, WeekAnnotations(), P2Index(), None, store.week_keys()[:1], workers=1, intervals=True)
+    assert '95%信頼区間' not in plain[0][1]
+    assert '95%信頼区間' in with_ci[0][1] and '推定受胎率' in with_ci[0][1]
+
+
+def test_export_reports_does_not_hide_rendering_errors():
+    class BrokenAnnotations:
+        def week(self, farm_name, week_id):
+            return {'pig_details': None, 'repeat_breeding': None, 'week_comment': ''}
+
+    store = make_store()
+    with pytest.raises(AttributeError):
+        export_reports(store, BrokenAnnotations(), P2Index(), None, store.week_keys(), workers=2)
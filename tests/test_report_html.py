@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+import render_env
+from conftest import make_week, service
+from fertility_analytics import week_details_table
+from render_env import ChartCache
+from report_html import generate_print_html, render_table
+from report_model import build_report_model
+
+
+def test_render_table_escapes_cells_unless_asked_not_to():
+    df = pd.DataFrame({'<列>': ['<b>S1</b>', None], '値': [1.5, np.nan]})
+    escaped = render_table(df, css_class='t')
+    assert escaped.startswith('<table class="t"><thead><tr><th>&lt;列&gt;</th>')
+    assert '<td>&lt;b&gt;S1&lt;/b&gt;</td><td>1.5</td>' in escaped
+    assert '<tr><td></td><td></td></tr>' in escaped
+
+    # 画面表示用（display_centered_table）はセルの HTML をそのまま使う
+    assert '<td><b>S1</b></td>' in render_table(df, escape=False)
+
+
+def make_report(farm_name, p2=None, semen_week=None, details=None):
+    df = make_week([
+        service('2025-01-06', 'S1', 前回離乳日='2025-01-01'),
+        service('2025-01-06', 'S2', '不受胎', 前回離乳日='2025-01-01'),
+    ])
+    df = df.assign(受胎=df['妊娠鑑定結果'] == '受胎確定')
+    notes = {'pig_details': week_details_table(details or {}), 'repeat_breeding': None, 'week_comment': ''}
+    return build_report_model(
+        df, farm_name, '2025-01-06', notes,
+        fetch_sources=lambda weaning_date, start_date: {'p2_record': p2, 'gilt_p2_record': None, 'semen_week': semen_week}
+    )
+
+
+def test_print_page_without_p2_or_semen_has_only_the_core_sections():
+    html = generate_print_html(make_report('A'), '')
+    for heading in ['【産次別受胎率】', '【精液別受胎率】', '【不受胎リスト】']:
+        assert heading in html
+    assert 'P2値分布' not in html
+    assert '【採精レポート】' not in html
+    assert '【週のコメント】' not in html
+
+
+def test_print_page_adds_p2_semen_and_comment_sections(monkeypatch):
+    monkeypatch.setattr(render_env, 'chart_cache', ChartCache())
+    semen_week = pd.DataFrame({'採精日': ['2025-01-05'], '個体番号': ['B1'], '採精量': [200], '精子数': [300], '備考': ['']})
+    report = make_report('花泉1号', p2={'10': 2, '12': 1, '離乳ロット': 'L1'}, semen_week=semen_week,
+                         details={'S2': {'コメント': '<script>x</script>'}})
+    html = generate_print_html(report, '1行目\n2行目', chart_format='svg')
+
+    assert '【離乳時P2値分布（経産）】' in html and '<svg' in html
+    assert '【種付時P2値分布（初産）】' not in html
+    assert '【採精レポート】' in html and 'B1' in html
+    assert '1行目<br>2行目' in html
+    # 不受胎リストの手入力はエスケープして埋め込む
+    assert '&lt;script&gt;x&lt;/script&gt;' in html and '<script>x' not in html
+
+    assert '<img class="chart" src="data:image/png;base64,' in generate_print_html(report, '', chart_format='png')
+
+    # 採精レポートの対象外の農場では、データがあってもセクションを作らない
+    other = make_report('A', semen_week=semen_week)
+    assert '【採精レポート】' not in generate_print_html(other, '')
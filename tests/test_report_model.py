@@ -0,0 +1,60 @@
+import pandas as pd
+
+from conftest import make_week, service
+from fertility_analytics import week_details_table
+from report_model import build_report_model, p2_distribution, parity_rates, semen_week_window
+
+
+def week_frame():
+    df = make_week([
+        service('2025-01-06', 'S1', parity=1, 前回離乳日=''),
+        service('2025-01-06', 'S2', '不受胎', parity=1, semen='B'),
+        service('2025-01-07', 'S3', 前回離乳日='2025-01-01'),
+        service('2025-01-07', 'S4', 前回離乳日='2025-01-01'),
+        service('2025-01-08', 'S5', '不受胎', parity=3, 前回離乳日='2024-12-31'),
+    ])
+    return df.assign(受胎=df['妊娠鑑定結果'] == '受胎確定')
+
+
+def test_parity_rates_append_repeat_row():
+    df = week_frame()
+    table = parity_rates(df, {'種付': '4', '受胎': '3'})
+    assert table.values.tolist() == [
+        ['1産', 1, 2, '50.0%'], ['2産', 2, 2, '100.0%'], ['3産', 0, 1, '0.0%'], ['再発付', 3, 4, '75.0%']
+    ]
+    # 数値でない入力は無視
+    assert len(parity_rates(df, {'種付': 'x', '受胎': '1'})) == 3
+
+
+def test_p2_distribution_and_semen_window():
+    p2 = p2_distribution({'10': '2', '12': 3, '13': '', '14': 0})
+    assert p2['table'].values.tolist() == [['10mm', 2], ['12mm', 3]]
+    assert p2['total'] == 5
+    assert p2['average'] == (10 * 2 + 12 * 3) / 5
+    assert p2_distribution({})['average'] is None
+
+    assert semen_week_window('2025-01-06') == (pd.Timestamp('2025-01-05'), pd.Timestamp('2025-01-11'))
+    assert semen_week_window('2025-01-09') == (pd.Timestamp('2025-01-05'), pd.Timestamp('2025-01-11'))
+
+
+def test_build_report_model_summarizes_and_fetches_sources_once():
+    calls = []
+
+    def fetch_sources(weaning_date, start_date):
+        calls.append((weaning_date, start_date))
+        return {'p2_record': {'10': '4', '離乳ロット': 'L1'}, 'gilt_p2_record': None, 'semen_week': None}
+
+    notes = {'pig_details': week_details_table({'S5': {'分娩舎': '2号舎'}}), 'repeat_breeding': None, 'week_comment': ''}
+    model = build_report_model(week_frame(), 'A', '2025-01-06', notes, fetch_sources=fetch_sources)
+
+    assert [(s['label'], s['pregnant'], s['total']) for s in model['summary']] == [
+        ('合計', 3, 5), ('経産', 2, 3), ('初産(Gilt)', 1, 2)
+    ]
+    # 経産の最も多い前回離乳日と種付開始日で1回だけ検索
+    assert calls == [('2025-01-01', pd.Timestamp('2025-01-06'))]
+    assert model['p2']['lot'] == 'L1' and model['p2']['average'] == 10
+    assert model['gilt_p2'] is None and model['semen_report'] is None
+    assert model['not_pregnant_view'][['母豚番号', '分娩舎']].values.tolist() == [['S2', ''], ['S5', '2号舎']]
+
+    # fetch_sources がなければ P2値・採精レポートは作らない
+    assert build_report_model(week_frame(), 'A', '2025-01-06', notes)['sources'] is None
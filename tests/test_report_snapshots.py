@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+import pandas as pd
+
+from conftest import make_week, service
+from fertility_analytics import week_details_table
+from fertility_store import ReportSnapshots
+
+
+def week_notes(details=None, repeat=None, comment=''):
+    return {'pig_details': week_details_table(details or {}), 'repeat_breeding': repeat, 'week_comment': comment}
+
+
+def sources(p2=None, semen_week=None):
+    return {'p2_record': p2 or {'母豚番号': 'S1', 'P2値': '12'}, 'gilt_p2_record': None, 'semen_week': semen_week}
+
+
+def test_data_version_changes_only_when_inputs_change():
+    records = make_week([service('2025-01-06', 'S1'), service('2025-01-07', 'S2', '不受胎')])
+    semen = pd.DataFrame({'個体番号': ['A'], '採精日': ['2025-01-05']})
+    base = ReportSnapshots.data_version(records, week_notes(), sources(semen_week=semen))
+
+    assert ReportSnapshots.data_version(records.copy(), week_notes(), sources(semen_week=semen.copy())) == base
+    assert ReportSnapshots.data_version(None, week_notes()) is None
+
+    changed = [
+        ReportSnapshots.data_version(records.iloc[:1], week_notes(), sources(semen_week=semen)),
+        ReportSnapshots.data_version(records, week_notes({'S2': {'P2値': '12'}}), sources(semen_week=semen)),
+        ReportSnapshots.data_version(records, week_notes(repeat={'種付': '1', '受胎': '1'}), sources(semen_week=semen)),
+        ReportSnapshots.data_version(records, week_notes(comment='メモ'), sources(semen_week=semen)),
+        ReportSnapshots.data_version(records, week_notes(), sources({'母豚番号': 'S1', 'P2値': '13'}, semen)),
+        ReportSnapshots.data_version(records, week_notes(), sources(semen_week=semen.assign(採精日='2025-01-04'))),
+        ReportSnapshots.data_version(records, week_notes(), sources()),
+    ]
+    assert len(set(changed + [base])) == len(changed) + 1
+
+
+def test_snapshots_are_kept_per_week_and_version_on_disk():
+    with tempfile.TemporaryDirectory() as directory:
+        snapshots = ReportSnapshots(directory)
+        snapshots.put('A', '2025-01-06', 'v1', {'rows': 1})
+        assert snapshots.get('A', '2025-01-06', 'v1') == {'rows': 1}
+        assert snapshots.get('A', '2025-01-06', 'v2') is None
+        assert snapshots.get('A', '2025-01-06', None) is None
+
+        # 別プロセス相当（メモリは空）でもディスクから読める
+        assert ReportSnapshots(directory).get('A', '2025-01-06', 'v1') == {'rows': 1}
+
+        # 新しい版を書くと古い版のファイルは消える
+        snapshots.put('A', '2025-01-06', 'v2', {'rows': 2})
+        week_dir = snapshots._dir('A', '2025-01-06')
+        assert os.listdir(week_dir) == ['v2.pkl']
+        assert ReportSnapshots(directory).get('A', '2025-01-06', 'v1') is None
+        assert ReportSnapshots(directory).get('A', '2025-01-06', 'v2') == {'rows': 2}
+
+
+def test_memory_keeps_only_recent_weeks():
+    snapshots = ReportSnapshots(max_items=2)
+    snapshots.put('A', 'w1', 'v', 1)
+    snapshots.put('A', 'w2', 'v', 2)
+    assert snapshots.get('A', 'w1', 'v') == 1    # w1 を最近使ったことにする
+    snapshots.put('A', 'w3', 'v', 3)
+    assert snapshots.get('A', 'w2', 'v') is None
+    assert snapshots.get('A', 'w1', 'v') == 1
+    assert snapshots.get('A', 'w3', 'v') == 3
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from fertility_analytics import rolling_fertility
+
+
+def weekly_cube(counts, start='2024-01-01'):
+    """週ごとの（種付, 受胎）からキューブ相当の表を作成（None の週は記録なし）"""
+    rows = []
+    for i, value in enumerate(counts):
+        if value is None:
+            continue
+        date = pd.Timestamp(start) + pd.Timedelta(weeks=i) + pd.Timedelta(days=2)   # 水曜の種付
+        rows.append({'farm_name': 'A', '種付日_dt': date, '種付': value[0], '受胎': value[1]})
+    return pd.DataFrame(rows)
+
+
+def test_missing_weeks_are_filled_and_windows_need_full_length():
+    result = rolling_fertility(weekly_cube([(10, 8), None, (10, 6), (10, 10)]), windows=(2, 4), lag_weeks=2)
+    assert result['週開始日'].dt.strftime('%Y-%m-%d').tolist() == ['2024-01-01', '2024-01-08', '2024-01-15', '2024-01-22']
+    assert result['種付'].tolist() == [10, 0, 10, 10]
+    assert result['受胎率'].tolist()[0] == 80.0
+    assert np.isnan(result['受胎率'].iloc[1])               # 種付0頭の週
+    assert np.isnan(result['2週移動'].iloc[0])              # 窓に満たない
+    assert result['2週移動'].tolist()[1:] == [80.0, 60.0, 80.0]
+    assert result['4週移動'].tolist()[3] == 80.0            # 24 / 30
+    assert np.isnan(result['4週移動'].iloc[2])
+
+
+def test_year_over_year_compares_same_window_lagged():
+    counts = [(10, 8)] * 52 + [(10, 5)] * 4
+    result = rolling_fertility(weekly_cube(counts), windows=(4,))
+    last = result.iloc[-1]
+    assert last['4週移動'] == 50.0
+    assert last['前年4週移動'] == 80.0
+    assert last['前年同週'] == 80.0
+    assert last['前年差'] == -30.0
+    assert np.isnan(result['前年同週'].iloc[51])
+
+
+def test_empty_cube_returns_none():
+    empty = pd.DataFrame({'種付日_dt': pd.to_datetime([]), '種付': [], '受胎': []})
+    assert rolling_fertility(empty) is None
@@ -0,0 +1,31 @@
+from conftest import make_week, service
+from fertility_store import RecordStore, SowIndex
+
+
+def test_history_spans_weeks_in_service_date_order():
+    store = RecordStore()
+    store.put_week('A', '2025-01-13', make_week([service('2025-01-14', 'S1'), service('2025-01-13', 'S2')]))
+    store.put_week('A', '2025-01-06', make_week([service('2025-01-06', 'S1', '不受胎'), service('2025-01-06', ' S3 ')]))
+    store.put_week('B', '2025-01-06', make_week([service('2025-01-06', 'S1')]))
+    index = SowIndex()
+    index.build(store)
+
+    history = index.history('A', 'S1')
+    assert history['week_id'].tolist() == ['2025-01-06', '2025-01-13']
+    assert history['妊娠鑑定結果'].tolist() == ['不受胎', '受胎確定']
+    assert index.weeks_for('A', 'S1') == ['2025-01-06', '2025-01-13']
+    # 母豚番号の前後の空白は無視
+    assert index.weeks_for('A', 'S3') == ['2025-01-06']
+    assert index.history('A', 'S9') is None
+
+
+def test_update_week_replaces_the_weeks_entries():
+    store = RecordStore()
+    index = SowIndex()
+    store.add_listener(index.update_week)
+    store.put_week('A', '2025-01-06', make_week([service('2025-01-06', 'S1'), service('2025-01-07', 'S2')]))
+    assert index.weeks_for('A', 'S2') == ['2025-01-06']
+
+    store.put_week('A', '2025-01-06', make_week([service('2025-01-06', 'S1')]))
+    assert index.weeks_for('A', 'S2') == []
+    assert len(index.history('A', 'S1')) == 1
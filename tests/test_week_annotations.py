@@ -0,0 +1,55 @@
+from fertility_analytics import week_details_table
+from fertility_store import WeekAnnotations
+
+
+def make_annotations():
+    annotations = WeekAnnotations()
+    annotations.load_records(
+        [
+            {'key': 'A_2025-01-06_S1', 'farm_name': 'A', 'week_id': '2025-01-06', 'P2値': '12'},
+            {'key': 'A_2025-01-06_S2', 'farm_name': 'A', 'week_id': '2025-01-06', 'P2値': '14'},
+            {'key': 'A_2025-01-13_S3', 'farm_name': 'A', 'week_id': '2025-01-13', 'P2値': '16'},
+            {'key': 'B_2025-01-06_S1', 'farm_name': 'B', 'week_id': '2025-01-06', 'P2値': '18'},
+        ],
+        [{'farm_name': 'A', 'week_id': '2025-01-13', '種付': 3, '受胎': 2}, {'farm_name': '', 'week_id': 'x'}],
+        [{'farm_name': 'B', 'week_id': '2025-01-20', 'コメント': '台風'}],
+    )
+    return annotations
+
+
+def test_week_returns_only_that_weeks_entries():
+    annotations = make_annotations()
+    week = annotations.week('A', '2025-01-06')
+    assert week['pig_details'].index.tolist() == ['S1', 'S2']
+    assert week['pig_details']['P2値'].tolist() == [12.0, 14.0]
+    assert week['repeat_breeding'] is None
+    assert week['week_comment'] == ''
+
+    assert annotations.week('A', '2025-01-13')['repeat_breeding'] == {'種付': '3', '受胎': '2'}
+    assert annotations.week('B', '2025-01-20')['week_comment'] == '台風'
+    assert len(annotations.week('B', '2025-01-20')['pig_details']) == 0
+    assert len(annotations.week('C', '2025-01-06')['pig_details']) == 0
+
+
+def test_put_week_replaces_one_week_and_refreshes_concatenated_table():
+    annotations = make_annotations()
+    everything = annotations.pig_details()
+    assert len(everything) == 4
+    # 変更がなければ同じ表を返す
+    assert annotations.pig_details() is everything
+    farm_a = annotations.pig_details('A')
+    assert farm_a.index.get_level_values('week_id').tolist() == ['2025-01-06', '2025-01-06', '2025-01-13']
+
+    version = annotations.version
+    annotations.put_week('A', '2025-01-06', week_details_table({'S9': {'P2値': '20'}}), None, '更新')
+
+    assert annotations.version == version + 1
+    assert annotations.week('A', '2025-01-06')['pig_details'].index.tolist() == ['S9']
+    assert annotations.week('A', '2025-01-06')['week_comment'] == '更新'
+    # 他の週はそのまま
+    assert annotations.week('A', '2025-01-13')['pig_details']['P2値'].tolist() == [16.0]
+
+    refreshed = annotations.pig_details('A')
+    assert refreshed is not farm_a
+    assert refreshed.index.tolist() == [('A', '2025-01-06', 'S9'), ('A', '2025-01-13', 'S3')]
+    assert annotations.pig_details()['P2値'].tolist() == [20.0, 16.0, 18.0]